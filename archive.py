@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# archive.py
+# Moves finished rows out of the hot tables into monthly archive tables, shared by both bots.
+#
+# Rows in a terminal status older than a cutoff are copied into {table}_archive_YYYYMM (by
+# creation month, UTC) and deleted from the live table in small batches, so each write
+# transaction stays short. {table}_all is a UNION ALL view over the live table and every
+# archive, for the commands that reach back into history on demand; {table}_archive_fts keeps
+# archived rows searchable after they leave the live full-text index.
+#
+#   python archive.py --db enzo_bot.db --table orders --days 90
+import argparse
+import re
+import sqlite3
+import time
+
+MONTH = "strftime('%Y%m', created_at / 1000, 'unixepoch')"
+BATCH_SIZE = 500
+
+# per table: terminal statuses, and the indexes each archive table gets
+ARCHIVE_SPECS = {
+    "orders": (("done", "cancelled", "rejected"), (("id",), ("telegram_id", "created_at", "id"))),
+    "promotions": (("posted", "rejected"), (("id",), ("tg_user_id", "created_at", "id"))),
+}
+
+
+def columns(c, table):
+    return [r[1] for r in c.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def archive_tables(c, table):
+    pattern = re.compile(rf"{table}_archive_\d{{6}}$")
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ORDER BY name", (f"{table}_archive_%",))
+    return [r[0] for r in c.fetchall() if pattern.match(r[0])]
+
+
+def refresh_view(c, table):
+    # archives made before a column was added get NULL for it
+    cols = columns(c, table)
+    legs = [f"SELECT {', '.join(cols)} FROM {table}"]
+    for arch in archive_tables(c, table):
+        have = set(columns(c, arch))
+        legs.append("SELECT " + ", ".join(col if col in have else f"NULL AS {col}" for col in cols) + f" FROM {arch}")
+    c.execute(f"DROP VIEW IF EXISTS {table}_all")
+    c.execute(f"CREATE VIEW {table}_all AS " + " UNION ALL ".join(legs))
+
+
+def init_archive(c, table, search_cols):
+    # search_cols: the columns of the live table's full-text index
+    c.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_archive_fts USING fts5(ref UNINDEXED, {', '.join(search_cols)}, prefix='2 3')")
+    refresh_view(c, table)
+
+
+def has_archive(db_path, table):
+    conn = sqlite3.connect(db_path)
+    found = bool(archive_tables(conn.cursor(), table))
+    conn.close()
+    return found
+
+
+def _create_archive(c, table, arch, indexes):
+    c.execute(f"CREATE TABLE {arch} AS SELECT * FROM {table} WHERE 0")
+    for n, cols in enumerate(indexes):
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{arch}_{n} ON {arch} ({', '.join(cols)})")
+
+
+def archive_rows(db_path, table, older_than_days, batch_size=BATCH_SIZE):
+    # returns how many rows were moved
+    statuses, indexes = ARCHIVE_SPECS[table]
+    cutoff = int((time.time() - older_than_days * 86400) * 1000)
+    marks = ", ".join("?" for _ in statuses)
+    moved = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        c = conn.cursor()
+        fts_cols = ", ".join(col for col in columns(c, f"{table}_archive_fts") if col != "ref")
+        known = set(archive_tables(c, table))
+        while True:
+            c.execute(
+                f"SELECT rowid, {MONTH} FROM {table} WHERE status IN ({marks}) AND created_at < ? LIMIT ?",
+                (*statuses, cutoff, batch_size),
+            )
+            rows = c.fetchall()
+            if not rows:
+                break
+            by_month = {}
+            for rowid, month in rows:
+                by_month.setdefault(month, []).append(rowid)
+            with conn:
+                for month, rowids in by_month.items():
+                    arch = f"{table}_archive_{month}"
+                    if arch not in known:
+                        _create_archive(c, table, arch, indexes)
+                        known.add(arch)
+                        refresh_view(c, table)
+                    shared = ", ".join(col for col in columns(c, arch) if col in set(columns(c, table)))
+                    ids = ", ".join(str(r) for r in rowids)  # integers straight from SQLite
+                    c.execute(f"INSERT INTO {arch} ({shared}) SELECT {shared} FROM {table} WHERE rowid IN ({ids})")
+                    c.execute(f"INSERT INTO {table}_archive_fts (ref, {fts_cols}) SELECT id, {fts_cols} FROM {table} WHERE rowid IN ({ids})")
+                    c.execute(f"DELETE FROM {table} WHERE rowid IN ({ids})")
+            moved += len(rows)
+    finally:
+        conn.close()
+    return moved
+
+
+def search_archive(db_path, table, match, limit, offset=0):
+    # refs of archived rows matching an FTS5 expression, best first
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        f"SELECT ref FROM {table}_archive_fts WHERE {table}_archive_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+        (match, limit, offset),
+    ).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Move finished rows older than N days into monthly archive tables.")
+    ap.add_argument("--db", required=True)
+    ap.add_argument("--table", choices=sorted(ARCHIVE_SPECS), required=True)
+    ap.add_argument("--days", type=int, default=90)
+    args = ap.parse_args()
+    print(f"Archived {archive_rows(args.db, args.table, args.days)} row(s) from {args.table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# backup.py
+# Online SQLite backups, shared by both bots.
+#
+# Snapshots are taken with SQLite's backup API in a single step. Both bots run in WAL mode, so
+# the copy reads from one consistent read snapshot while the bot keeps writing to the WAL; a
+# stepped backup would instead restart whenever another connection writes, and never finish
+# under steady write load. Each snapshot is integrity-checked before it is kept, optionally
+# gzipped, and only the newest `keep` snapshots are retained.
+#
+#   python backup.py --db enzo_bot.db --dest backups --keep 7
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+_running = threading.Lock()
+
+
+class BackupError(Exception):
+    pass
+
+
+def snapshot_name(db_path, compress):
+    # microseconds, so a /backup during the scheduled run can't overwrite it within the same second
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    return f"{base}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db" + (".gz" if compress else "")
+
+
+def snapshots(dest_dir, db_path):
+    # this database's snapshots in dest_dir, oldest first (the timestamp sorts by name)
+    prefix = os.path.splitext(os.path.basename(db_path))[0] + "-"
+    if not os.path.isdir(dest_dir):
+        return []
+    names = [n for n in os.listdir(dest_dir) if n.startswith(prefix) and (n.endswith(".db") or n.endswith(".db.gz"))]
+    return [os.path.join(dest_dir, n) for n in sorted(names)]
+
+
+def rotate(dest_dir, db_path, keep):
+    old = snapshots(dest_dir, db_path)[:-keep] if keep > 0 else []
+    for path in old:
+        os.remove(path)
+    return len(old)
+
+
+def take_backup(db_path, dest_dir, keep=7, compress=True):
+    # returns (path, size_bytes, seconds); raises BackupError if another backup is running
+    # or the snapshot fails its integrity check
+    if not _running.acquire(blocking=False):
+        raise BackupError("a backup is already running")
+    started = time.monotonic()
+    os.makedirs(dest_dir, exist_ok=True)
+    final = os.path.join(dest_dir, snapshot_name(db_path, compress))
+    tmp = final.removesuffix(".gz") + ".part"
+    try:
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst, pages=-1)  # all pages in one step, from one read snapshot
+            result = dst.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            dst.close()
+            src.close()
+        if result != "ok":
+            raise BackupError(f"integrity check failed: {result}")
+        if compress:
+            with open(tmp, "rb") as f_in, gzip.open(final + ".part", "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            os.remove(tmp)
+            tmp = final + ".part"
+        os.replace(tmp, final)  # only complete, checked snapshots get a real name
+        rotate(dest_dir, db_path, keep)
+        return final, os.path.getsize(final), time.monotonic() - started
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        _running.release()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Take an online, integrity-checked backup of a bot database.")
+    ap.add_argument("--db", required=True)
+    ap.add_argument("--dest", default="backups")
+    ap.add_argument("--keep", type=int, default=7, help="snapshots to retain")
+    ap.add_argument("--no-compress", dest="compress", action="store_false")
+    args = ap.parse_args()
+    path, size, secs = take_backup(args.db, args.dest, args.keep, args.compress)
+    print(f"Backed up {args.db} to {path} ({size} bytes, {secs:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
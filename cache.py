@@ -0,0 +1,87 @@
+# cache.py
+# Small in-process caches shared by both bots.
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    # Bounded least-recently-used map. Thread-safe, since telebot runs handlers in worker threads.
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            return self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class ExpiringSet:
+    # Remembers keys for `ttl` seconds. add() returns False when the key is already present,
+    # which makes it a cheap duplicate detector. Keys are stored as 64-bit hashes.
+    def __init__(self, ttl, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.data = OrderedDict()  # hash -> expiry, oldest first (ttl is constant)
+        self.lock = threading.Lock()
+        self.duplicates = 0
+
+    def add(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        h = hash(key)
+        with self.lock:
+            while self.data:
+                oldest, expiry = next(iter(self.data.items()))
+                if expiry > now:
+                    break
+                del self.data[oldest]
+            if h in self.data:
+                self.duplicates += 1
+                return False
+            self.data[h] = now + self.ttl
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self.data)
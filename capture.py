@@ -0,0 +1,140 @@
+# capture.py
+# Opt-in recording of incoming updates, shared by both bots; replay.py plays the files back.
+#
+# The bot hands each raw update (a dict) to Capture.record(), which only puts it on a queue.
+# A background thread pseudonymizes it and appends it as one JSON line to a gzip file, starting
+# a new file every rotate_bytes (of uncompressed JSON) or rotate_secs. If the writer falls
+# behind, updates are dropped from the capture (and counted) rather than slowing the bot down.
+#
+# User and chat ids become stable HMAC-derived numbers: the same person keeps the same id across
+# the whole capture (and across restarts while the secret is unchanged), so conversations still
+# line up on replay, but the real id can't be recovered without the secret. Names, usernames and
+# phone numbers are replaced too. Ids in keep_ids (the admins) are left alone so admin flows replay.
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+QUEUE_SIZE = 10000
+FLUSH_INTERVAL = 5  # seconds of quiet before buffered lines are flushed to disk
+# objects whose "id" identifies a person or chat
+ID_KEYS = ("from", "chat", "user", "forward_from", "forward_from_chat", "sender_chat", "contact")
+PERSONAL_FIELDS = ("first_name", "last_name", "username", "phone_number")
+
+
+def _token(secret, text):
+    return int.from_bytes(hmac.new(secret, text.encode(), hashlib.sha256).digest()[:6], "big") or 1
+
+
+def pseudonym(secret, value):
+    # same sign as the original, so group/channel ids stay negative; fits in 48 bits like real ids
+    n = _token(secret, str(abs(value)))
+    return -n if value < 0 else n
+
+
+def pseudonymize(obj, secret, keep_ids=()):
+    # returns a scrubbed copy of a raw update
+    if isinstance(obj, list):
+        return [pseudonymize(v, secret, keep_ids) for v in obj]
+    if not isinstance(obj, dict):
+        return obj
+    out = {}
+    for key, value in obj.items():
+        if key in ID_KEYS and isinstance(value, dict):
+            value = dict(value)
+            for id_key in ("id", "user_id"):
+                if isinstance(value.get(id_key), int) and value[id_key] not in keep_ids:
+                    value[id_key] = pseudonym(secret, value[id_key])
+            for field in PERSONAL_FIELDS:
+                if field in value:
+                    value[field] = f"{field[:4]}{_token(secret, f'{field}:{value[field]}') % 1000000}"
+        out[key] = pseudonymize(value, secret, keep_ids)
+    return out
+
+
+class Capture:
+    def __init__(self, out_dir, secret, keep_ids=(), rotate_bytes=64 * 1024 * 1024, rotate_secs=3600, prefix="updates"):
+        self.out_dir = out_dir
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+        self.keep_ids = set(keep_ids)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_secs = rotate_secs
+        self.prefix = prefix
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.recorded = 0
+        self.dropped = 0
+        self.file = None
+        self.path = None
+        self.files = 0
+        self.opened_at = 0.0
+        self.written = 0
+        os.makedirs(out_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self.thread.start()
+
+    def record(self, update):
+        # called on the bot's hot path: never blocks
+        try:
+            self.queue.put_nowait((time.time(), update))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _open(self):
+        self.files += 1
+        name = f"{self.prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.files:04d}.jsonl.gz"
+        self.path = os.path.join(self.out_dir, name)
+        self.file = gzip.open(self.path, "wt", encoding="utf-8")
+        self.opened_at = time.monotonic()
+        self.written = 0
+
+    def _close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _run(self):
+        dirty = False
+        while True:
+            try:
+                item = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                if dirty:
+                    self.file.flush()
+                    dirty = False
+                continue
+            if item is None:
+                self._close()
+                return
+            received_at, update = item
+            if self.file is None or self.written >= self.rotate_bytes or time.monotonic() - self.opened_at >= self.rotate_secs:
+                self._close()
+                self._open()
+            line = json.dumps({"t": round(received_at, 3), "update": pseudonymize(update, self.secret, self.keep_ids)},
+                              ensure_ascii=False, separators=(",", ":")) + "\n"
+            self.file.write(line)
+            self.written += len(line)
+            self.recorded += 1
+            dirty = True
+
+
+def read_capture(paths):
+    # yields (received_at, update) from capture files in order; a file still being written
+    # (or cut short by a crash) is read up to its last complete line
+    for path in sorted(paths):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.endswith("\n"):
+                        item = json.loads(line)
+                        yield item["t"], item["update"]
+            except (EOFError, gzip.BadGzipFile):
+                pass
@@ -0,0 +1,186 @@
+# cluster.py
+# Running several copies of a bot side by side, shared by both bots.
+#
+# Conversation state that must be visible to every instance goes through a StateStore: "memory"
+# keeps it in-process (a single instance, or tests), "sqlite://<path>" keeps it in a SQLite file
+# every instance can open. More backends register in STORE_BACKENDS.
+#
+# Work that must happen exactly once - long polling, the schedulers, the outbox - is guarded by a
+# Lease: a row in a shared SQLite file naming the holder and when its claim runs out. The holder
+# renews it every ttl/3 seconds; if it dies, another instance takes over once the claim expires.
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def instance_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:6]}"
+
+
+class MemoryStore:
+    # values go through JSON here too, so callers see the same copies a shared store would give them
+    def __init__(self):
+        self.data = {}  # key -> (json, expires_at or None)
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None or (item[1] is not None and item[1] <= now_ms()):
+                return default
+            return json.loads(item[0])
+
+    def set(self, key, value, ttl=None):
+        expires = now_ms() + int(ttl * 1000) if ttl else None
+        with self.lock:
+            self.data[key] = (json.dumps(value), expires)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def purge(self):
+        now = now_ms()
+        with self.lock:
+            dead = [k for k, (_, exp) in self.data.items() if exp is not None and exp <= now]
+            for k in dead:
+                del self.data[k]
+        return len(dead)
+
+
+class SQLiteStore:
+    TABLE = """
+    CREATE TABLE IF NOT EXISTS shared_state (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at INTEGER,
+        updated_at INTEGER NOT NULL
+    )
+    """
+
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(self.TABLE)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_shared_state_expires ON shared_state (expires_at) WHERE expires_at IS NOT NULL")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key, default=None):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, now_ms()),
+        ).fetchone()
+        conn.close()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = now_ms()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + int(ttl * 1000) if ttl else None, now),
+        )
+        conn.commit()
+        conn.close()
+
+    def delete(self, key):
+        conn = self._connect()
+        conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+        conn.commit()
+        conn.close()
+
+    def purge(self):
+        conn = self._connect()
+        n = conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (now_ms(),)).rowcount
+        conn.commit()
+        conn.close()
+        return n
+
+
+STORE_BACKENDS = {
+    "memory": lambda location: MemoryStore(),
+    "sqlite": SQLiteStore,
+}
+
+
+def open_store(url):
+    # "memory" or "<backend>://<location>", e.g. "sqlite:///srv/enzo/state.db"
+    scheme, _, location = url.partition("://")
+    if scheme not in STORE_BACKENDS:
+        raise ValueError(f"unknown state store {url!r}")
+    return STORE_BACKENDS[scheme](location)
+
+
+class Lease:
+    TABLE = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at INTEGER NOT NULL
+    )
+    """
+
+    def __init__(self, db_path, name, ttl=30, holder=None):
+        self.db_path = db_path
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or instance_id()
+        self.valid_until = 0.0  # monotonic; our own view of when the claim lapses
+        conn = sqlite3.connect(db_path, timeout=5)
+        conn.execute(self.TABLE)
+        conn.commit()
+        conn.close()
+
+    def acquire(self):
+        # takes the lease if it is free or expired, renews it if we already hold it;
+        # returns whether we hold it now
+        started = time.monotonic()
+        now = now_ms()
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            got = conn.execute(
+                """
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+                """,
+                (self.name, self.holder, now + int(self.ttl * 1000), now),
+            ).rowcount == 1
+            conn.commit()
+        finally:
+            conn.close()
+        # measured from before the write, so a slow commit can only shorten our claim
+        self.valid_until = started + self.ttl if got else 0.0
+        return got
+
+    def release(self):
+        self.valid_until = 0.0
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+        conn.commit()
+        conn.close()
+
+    def held(self):
+        # cheap local check for work loops; a holder that stalled past its ttl must assume it lost
+        return time.monotonic() < self.valid_until
+
+    def current(self):
+        # (holder, expires_at) or None
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+        conn.close()
+        return row
@@ -11,3 +11,90 @@ WELCOME_GIF_FILE_ID = "https://youtu.be/zN-rElTzR_4?si=Wv1Q4HnVyFbP-zyz"
 
 # Database path (can just be a local file for now)
 DB_PATH = "enzo_bot.db"
+
+# Optional: max messages/button taps per user per minute before the bot asks them to slow down
+FLOOD_LIMIT_PER_MINUTE = 30
+
+# Optional: orders per /myorders page and how many users' first page to keep cached
+HISTORY_PAGE_SIZE = 10
+HISTORY_CACHE_SIZE = 1000
+
+# Optional: timezone used to display dates to customers and admins
+DEFAULT_TZ = "Africa/Addis_Ababa"
+
+# Optional: number of orders kept in the in-memory lookup cache
+ORDER_CACHE_SIZE = 2000
+
+# Optional: seconds during which a repeated tap on the same button is ignored
+CALLBACK_DEDUP_TTL = 5
+
+# Optional: outbound notification queue (retries with exponential backoff, then dead-letters)
+OUTBOX_POLL_INTERVAL = 5
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = 10
+OUTBOX_BATCH_SIZE = 50
+
+# Optional: seconds to buffer receipt photos so bursts reach admins as albums of up to 10 (0 = off)
+DIGEST_WINDOW = 0
+
+# Optional: move done/cancelled/rejected orders older than this many days into monthly archive tables (0 = off)
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_INTERVAL = 21600
+
+# Optional: online backups (integrity-checked, gzipped, newest BACKUP_KEEP kept; interval 0 = off)
+BACKUP_DIR = "backups"
+BACKUP_INTERVAL = 86400
+BACKUP_KEEP = 7
+BACKUP_COMPRESS = True
+
+# Optional: admin reports (/orders, /stats, /find) run on read-only connections, at most this many at once
+REPORT_CONCURRENCY = 2
+REPORT_TIMEOUT = 10
+
+# Optional: run several instances against the same DB_PATH. Conversation state moves to STATE_STORE
+# ("memory" or "sqlite://<path>"; defaults to DB_PATH when clustered) and one instance at a time holds
+# the leader lease for polling and the background workers; another takes over LEASE_TTL seconds after it dies
+CLUSTER_MODE = False
+LEASE_TTL = 30
+
+# Optional: receive updates by webhook (every instance serves it, so a load balancer can spread them)
+WEBHOOK_URL = None
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_SECRET = None
+
+# Optional: update ingestion. Handler threads, the getUpdates long-poll wait, and after an outage
+# skip text messages older than this many seconds instead of answering them late (0 = off)
+UPDATE_WORKERS = 4
+LONG_POLL_TIMEOUT = 25
+DROP_UPDATES_OLDER_THAN = 0
+
+# Optional: load shedding. Payment-related updates get PAYMENT_WORKERS threads of their own; past
+# LOAD_DEGRADE_AT queued updates (or LOAD_DEGRADE_LAG seconds behind) the welcome GIF is skipped and
+# receipts are batched for DEGRADED_DIGEST_WINDOW seconds; past LOAD_SHED_AT / LOAD_SHED_LAG /start
+# and menu navigation are dropped. Webhook updates beyond UPDATE_QUEUE_MAX are handed back to Telegram,
+# and polling stops fetching until fewer are queued
+PAYMENT_WORKERS = 2
+LOAD_DEGRADE_AT = 50
+LOAD_SHED_AT = 200
+LOAD_DEGRADE_LAG = 5
+LOAD_SHED_LAG = 30
+UPDATE_QUEUE_MAX = 1000
+DEGRADED_DIGEST_WINDOW = 60
+
+# Optional: record incoming updates (user ids pseudonymized with CAPTURE_SECRET) as rotated
+# gzip JSONL files in CAPTURE_DIR, for replay.py. None = off
+CAPTURE_DIR = None
+CAPTURE_SECRET = None
+CAPTURE_ROTATE_MB = 64
+CAPTURE_ROTATE_SECS = 3600
+
+# Optional: handler profiling (see profiling.py). Every handler call is timed; this fraction is
+# also run under cProfile. 0 = timing only; /profile on switches sampling on at runtime
+PROFILE_SAMPLE_RATE = 0
+PROFILE_DIR = "profiles"
+PROFILE_TOP_N = 25
+
+# Optional: start tracemalloc at boot for /memstats snapshot (slows the bot down; normally
+# switched on for a while with /memstats trace on instead)
+MEMTRACE = False
@@ -3,12 +3,37 @@
 # Full Enzo Promotion Bot main file (requires config.py in same folder)
 
 import logging
+import os
+import shutil
 import sqlite3
-from datetime import datetime
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 from uuid import uuid4
+from zoneinfo import ZoneInfo
 
 import telebot
-from telebot import types
+from telebot import apihelper, types
+
+import archive
+import backup
+import capture
+import cluster
+import config
+import export
+import ingest
+import loadshed
+import memaudit
+import outbox
+import profiling
+import reporting
+import search
+from cache import ExpiringSet, LRUCache
+from ratelimit import RateLimiter, Tier, flood_guard
 
 # ----------------- load config -----------------
 try:
@@ -16,48 +41,478 @@ try:
 except Exception as e:
     raise RuntimeError("Missing config.py with BOT_TOKEN, ADMIN_IDS, WELCOME_GIF_FILE_ID, DB_PATH") from e
 
+# optional settings (older config.py files may not define them)
+FLOOD_LIMIT_PER_MINUTE = getattr(config, "FLOOD_LIMIT_PER_MINUTE", 30)
+HISTORY_PAGE_SIZE = getattr(config, "HISTORY_PAGE_SIZE", 10)
+HISTORY_CACHE_SIZE = getattr(config, "HISTORY_CACHE_SIZE", 1000)
+ORDER_CACHE_SIZE = getattr(config, "ORDER_CACHE_SIZE", 2000)
+CALLBACK_DEDUP_TTL = getattr(config, "CALLBACK_DEDUP_TTL", 5)  # seconds a repeated button tap is ignored
+OUTBOX_POLL_INTERVAL = getattr(config, "OUTBOX_POLL_INTERVAL", 5)  # seconds between outbox sweeps
+OUTBOX_MAX_ATTEMPTS = getattr(config, "OUTBOX_MAX_ATTEMPTS", 8)
+OUTBOX_BACKOFF_BASE = getattr(config, "OUTBOX_BACKOFF_BASE", 10)  # seconds, doubled per failed attempt
+OUTBOX_BATCH_SIZE = getattr(config, "OUTBOX_BATCH_SIZE", 50)
+DIGEST_WINDOW = getattr(config, "DIGEST_WINDOW", 0)  # seconds receipts are buffered into albums; 0 = off
+ARCHIVE_AFTER_DAYS = getattr(config, "ARCHIVE_AFTER_DAYS", 90)  # finished orders older than this leave the live table; 0 = off
+ARCHIVE_INTERVAL = getattr(config, "ARCHIVE_INTERVAL", 6 * 3600)  # seconds between archive runs
+BACKUP_DIR = getattr(config, "BACKUP_DIR", "backups")
+BACKUP_INTERVAL = getattr(config, "BACKUP_INTERVAL", 24 * 3600)  # seconds between scheduled backups; 0 = off
+BACKUP_KEEP = getattr(config, "BACKUP_KEEP", 7)  # snapshots retained
+BACKUP_COMPRESS = getattr(config, "BACKUP_COMPRESS", True)
+REPORT_CONCURRENCY = getattr(config, "REPORT_CONCURRENCY", 2)  # admin reports running at once
+REPORT_TIMEOUT = getattr(config, "REPORT_TIMEOUT", 10)  # seconds before a report query is aborted
+DEFAULT_TZ = getattr(config, "DEFAULT_TZ", "Africa/Addis_Ababa")
+CLUSTER_MODE = getattr(config, "CLUSTER_MODE", False)  # several instances share DB_PATH; one leads
+STATE_STORE = getattr(config, "STATE_STORE", f"sqlite://{DB_PATH}" if CLUSTER_MODE else "memory")
+LEASE_TTL = getattr(config, "LEASE_TTL", 30)  # seconds before a silent leader is replaced
+WEBHOOK_URL = getattr(config, "WEBHOOK_URL", None)  # public https URL; set = webhook instead of polling
+WEBHOOK_LISTEN = getattr(config, "WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = getattr(config, "WEBHOOK_PORT", 8443)
+WEBHOOK_SECRET = getattr(config, "WEBHOOK_SECRET", None)
+UPDATE_WORKERS = getattr(config, "UPDATE_WORKERS", 4)  # threads running handlers
+LONG_POLL_TIMEOUT = getattr(config, "LONG_POLL_TIMEOUT", 25)  # seconds getUpdates waits for news
+DROP_UPDATES_OLDER_THAN = getattr(config, "DROP_UPDATES_OLDER_THAN", 0)  # seconds; stale text after an outage is skipped; 0 = off
+PAYMENT_WORKERS = getattr(config, "PAYMENT_WORKERS", 2)  # threads reserved for payment-related updates
+LOAD_DEGRADE_AT = getattr(config, "LOAD_DEGRADE_AT", 50)  # queued updates before optional work is skipped
+LOAD_SHED_AT = getattr(config, "LOAD_SHED_AT", 200)  # queued updates before low-value updates are dropped
+LOAD_DEGRADE_LAG = getattr(config, "LOAD_DEGRADE_LAG", 5)  # seconds behind, same meaning
+LOAD_SHED_LAG = getattr(config, "LOAD_SHED_LAG", 30)
+UPDATE_QUEUE_MAX = getattr(config, "UPDATE_QUEUE_MAX", 1000)  # webhook: past this Telegram is asked to retry later
+DEGRADED_DIGEST_WINDOW = getattr(config, "DEGRADED_DIGEST_WINDOW", 60)  # seconds receipts are buffered while degraded
+CAPTURE_DIR = getattr(config, "CAPTURE_DIR", None)  # record incoming updates here for replay.py; None = off
+CAPTURE_SECRET = getattr(config, "CAPTURE_SECRET", None)  # keys the user id pseudonyms; keep it stable and private
+CAPTURE_ROTATE_MB = getattr(config, "CAPTURE_ROTATE_MB", 64)
+CAPTURE_ROTATE_SECS = getattr(config, "CAPTURE_ROTATE_SECS", 3600)
+PROFILE_SAMPLE_RATE = getattr(config, "PROFILE_SAMPLE_RATE", 0)  # fraction of handler calls run under cProfile; 0 = timing only
+PROFILE_DIR = getattr(config, "PROFILE_DIR", "profiles")  # where /profile dump and SIGUSR1 write pstats files
+PROFILE_TOP_N = getattr(config, "PROFILE_TOP_N", 25)  # functions per handler in the text summary
+MEMTRACE = getattr(config, "MEMTRACE", False)  # start tracemalloc at boot (else /memstats trace on)
+
+if CLUSTER_MODE:
+    # the caches are per process and only the writing instance would drop its stale entries
+    ORDER_CACHE_SIZE = HISTORY_CACHE_SIZE = 0
+
+MAX_MESSAGE_LEN = 4096
+MAX_CAPTION_LEN = 1024
+MEDIA_GROUP_MAX = 10
+DEFAULT_ZONE = ZoneInfo(DEFAULT_TZ)
+
 # ----------------- init -----------------
 logging.basicConfig(level=logging.INFO)
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode="HTML")
+# handlers run on UPDATE_POOL (see update ingestion), not on telebot's own worker threads
+bot = telebot.TeleBot(BOT_TOKEN, parse_mode="HTML", threaded=False)
 
 # ----------------- DB -----------------
+# All timestamps are stored as integer epoch milliseconds (UTC).
+SCHEMA_VERSION = 1
+
+ORDERS_TABLE = """
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    telegram_id INTEGER,
+    username TEXT,
+    service TEXT,
+    package_group TEXT,
+    package_qty TEXT,
+    price TEXT,
+    link_or_username TEXT,
+    payment_method TEXT,
+    receipt_file_id TEXT,
+    status TEXT,
+    created_at INTEGER
+)
+"""
+
+ORDER_SEARCH_COLUMNS = ("username", "link_or_username", "service", "package_group")
+
+def now_ms():
+    return int(time.time() * 1000)
+
+def fmt_ts(ms, tz=None):
+    if ms is None:
+        return "-"
+    return datetime.fromtimestamp(ms / 1000, tz or DEFAULT_ZONE).strftime("%Y-%m-%d %H:%M")
+
+def iso_to_ms(value):
+    # legacy rows hold naive UTC strings from datetime.utcnow().isoformat()
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        dt = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def rebuild_with_epoch(c, table, create_sql, time_cols):
+    # SQLite can't change a column's type in place: copy into a fresh table, converting time columns
+    c.execute(f"PRAGMA table_info({table})")
+    old_cols = [r[1] for r in c.fetchall()]
+    if not old_cols:
+        c.execute(create_sql)
+        return
+    c.execute(f"ALTER TABLE {table} RENAME TO {table}_pre_epoch")
+    c.execute(create_sql)
+    c.execute(f"PRAGMA table_info({table})")
+    cols = [r[1] for r in c.fetchall() if r[1] in old_cols]
+    select = ", ".join(f"iso_to_ms({col})" if col in time_cols else col for col in cols)
+    c.execute(f"INSERT INTO {table} ({', '.join(cols)}) SELECT {select} FROM {table}_pre_epoch")
+    dropped = [col for col in old_cols if col not in cols]
+    if dropped:
+        # unknown legacy columns: keep the old table around instead of losing data
+        logging.warning("Kept %s_pre_epoch: columns %s have no place in the new schema", table, dropped)
+        return
+    c.execute(f"DROP TABLE {table}_pre_epoch")
+
+def migrate_db(conn):
+    conn.create_function("iso_to_ms", 1, iso_to_ms)
+    c = conn.cursor()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # 1: ISO-8601 strings -> integer epoch milliseconds
+        rebuild_with_epoch(c, "orders", ORDERS_TABLE, ("created_at",))
+        if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'status_counters'").fetchone():
+            c.execute("DELETE FROM status_counters WHERE tbl = 'orders'")  # reseeded by init_db
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
 def init_db():
     conn = sqlite3.connect(DB_PATH)
+    # WAL lets long reads (exports, reports) run without blocking order writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    migrate_db(conn)
     c = conn.cursor()
+    c.execute(ORDERS_TABLE)
+    # notifications written in the same transaction as the status change they announce
+    outbox.init_outbox(c)
+    # /myorders pages walk this index with a (created_at, id) cursor
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (telegram_id, created_at, id)")
+    # /orders lists the newest orders first
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at)")
+    # per-day (UTC) status counters kept current by triggers, so /stats never scans orders
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS status_counters (
+        tbl TEXT NOT NULL,
+        day TEXT NOT NULL,
+        status TEXT NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tbl, day, status)
+    ) WITHOUT ROWID
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_orders_count_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO status_counters (tbl, day, status, n)
+        VALUES ('orders', date(NEW.created_at / 1000, 'unixepoch'), coalesce(NEW.status, ''), 1)
+        ON CONFLICT (tbl, day, status) DO UPDATE SET n = n + 1;
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_orders_count_status AFTER UPDATE OF status ON orders
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE status_counters SET n = n - 1
+        WHERE tbl = 'orders' AND day = date(OLD.created_at / 1000, 'unixepoch') AND status = coalesce(OLD.status, '');
+        INSERT INTO status_counters (tbl, day, status, n)
+        VALUES ('orders', date(NEW.created_at / 1000, 'unixepoch'), coalesce(NEW.status, ''), 1)
+        ON CONFLICT (tbl, day, status) DO UPDATE SET n = n + 1;
+    END
+    """)
+    # every admin's copy of a receipt notification, so one button tap can update them all.
+    # kind: 'caption' (photo/document), 'text' (text fallback) or 'digest' (album action message)
     c.execute("""
-    CREATE TABLE IF NOT EXISTS orders (
-        id TEXT PRIMARY KEY,
-        telegram_id INTEGER,
-        username TEXT,
-        service TEXT,
-        package_group TEXT,
-        package_qty TEXT,
-        price TEXT,
-        link_or_username TEXT,
-        payment_method TEXT,
-        receipt_file_id TEXT,
-        status TEXT,
-        created_at TEXT
+    CREATE TABLE IF NOT EXISTS admin_messages (
+        order_id TEXT NOT NULL,
+        chat_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        PRIMARY KEY (order_id, chat_id, message_id)
     )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_admin_messages_msg ON admin_messages (chat_id, message_id)")
+    # full-text index behind /find
+    search.init_fts(c, "orders", ORDER_SEARCH_COLUMNS)
+    # monthly archive tables for finished orders, and the orders_all view over everything
+    archive.init_archive(c, "orders", ORDER_SEARCH_COLUMNS)
+    # first run on an existing database: seed the counters from history once
+    c.execute("SELECT 1 FROM status_counters WHERE tbl = 'orders' LIMIT 1")
+    if c.fetchone() is None:
+        c.execute("""
+        INSERT INTO status_counters (tbl, day, status, n)
+        SELECT 'orders', date(created_at / 1000, 'unixepoch'), coalesce(status, ''), COUNT(*)
+        FROM orders GROUP BY 2, 3
+        """)
     conn.commit()
     conn.close()
 
 init_db()
 
+# admin reports read through their own read-only connections; see reporting.py
+REPORTS = reporting.ReportingDB(DB_PATH, REPORT_CONCURRENCY, REPORT_TIMEOUT)
+
 # ----------------- state (simple FSM) -----------------
-USER_STATE = {}  # user_id -> {"stage": str, "order_id": str}
+# user_id -> [stage, order_id], kept in STATE_STORE so whichever instance gets the user's next
+# update can carry on; abandoned conversations expire after STATE_TTL and are purged every
+# STATE_PURGE_INTERVAL
+USER_STATE = cluster.open_store(STATE_STORE)
+STATE_TTL = 24 * 3600
+STATE_PURGE_INTERVAL = 600  # seconds between sweeps of expired state
+
+class UserState:
+    # stage names come from a handful of literals; interning makes every record share one copy
+    __slots__ = ("stage", "order_id")
+
+    def __init__(self, stage=None, order_id=None):
+        self.stage = sys.intern(stage) if stage else None
+        self.order_id = order_id
+
+NO_STATE = UserState()
 
 def set_state(user_id, stage, order_id=None):
-    USER_STATE[user_id] = {"stage": stage, "order_id": order_id}
+    USER_STATE.set(f"fsm:{user_id}", [stage, order_id], ttl=STATE_TTL)
 
 def get_state(user_id):
-    return USER_STATE.get(user_id, {"stage": None, "order_id": None})
+    raw = USER_STATE.get(f"fsm:{user_id}")
+    if raw is None:
+        return NO_STATE
+    if isinstance(raw, dict):  # written by an instance from before the compact format
+        raw = [raw.get("stage"), raw.get("order_id")]
+    return UserState(*raw)
 
 def clear_state(user_id):
-    USER_STATE.pop(user_id, None)
+    USER_STATE.delete(f"fsm:{user_id}")
+
+def state_purge_worker():
+    # expired entries are invisible to get_state() but stay in memory (or the file) until purged
+    while True:
+        time.sleep(STATE_PURGE_INTERVAL)
+        if not is_leader():
+            continue
+        try:
+            n = USER_STATE.purge()
+            if n:
+                logging.info("Purged %s expired state entries", n)
+        except sqlite3.Error as e:
+            logging.warning("State purge failed: %s", e)
+
+# ----------------- clustering -----------------
+# In CLUSTER_MODE every instance handles updates, but only the holder of the leader lease
+# long-polls (or registers the webhook) and runs the outbox, archive and backup workers.
+# See cluster.py.
+LEASE = cluster.Lease(DB_PATH, "enzo-leader", LEASE_TTL) if CLUSTER_MODE else None
+
+def is_leader():
+    return LEASE is None or LEASE.held()
+
+def on_elected():
+    if WEBHOOK_URL:
+        bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET, allowed_updates=ingest.ALLOWED_UPDATES)
+    else:
+        bot.remove_webhook()  # Telegram refuses getUpdates while a webhook is set
+
+def leadership_worker():
+    leading = False
+    while True:
+        try:
+            held = LEASE.acquire()
+        except sqlite3.Error as e:
+            logging.warning("Lease renewal failed: %s", e)
+            held = LEASE.held()
+        try:
+            if held and not leading:
+                logging.info("Instance %s is now the leader", LEASE.holder)
+                on_elected()
+            elif leading and not held:
+                logging.warning("Instance %s lost the leader lease", LEASE.holder)
+                POLL_STOP.set()
+            leading = held
+        except Exception as e:
+            logging.exception("Leadership change failed, retrying: %s", e)
+        time.sleep(LEASE_TTL / 3)
+
+def create_webhook_app():
+    # every instance serves the webhook, so a load balancer can spread updates across them
+    from flask import Flask, abort, request  # only needed in webhook mode
+    from urllib.parse import urlparse
+    app = Flask(__name__)
+
+    @app.post(urlparse(WEBHOOK_URL).path or "/")
+    def telegram_webhook():
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            abort(403)
+        raw = request.get_json(force=True)
+        update = types.Update.de_json(raw)
+        if PIPELINE.depth >= UPDATE_QUEUE_MAX and update_priority(update) != loadshed.CRITICAL:
+            # backpressure: Telegram keeps the update and retries it later
+            PIPELINE.note("webhook_retry_later")
+            return "", 503
+        if CAPTURE:
+            CAPTURE.record(raw)  # only once accepted, so a retried update is recorded once
+        # handlers run on the worker pools; Telegram gets its 200 straight away
+        submit_update(update)
+        return ""
+
+    return app
+
+# ----------------- update ingestion -----------------
+# Our own getUpdates loop instead of infinity_polling: only the update types we handle are
+# requested, updates are stashed on disk before Telegram is told we have them, the checkpoint
+# only moves past updates whose handlers have finished, and a restart resumes from it.
+# Delivery is at-least-once: nothing is lost, but updates handled since the last checkpoint
+# (at most about CHECKPOINT_INTERVAL's worth) are handled again after a crash. See ingest.py.
+# Payment-related updates get their own pool, so a flood of /start never queues ahead of them,
+# and under load low-value updates are shed first. See loadshed.py.
+UPDATE_POOL = ThreadPoolExecutor(max_workers=UPDATE_WORKERS, thread_name_prefix="update")
+PAYMENT_POOL = ThreadPoolExecutor(max_workers=PAYMENT_WORKERS, thread_name_prefix="payment")
+PIPELINE = loadshed.Pipeline(LOAD_DEGRADE_AT, LOAD_SHED_AT, LOAD_DEGRADE_LAG, LOAD_SHED_LAG)
+OFFSETS = ingest.OffsetStore(DB_PATH, "enzo")
+POLL_STOP = threading.Event()
+CHECKPOINT_INTERVAL = 1  # getUpdates wait while handlers are running, so the checkpoint keeps up
+if CAPTURE_DIR and not CAPTURE_SECRET:
+    logging.warning("CAPTURE_SECRET is not set: pseudonyms will change on every restart")
+CAPTURE = capture.Capture(CAPTURE_DIR, CAPTURE_SECRET or os.urandom(32), ADMIN_IDS, CAPTURE_ROTATE_MB * 1024 * 1024,
+                          CAPTURE_ROTATE_SECS, prefix="enzo") if CAPTURE_DIR else None
+CRITICAL_CALLBACKS = ("pay|", "submit|", "attach|", "cancel_order|", "adm|")
+LOW_CALLBACKS = ("svc|", "grp|", "back", "myo|", "mya|")
+LOW_COMMANDS = ("/start", "/myorders")
+BUSY_TEXT = "We're very busy right now. Please try again in a minute."
+
+def command_of(text):
+    # "/start@EnzoBot payload" -> "/start"
+    words = (text or "").split(maxsplit=1)
+    return words[0].split("@")[0] if words else ""
+
+def update_priority(update):
+    call = update.callback_query
+    if call is not None:
+        data = call.data or ""
+        if data.startswith(CRITICAL_CALLBACKS) or is_admin(call.from_user.id):
+            return loadshed.CRITICAL
+        return loadshed.LOW if data.startswith(LOW_CALLBACKS) else loadshed.NORMAL
+    m = update.message
+    if m is None:
+        return loadshed.NORMAL
+    if m.content_type in ("photo", "document") or is_admin(m.from_user.id):
+        return loadshed.CRITICAL  # receipts
+    if m.content_type == "text" and command_of(m.text) in LOW_COMMANDS:
+        return loadshed.LOW
+    return loadshed.NORMAL
+
+def submit_update(update):
+    # returns the handler's future, or None when the update was shed
+    m = update.message
+    ticket = PIPELINE.admit(update_priority(update), m.date if m else None)
+    if ticket is None:
+        if update.callback_query is not None:
+            ACK_POOL.submit(bot.answer_callback_query, update.callback_query.id, BUSY_TEXT)
+        return None
+    pool = PAYMENT_POOL if ticket[0] == loadshed.CRITICAL else UPDATE_POOL
+    return pool.submit(dispatch_update, update, ticket)
+
+def dispatch_update(update, ticket):
+    try:
+        bot.process_new_updates([update])
+    except Exception as e:
+        logging.exception("Error handling update %s: %s", update.update_id, e)
+    finally:
+        PIPELINE.done(ticket)
+
+def is_stale_update(update):
+    # after a long outage old texts and commands are skipped; receipts (media) and button taps never are
+    m = update.message
+    if m is None or m.content_type != "text":
+        return False
+    return ingest.is_stale(m.date, DROP_UPDATES_OLDER_THAN)
+
+def poll_updates():
+    # runs until POLL_STOP is set (lost leadership) or Ctrl+C. Fetching carries on while the pools
+    # work, so a receipt sent during a burst of /start is picked up straight away and the
+    # pipeline sees the real backlog; it pauses once UPDATE_QUEUE_MAX updates are queued.
+    last = OFFSETS.load()  # everything up to here is handled
+    seen = last  # newest update handed to the pools
+    inflight = deque()  # (update_id, future, or None when there is nothing to wait for), oldest first
+
+    def dispatch(raw):
+        nonlocal seen
+        stale = 0
+        for update in map(types.Update.de_json, raw):
+            if is_stale_update(update):
+                stale += 1
+                inflight.append((update.update_id, None))
+            else:
+                inflight.append((update.update_id, submit_update(update)))
+            seen = update.update_id
+        if stale:
+            logging.info("Dropped %s stale update(s)", stale)
+
+    def checkpoint():
+        nonlocal last
+        done = last
+        while inflight and (inflight[0][1] is None or inflight[0][1].done()):
+            done = inflight.popleft()[0]
+        if done > last:
+            last = done
+            OFFSETS.save(last)
+
+    logging.info("Polling from update %s", last + 1 if last else "(first run)")
+    try:
+        dispatch(OFFSETS.pending())  # fetched before a restart but never handled
+        while not POLL_STOP.is_set():
+            checkpoint()
+            if PIPELINE.depth >= UPDATE_QUEUE_MAX:
+                # backpressure: leave the rest with Telegram until the pools catch up
+                wait([f for _, f in inflight if f is not None], timeout=CHECKPOINT_INTERVAL, return_when=FIRST_COMPLETED)
+                continue
+            try:
+                # raw dicts rather than bot.get_updates(), so captures hold exactly what Telegram sent
+                raw = apihelper.get_updates(BOT_TOKEN, seen + 1 if seen else None, None, LONG_POLL_TIMEOUT + 10,
+                                            ingest.ALLOWED_UPDATES, CHECKPOINT_INTERVAL if inflight else LONG_POLL_TIMEOUT)
+            except Exception as e:
+                logging.warning("getUpdates failed: %s", e)
+                POLL_STOP.wait(3)
+                continue
+            raw = [u for u in raw if u["update_id"] > seen]
+            if not raw:
+                continue
+            # on disk before the next getUpdates confirms them to Telegram
+            OFFSETS.stash(raw)
+            if CAPTURE:
+                for u in raw:
+                    CAPTURE.record(u)
+            dispatch(raw)
+    finally:
+        # on Ctrl+C or lost leadership, what was handed out still finishes and is checkpointed
+        wait([f for _, f in inflight if f is not None])
+        checkpoint()
+
+# ----------------- flood guard -----------------
+# per-user sliding window kept in memory, checked before any handler work
+FLOOD_LIMITER = RateLimiter([Tier("minute", FLOOD_LIMIT_PER_MINUTE, 60)])
+
+def on_flood_message(m, retry_after):
+    bot.send_message(m.chat.id, f"Too many requests. Try again in {int(retry_after) + 1}s.")
+
+def on_flood_callback(call, retry_after):
+    bot.answer_callback_query(call.id, f"Slow down. Try again in {int(retry_after) + 1}s.")
+
+def sender_key(update):
+    return update.from_user.id
+
+# ----------------- callback dedup -----------------
+# (user, message, data) of state-changing taps seen recently; double taps on slow
+# connections are acknowledged but not executed again
+CALLBACK_DEDUP = ExpiringSet(CALLBACK_DEDUP_TTL)
+DEDUP_PREFIXES = ("pkg|", "submit|", "change|", "attach|", "pay|", "cancel_order|", "adm|")
+
+def is_duplicate_tap(call):
+    data = call.data or ""
+    if not data.startswith(DEDUP_PREFIXES):
+        return False  # navigation is idempotent anyway
+    return not CALLBACK_DEDUP.add((call.from_user.id, call.message.message_id, data))
 
 # ----------------- utilities -----------------
+# first page of /myorders per user, dropped whenever one of that user's orders changes
+HISTORY_CACHE = LRUCache(HISTORY_CACHE_SIZE)
+# read-through cache for db_get_order; every write path drops the entry
+ORDER_CACHE = LRUCache(ORDER_CACHE_SIZE)
+
 def new_order_id():
     return str(uuid4())[:12]
 
@@ -73,10 +528,12 @@ def db_insert_order(order):
         order['id'], order['telegram_id'], order.get('username',''),
         order.get('service',''), order.get('package_group',''), order.get('package_qty',''), order.get('price',''),
         order.get('link_or_username',''), order.get('payment_method',''), order.get('receipt_file_id',''),
-        order.get('status','created'), order.get('created_at', datetime.utcnow().isoformat())
+        order.get('status','created'), order.get('created_at') or now_ms()
     ))
     conn.commit()
     conn.close()
+    ORDER_CACHE.pop(order['id'])
+    HISTORY_CACHE.pop(order['telegram_id'])
 
 def db_update_order_field(order_id, field, value):
     conn = sqlite3.connect(DB_PATH)
@@ -84,24 +541,147 @@ def db_update_order_field(order_id, field, value):
     # safe-ish update
     c.execute(f"UPDATE orders SET {field}=? WHERE id=?", (value, order_id))
     conn.commit()
+    ORDER_CACHE.pop(order_id)
+    c.execute("SELECT telegram_id FROM orders WHERE id=?", (order_id,))
+    row = c.fetchone()
     conn.close()
+    if row:
+        HISTORY_CACHE.pop(row[0])
+
+# statuses an order may move out of, per transition (compare-and-set on status)
+EDITABLE_STATUSES = ("created", "link_received", "link_updated", "awaiting_receipt")
+CANCELLABLE_STATUSES = EDITABLE_STATUSES + ("pending_verification",)
+
+def db_transition_order(order_id, from_statuses, to_status, notify=None, **fields):
+    # updates status (and fields) only if the order is currently in one of from_statuses;
+    # returns False when another tap or admin got there first. `notify` rows are queued in
+    # the outbox in the same transaction, so they go out if and only if the change sticks.
+    assignments = ", ".join(["status=?"] + [f"{k}=?" for k in fields])
+    marks = ", ".join("?" for _ in from_statuses)
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        f"UPDATE orders SET {assignments} WHERE id=? AND status IN ({marks})",
+        (to_status, *fields.values(), order_id, *from_statuses),
+    )
+    changed = c.rowcount == 1
+    if changed and notify:
+        outbox.enqueue(c, notify)
+    conn.commit()
+    if changed:
+        if notify:
+            OUTBOX_WAKE.set()
+        ORDER_CACHE.pop(order_id)
+        c.execute("SELECT telegram_id FROM orders WHERE id=?", (order_id,))
+        row = c.fetchone()
+        if row:
+            HISTORY_CACHE.pop(row[0])
+    conn.close()
+    return changed
 
 def db_get_order(order_id):
+    cached = ORDER_CACHE.get(order_id)
+    if cached is not None:
+        return dict(cached)  # callers may modify their copy
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute("""
-    SELECT id, telegram_id, username, service, package_group, package_qty, price, link_or_username, payment_method, receipt_file_id, status, created_at
-    FROM orders WHERE id=?
-    """, (order_id,))
-    row = c.fetchone()
+    # live table first; archived orders are finished, but still worth showing
+    for src in ("orders", "orders_all"):
+        c.execute(f"""
+        SELECT id, telegram_id, username, service, package_group, package_qty, price, link_or_username, payment_method, receipt_file_id, status, created_at
+        FROM {src} WHERE id=?
+        """, (order_id,))
+        row = c.fetchone()
+        if row:
+            break
     conn.close()
     if not row:
         return None
     keys = ["id","telegram_id","username","service","package_group","package_qty","price","link_or_username","payment_method","receipt_file_id","status","created_at"]
-    return dict(zip(keys, row))
+    order = dict(zip(keys, row))
+    ORDER_CACHE.put(order_id, order)
+    return dict(order)
+
+def db_user_orders_page(telegram_id, before_id=None, limit=HISTORY_PAGE_SIZE, archived=False):
+    # newest first; before_id is the last order shown on the previous page.
+    # archived=True pages through orders_all, i.e. live and archived orders together
+    src = "orders_all" if archived else "orders"
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    if before_id is None:
+        c.execute(f"""
+        SELECT id, service, package_group, package_qty, price, status, created_at FROM {src}
+        WHERE telegram_id=? ORDER BY created_at DESC, id DESC LIMIT ?
+        """, (telegram_id, limit))
+    else:
+        c.execute(f"""
+        SELECT id, service, package_group, package_qty, price, status, created_at FROM {src}
+        WHERE telegram_id=? AND (created_at, id) < (SELECT created_at, id FROM {src} WHERE id=?)
+        ORDER BY created_at DESC, id DESC LIMIT ?
+        """, (telegram_id, before_id, limit))
+    rows = c.fetchall()
+    conn.close()
+    return rows
 
-def notify_admins_with_receipt(order, photo_file_id):
-    # compose admin message
+def db_search_orders(match, limit, offset=0):
+    # best bm25 matches first
+    return REPORTS.query("""
+    SELECT o.id, o.username, o.service, o.package_qty, o.price, o.status, o.created_at, o.link_or_username
+    FROM orders_fts JOIN orders o ON o.rowid = orders_fts.rowid
+    WHERE orders_fts MATCH ? ORDER BY orders_fts.rank LIMIT ? OFFSET ?
+    """, (match, limit, offset))
+
+def db_search_archived_orders(match, limit, offset=0):
+    refs = archive.search_archive(DB_PATH, "orders", match, limit, offset)
+    if not refs:
+        return []
+    rows = REPORTS.query(f"""
+    SELECT id, username, service, package_qty, price, status, created_at, link_or_username
+    FROM orders_all WHERE id IN ({", ".join("?" for _ in refs)})
+    """, refs)
+    found = {r[0]: r for r in rows}
+    return [found[ref] for ref in refs if ref in found]  # keep the bm25 order
+
+def db_status_counts(since=None, until=None, daily=False):
+    # since/until are inclusive YYYY-MM-DD bounds on the order's creation day
+    cols = "day, status" if daily else "status"
+    return REPORTS.query(f"""
+    SELECT {cols}, SUM(n) FROM status_counters
+    WHERE tbl = 'orders' AND day >= ? AND day <= ?
+    GROUP BY {cols} HAVING SUM(n) != 0 ORDER BY {cols}
+    """, (since or "0000-00-00", until or "9999-99-99"))
+
+def db_recent_orders(include_archived=False, limit=30):
+    src = "orders_all" if include_archived else "orders"
+    return REPORTS.query(f"""
+    SELECT id, telegram_id, username, service, package_group, package_qty, price, status, created_at
+    FROM {src} ORDER BY created_at DESC LIMIT ?
+    """, (limit,))
+
+def db_add_admin_messages(rows):
+    # rows: (order_id, chat_id, message_id, kind)
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany("INSERT OR IGNORE INTO admin_messages (order_id, chat_id, message_id, kind) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+def db_admin_messages(order_id):
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("SELECT chat_id, message_id, kind FROM admin_messages WHERE order_id=?", (order_id,)).fetchall()
+    conn.close()
+    return rows
+
+def db_message_orders(chat_id, message_id):
+    # orders listed on one digest action message, in album order
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute(
+        "SELECT order_id FROM admin_messages WHERE chat_id=? AND message_id=? ORDER BY rowid",
+        (chat_id, message_id),
+    ).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+def receipt_text(order, status, actor=None):
     text = (
         f"📥 New Payment Received\n\n"
         f"🧾 Order ID: {order['id']}\n"
@@ -111,18 +691,172 @@ def notify_admins_with_receipt(order, photo_file_id):
         f"💰 Price: {order['price']}\n"
         f"🔗 Link/Username: {order['link_or_username']}\n"
         f"🏦 Payment Method: {order['payment_method'] or 'N/A'}\n"
-        f"Status: pending_verification"
+        f"Status: {status}"
     )
-    for aid in ADMIN_IDS:
+    return f"{text} (by {actor})" if actor else text
+
+def notify_admins_with_receipt(order, photo_file_id, is_photo=True):
+    # outbox rows for the admin notification; queued together with the status change.
+    # only photos can be bundled into digest albums, documents always go out on their own
+    text = receipt_text(order, "pending_verification")
+    kind = "receipt" if is_photo else "receipt_document"
+    return [outbox.message(aid, text, kind=kind, photo_file_id=photo_file_id, ref=order['id']) for aid in ADMIN_IDS]
+
+# ----------------- outbox worker -----------------
+OUTBOX_WAKE = threading.Event()
+
+def is_permanent_error(e):
+    # blocked by the user / chat not found: retrying won't help
+    return getattr(e, "error_code", None) in (400, 403)
+
+RECEIPT_KINDS = ("receipt", "receipt_document")
+
+def deliver_outbox_row(row):
+    # receipts carry the admin action buttons and are remembered so taps can update every copy
+    receipt = row["kind"] in RECEIPT_KINDS
+    markup = kb_admin_order(row["ref"], "pending_verification") if receipt else None
+    sent, kind = None, "text"
+    if row["photo_file_id"]:
         try:
             # send photo with caption (Telegram has limits on caption length)
-            bot.send_photo(aid, photo_file_id, caption=text)
-        except Exception:
-            # fallback: send text then forward the user's photo message (we don't have message_id here)
-            try:
-                bot.send_message(aid, text)
-            except Exception as e:
-                logging.warning("Failed to notify admin %s: %s", aid, e)
+            if row["kind"] == "receipt_document":
+                sent = bot.send_document(row["chat_id"], row["photo_file_id"], caption=row["text"], reply_markup=markup)
+            else:
+                sent = bot.send_photo(row["chat_id"], row["photo_file_id"], caption=row["text"], reply_markup=markup)
+            kind = "caption"
+        except Exception as e:
+            logging.warning("Photo to %s failed, sending text only: %s", row["chat_id"], e)
+    if sent is None:
+        sent = bot.send_message(row["chat_id"], row["text"], reply_markup=markup)
+    if receipt:
+        db_add_admin_messages([(row["ref"], row["chat_id"], sent.message_id, kind)])
+
+def take_digests(rows, now):
+    # split due rows into (single rows, albums). First-attempt photo receipts are grouped per
+    # admin and held until the oldest has waited DIGEST_WINDOW or a full album is buffered;
+    # a lone receipt at the end of the window is sent on its own as before. Under load the
+    # window stretches to DEGRADED_DIGEST_WINDOW, so admins get fewer, fuller albums.
+    window = max(DIGEST_WINDOW, DEGRADED_DIGEST_WINDOW) if PIPELINE.degraded() else DIGEST_WINDOW
+    if window <= 0:
+        return rows, [], 0
+    singles, by_chat = [], {}
+    for row in rows:
+        if row["kind"] == "receipt" and row["attempts"] == 0:
+            by_chat.setdefault(row["chat_id"], []).append(row)
+        else:
+            singles.append(row)
+    albums, held = [], 0
+    cutoff = now - window * 1000
+    for chat_rows in by_chat.values():
+        if chat_rows[0]["created_at"] > cutoff and len(chat_rows) < MEDIA_GROUP_MAX:
+            held += len(chat_rows)
+            continue
+        for i in range(0, len(chat_rows), MEDIA_GROUP_MAX):
+            chunk = chat_rows[i:i + MEDIA_GROUP_MAX]
+            if len(chunk) > 1:
+                albums.append(chunk)
+            else:
+                singles.extend(chunk)
+    if held and window > DIGEST_WINDOW:
+        PIPELINE.note("digest_deferred")
+    return singles, albums, held
+
+def digest_caption(rows):
+    # one index line per receipt, numbered in album order
+    lines = [f"📥 {len(rows)} New Payments"]
+    for n, row in enumerate(rows, 1):
+        o = db_get_order(row["ref"])
+        if o:
+            lines.append(f"{n}. #{o['id']} @{o['username'] or 'N/A'} — {o['service']} {o['package_qty']} — {o['price']}")
+        else:
+            lines.append(f"{n}. #{row['ref']}")
+    lines.append("Use the buttons below to approve, finish or reject.")
+    caption = "\n".join(lines)
+    return caption if len(caption) <= MAX_CAPTION_LEN else caption[:MAX_CAPTION_LEN - 1] + "…"
+
+def deliver_album(rows):
+    caption = digest_caption(rows)
+    media = [types.InputMediaPhoto(r["photo_file_id"], caption=caption if i == 0 else None) for i, r in enumerate(rows)]
+    bot.send_media_group(rows[0]["chat_id"], media)
+    # albums can't carry inline keyboards, so the buttons go on a follow-up message
+    orders = [o for o in (db_get_order(r["ref"]) for r in rows) if o]
+    try:
+        sent = bot.send_message(rows[0]["chat_id"], digest_status_text(orders), reply_markup=kb_admin_digest(orders))
+    except Exception as e:
+        logging.warning("Digest actions to %s failed; use /approve and /done: %s", rows[0]["chat_id"], e)
+        return
+    db_add_admin_messages([(o['id'], rows[0]["chat_id"], sent.message_id, "digest") for o in orders])
+
+def digest_status_text(orders):
+    lines = ["Actions for the payments above:"]
+    lines += [f"{n}. #{o['id']} — {o['status']}" for n, o in enumerate(orders, 1)]
+    return "\n".join(lines)
+
+def drain_outbox():
+    # returns how many rows were handled; receipts held for a digest don't count
+    rows = outbox.fetch_due(DB_PATH, OUTBOX_BATCH_SIZE)
+    singles, albums, held = take_digests(rows, outbox.now_ms())
+    sent = []
+    for row in singles:
+        try:
+            deliver_outbox_row(row)
+            sent.append(row["id"])
+        except Exception as e:
+            if outbox.mark_failed(DB_PATH, row, e, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE, is_permanent_error(e)):
+                logging.error("Outbox message %s to %s dead-lettered: %s", row["id"], row["chat_id"], e)
+    for album in albums:
+        try:
+            deliver_album(album)
+            sent.extend(r["id"] for r in album)
+        except Exception as e:
+            # one bad file fails the whole album; retried rows go out individually
+            logging.warning("Digest to %s failed, retrying individually: %s", album[0]["chat_id"], e)
+            for row in album:
+                outbox.mark_failed(DB_PATH, row, e, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE)
+    outbox.mark_sent(DB_PATH, sent)
+    return len(rows) - held
+
+def outbox_worker():
+    while True:
+        OUTBOX_WAKE.clear()
+        try:
+            # a full batch means there is more backlog: go again without waiting
+            if is_leader() and drain_outbox() >= OUTBOX_BATCH_SIZE:
+                continue
+        except Exception as e:
+            logging.exception("Error in outbox worker: %s", e)
+        OUTBOX_WAKE.wait(OUTBOX_POLL_INTERVAL)
+
+# ----------------- archival -----------------
+def archive_worker():
+    # keeps the live orders table down to the working set; see archive.py
+    while True:
+        try:
+            moved = archive.archive_rows(DB_PATH, "orders", ARCHIVE_AFTER_DAYS) if is_leader() else 0
+            if moved:
+                logging.info("Archived %s finished order(s)", moved)
+                ORDER_CACHE.clear()
+                HISTORY_CACHE.clear()
+        except Exception as e:
+            logging.exception("Error in archive worker: %s", e)
+        time.sleep(ARCHIVE_INTERVAL)
+
+# ----------------- backups -----------------
+def run_backup():
+    path, size, secs = backup.take_backup(DB_PATH, BACKUP_DIR, BACKUP_KEEP, BACKUP_COMPRESS)
+    logging.info("Backup written to %s (%s bytes, %.1fs)", path, size, secs)
+    return path, size, secs
+
+def backup_worker():
+    # online backup API in small steps, so order writes keep flowing; see backup.py
+    while True:
+        time.sleep(BACKUP_INTERVAL)
+        if not is_leader():
+            continue
+        try:
+            run_backup()
+        except Exception as e:
+            logging.exception("Scheduled backup failed: %s", e)
 
 # ----------------- services & packages -----------------
 # Format: service -> [ (group_label, [ (qty_label, price_str), ... ]) ]
@@ -156,6 +890,99 @@ SERVICES = {
     ],
 }
 
+# ----------------- order history -----------------
+def split_messages(entries, sep="\n\n", limit=MAX_MESSAGE_LEN):
+    # pack entries into as few messages as possible without crossing Telegram's size limit
+    chunks, current = [], ""
+    for entry in entries:
+        entry = entry[:limit]
+        if current and len(current) + len(sep) + len(entry) > limit:
+            chunks.append(current)
+            current = entry
+        else:
+            current = current + sep + entry if current else entry
+    if current:
+        chunks.append(current)
+    return chunks
+
+def user_orders_page(telegram_id, before_id=None, archived=False):
+    # returns (rows, has_more); the first live page is served from HISTORY_CACHE when possible
+    cacheable = before_id is None and not archived
+    if cacheable:
+        cached = HISTORY_CACHE.get(telegram_id)
+        if cached is not None:
+            return cached
+    rows = db_user_orders_page(telegram_id, before_id, HISTORY_PAGE_SIZE + 1, archived)
+    page = (rows[:HISTORY_PAGE_SIZE], len(rows) > HISTORY_PAGE_SIZE)
+    if cacheable:
+        HISTORY_CACHE.put(telegram_id, page)
+    return page
+
+def send_orders_page(chat_id, telegram_id, before_id=None, archived=False):
+    rows, has_more = user_orders_page(telegram_id, before_id, archived)
+    # once the live orders run out, older ones can still be pulled from the archive
+    offer_archive = not has_more and not archived and archive.has_archive(DB_PATH, "orders")
+    if not rows:
+        kb = kb_welcome()
+        if offer_archive:
+            kb = types.InlineKeyboardMarkup()
+            kb.add(types.InlineKeyboardButton("Archived orders ▶", callback_data=f"mya|{before_id or ''}"))
+        empty = "No recent orders." if offer_archive else "You have no orders yet."
+        bot.send_message(chat_id, "No older orders." if before_id else empty, reply_markup=kb)
+        return
+    entries = [
+        f"🧾 {r[0]} | {r[5]}\n{r[1]} — {r[2]} {r[3]} — {r[4]}\n{fmt_ts(r[6])}"
+        for r in rows
+    ]
+    chunks = split_messages(entries)
+    for chunk in chunks[:-1]:
+        bot.send_message(chat_id, chunk)
+    kb = None
+    if has_more:
+        kb = types.InlineKeyboardMarkup()
+        kb.add(types.InlineKeyboardButton("Older ▶", callback_data=f"{'mya' if archived else 'myo'}|{rows[-1][0]}"))
+    elif offer_archive:
+        kb = types.InlineKeyboardMarkup()
+        kb.add(types.InlineKeyboardButton("Archived orders ▶", callback_data=f"mya|{rows[-1][0]}"))
+    bot.send_message(chat_id, chunks[-1], reply_markup=kb)
+
+# ----------------- order search -----------------
+# /find queries by short token, so "More" buttons fit in callback data; they live in the
+# shared state store, so any instance can serve the next page
+FIND_TTL = 24 * 3600
+
+def send_find_page(chat_id, token, offset=0, archived=False):
+    match = USER_STATE.get(f"find:{token}")
+    if match is None:
+        bot.send_message(chat_id, "This search has expired. Run /find again.")
+        return
+    search_fn = db_search_archived_orders if archived else db_search_orders
+    rows = search_fn(match, HISTORY_PAGE_SIZE + 1, offset)
+    has_more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    # live results first; the archive is searched only when asked for
+    kb_archive = None
+    if not has_more and not archived and archive.has_archive(DB_PATH, "orders"):
+        kb_archive = types.InlineKeyboardMarkup()
+        kb_archive.add(types.InlineKeyboardButton("Search archive ▶", callback_data=f"fnd|{token}|0|a"))
+    if not rows:
+        bot.send_message(chat_id, "No more matches." if offset else "No matching orders.", reply_markup=kb_archive)
+        return
+    entries = [
+        f"🧾 {r[0]} | {r[5]}\n@{r[1] or 'N/A'} — {r[2]} {r[3]} — {r[4]}\n🔗 {r[7]}\n{fmt_ts(r[6])}"
+        for r in rows
+    ]
+    chunks = split_messages(entries)
+    for chunk in chunks[:-1]:
+        bot.send_message(chat_id, chunk)
+    kb = None
+    if has_more:
+        kb = types.InlineKeyboardMarkup()
+        kb.add(types.InlineKeyboardButton("More ▶", callback_data=f"fnd|{token}|{offset + HISTORY_PAGE_SIZE}{'|a' if archived else ''}"))
+    else:
+        kb = kb_archive
+    bot.send_message(chat_id, chunks[-1], reply_markup=kb)
+
 # ----------------- keyb builders -----------------
 def kb_welcome():
     kb = types.InlineKeyboardMarkup(row_width=1)
@@ -214,6 +1041,29 @@ def kb_attach_receipt(order_id):
     kb.row(types.InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_order|{order_id}"))
     return kb
 
+ADMIN_BUTTONS = {
+    # status -> actions still possible from it
+    "pending_verification": (("approve", "✅"), ("done", "🏁"), ("reject", "❌")),
+    "processing": (("done", "🏁"),),
+}
+
+def kb_admin_order(order_id, status):
+    kb = types.InlineKeyboardMarkup()
+    labels = {"approve": "✅ Approve", "done": "🏁 Done", "reject": "❌ Reject"}
+    buttons = [types.InlineKeyboardButton(labels[a], callback_data=f"adm|{a}|{order_id}") for a, _ in ADMIN_BUTTONS.get(status, ())]
+    if buttons:
+        kb.row(*buttons)
+    return kb
+
+def kb_admin_digest(orders):
+    # one row per order still needing action, numbered like the album index
+    kb = types.InlineKeyboardMarkup()
+    for n, o in enumerate(orders, 1):
+        buttons = [types.InlineKeyboardButton(f"{icon} {n}", callback_data=f"adm|{a}|{o['id']}") for a, icon in ADMIN_BUTTONS.get(o['status'], ())]
+        if buttons:
+            kb.row(*buttons)
+    return kb
+
 def rb_cancel():
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
     kb.add(types.KeyboardButton("❌ Cancel"))
@@ -240,33 +1090,108 @@ def expects_username(group_label):
 @bot.message_handler(commands=['start'])
 def handle_start(m):
     clear_state(m.from_user.id)
-    # send gif if provided
-    try:
-        if WELCOME_GIF_FILE_ID:
+    # send gif if provided; under load the text alone is enough
+    if WELCOME_GIF_FILE_ID and PIPELINE.degraded():
+        PIPELINE.note("welcome_gif_skipped")
+    elif WELCOME_GIF_FILE_ID:
+        try:
             bot.send_animation(m.chat.id, WELCOME_GIF_FILE_ID)
-    except Exception:
-        pass
+        except Exception:
+            pass
     bot.send_message(m.chat.id, WELCOME_TEXT, reply_markup=kb_welcome())
 
+# ----------------- /myorders handler -----------------
+@bot.message_handler(commands=['myorders'])
+@flood_guard(FLOOD_LIMITER, sender_key, on_flood_message)
+def cmd_myorders(m):
+    send_orders_page(m.chat.id, m.from_user.id)
+
 # ----------------- callback handler -----------------
+# Two phases: the tap is acknowledged straight away from a background thread (toast text is
+# derived from the callback data alone), then the DB work and follow-up run. Where the
+# flow allows, the tapped message is edited in place instead of sending a new one.
+ACK_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ack")
+ACK_TEXT = {
+    "cancel": "Cancelled.",
+    "cancel_order": "Cancelling order…",
+    "back": "Back.",
+    "grp": "Choose quantity.",
+    "pkg": "Provide required info.",
+    "submit": "Choose payment method.",
+    "change": "Send the new link/username now.",
+    "attach": "Attach receipt.",
+    "myo": None,
+    "mya": None,
+    "fnd": None,
+    "adm": "Updating order…",
+}
+
+def ack_text(data):
+    prefix, _, rest = data.partition("|")
+    if prefix == "svc":
+        return f"{rest} selected."
+    if prefix == "pay":
+        return f"{rest.rsplit('|', 1)[-1]} selected."
+    return ACK_TEXT.get(prefix, "Unknown action. Use /start to begin.")
+
+def log_ack_error(fut):
+    if fut.exception():
+        logging.warning("answer_callback_query failed: %s", fut.exception())
+
+def ack(call, text=None):
+    ACK_POOL.submit(bot.answer_callback_query, call.id, text).add_done_callback(log_ack_error)
+
+def say(call, text, reply_markup=None):
+    bot.send_message(call.message.chat.id, text, reply_markup=reply_markup)
+
+def edit_or_send(call, text, reply_markup=None):
+    try:
+        bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=reply_markup)
+    except Exception:
+        say(call, text, reply_markup)
+
 @bot.callback_query_handler(func=lambda call: True)
+@flood_guard(FLOOD_LIMITER, sender_key, on_flood_callback)
 def callback_router(call):
     uid = call.from_user.id
     data = call.data or ""
+    if is_duplicate_tap(call):
+        bot.answer_callback_query(call.id)
+        return
+    ack(call, ack_text(data))
+
+    # admin buttons on receipt notifications
+    if data.startswith("adm|"):
+        parts = data.split("|")
+        if len(parts) != 3 or parts[1] not in ADMIN_ACTIONS or not is_admin(uid):
+            say(call, "Denied.")
+            return
+        _, action, oid = parts
+        order = db_get_order(oid)
+        if not order:
+            say(call, "Order not found.")
+            return
+        if not admin_transition(order, action):
+            # another admin got there first; their tap already refreshed this message
+            say(call, f"Order {oid} is already {db_get_order(oid)['status']}.")
+            return
+        refresh_admin_messages(oid, admin_name(call.from_user))
+        return
+
     # CANCEL flows
     if data.startswith("cancel"):
         parts = data.split("|")
         if parts[0] in ("cancel", "cancel|flow"):
             clear_state(uid)
-            bot.answer_callback_query(call.id, "Cancelled.")
-            bot.send_message(call.message.chat.id, "Operation cancelled.", reply_markup=kb_welcome())
+            edit_or_send(call, "Operation cancelled.", kb_welcome())
             return
         if parts[0] == "cancel_order" and len(parts) == 2:
             oid = parts[1]
-            db_update_order_field(oid, "status", "cancelled")
+            if not db_transition_order(oid, CANCELLABLE_STATUSES, "cancelled"):
+                say(call, "This order can no longer be cancelled.")
+                return
             clear_state(uid)
-            bot.answer_callback_query(call.id, "Order cancelled.")
-            bot.send_message(call.message.chat.id, "Order cancelled.", reply_markup=kb_welcome())
+            edit_or_send(call, "Order cancelled.", kb_welcome())
             return
 
     # BACK navigation
@@ -274,19 +1199,16 @@ def callback_router(call):
         parts = data.split("|")
         if len(parts) >= 2 and parts[1] == "welcome":
             clear_state(uid)
-            bot.answer_callback_query(call.id, "Back.")
             bot.edit_message_text("Choose a platform:", call.message.chat.id, call.message.message_id, reply_markup=kb_welcome())
             return
         if len(parts) >= 3 and parts[1] == "service":
             svc = parts[2]
-            bot.answer_callback_query(call.id, "Back to service groups.")
             bot.edit_message_text(f"Choose a package for {svc}:", call.message.chat.id, call.message.message_id, reply_markup=kb_service_groups(svc))
             return
 
     # service selected
     if data.startswith("svc|"):
         _, svc = data.split("|", 1)
-        bot.answer_callback_query(call.id, f"{svc} selected.")
         bot.edit_message_text(f"Choose the type of package for {svc}:", call.message.chat.id, call.message.message_id, reply_markup=kb_service_groups(svc))
         return
 
@@ -294,10 +1216,9 @@ def callback_router(call):
     if data.startswith("grp|"):
         parts = data.split("|")
         if len(parts) != 3:
-            bot.answer_callback_query(call.id, "Bad data.")
+            say(call, "Bad data.")
             return
         svc = parts[1]; gidx = int(parts[2])
-        bot.answer_callback_query(call.id, "Choose quantity.")
         bot.edit_message_text("Choose quantity:", call.message.chat.id, call.message.message_id, reply_markup=kb_packages(svc, gidx))
         return
 
@@ -305,21 +1226,21 @@ def callback_router(call):
     if data.startswith("pkg|"):
         parts = data.split("|")
         if len(parts) != 4:
-            bot.answer_callback_query(call.id, "Bad data.")
+            say(call, "Bad data.")
             return
         svc, gidx_s, pidx_s = parts[1], parts[2], parts[3]
         try:
             gidx = int(gidx_s); pidx = int(pidx_s)
         except:
-            bot.answer_callback_query(call.id, "Bad indexes.")
+            say(call, "Bad indexes.")
             return
         groups = SERVICES.get(svc, [])
         if gidx < 0 or gidx >= len(groups):
-            bot.answer_callback_query(call.id, "Invalid group.")
+            say(call, "Invalid group.")
             return
         group_label, packages = groups[gidx]
         if pidx < 0 or pidx >= len(packages):
-            bot.answer_callback_query(call.id, "Invalid package.")
+            say(call, "Invalid package.")
             return
         qty_label, price_label = packages[pidx]
 
@@ -337,17 +1258,16 @@ def callback_router(call):
             "payment_method": None,
             "receipt_file_id": None,
             "status": "created",
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": now_ms()
         }
         db_insert_order(order)
         set_state(uid, "waiting_for_link_or_username", order_id)
-        bot.answer_callback_query(call.id, "Provide required info.")
 
-        # decide prompt
+        # decide prompt (a reply keyboard can't be attached by editing, so this is a new message)
         if expects_username(group_label):
-            bot.send_message(call.message.chat.id, LINK_PROMPT_ACCOUNT, reply_markup=rb_cancel())
+            say(call, LINK_PROMPT_ACCOUNT, rb_cancel())
         else:
-            bot.send_message(call.message.chat.id, LINK_PROMPT_VIDEO, reply_markup=rb_cancel())
+            say(call, LINK_PROMPT_VIDEO, rb_cancel())
         return
 
     # order flow actions: submit, change, attach
@@ -355,65 +1275,387 @@ def callback_router(call):
         parts = data.split("|")
         action = parts[0]
         if len(parts) < 2:
-            bot.answer_callback_query(call.id, "Bad action.")
+            say(call, "Bad action.")
             return
         oid = parts[1]
         order = db_get_order(oid)
         if not order:
-            bot.answer_callback_query(call.id, "Order not found.")
+            say(call, "Order not found.")
+            return
+
+        if action in ("change", "attach") and order['status'] not in EDITABLE_STATUSES:
+            say(call, "This order is already being processed.")
             return
 
         if action == "change":
             # ask user for new link/username
             set_state(uid, "changing_link_or_username", oid)
             if expects_username(order['package_group']):
-                bot.send_message(call.message.chat.id, LINK_PROMPT_ACCOUNT, reply_markup=rb_cancel())
+                say(call, LINK_PROMPT_ACCOUNT, rb_cancel())
             else:
-                bot.send_message(call.message.chat.id, LINK_PROMPT_VIDEO, reply_markup=rb_cancel())
-            bot.answer_callback_query(call.id, "Send the new link/username now.")
+                say(call, LINK_PROMPT_VIDEO, rb_cancel())
             return
 
         if action == "submit":
-            # choose payment method next
+            if order['status'] not in EDITABLE_STATUSES:
+                say(call, "This order was already submitted.")
+                return
+            # choose payment method next, replacing the confirm buttons
             set_state(uid, "waiting_payment_method", oid)
-            bot.answer_callback_query(call.id, "Choose payment method.")
-            bot.send_message(call.message.chat.id, "Choose payment method:", reply_markup=kb_payment_methods(oid))
+            edit_or_send(call, "Choose payment method:", kb_payment_methods(oid))
             return
 
         if action == "attach":
             # ask user to upload receipt
             set_state(uid, "waiting_for_receipt", oid)
-            bot.answer_callback_query(call.id, "Attach receipt.")
-            bot.send_message(call.message.chat.id, "📸 Please upload a screenshot or photo of your payment receipt now:", reply_markup=rb_cancel())
+            say(call, "📸 Please upload a screenshot or photo of your payment receipt now:", rb_cancel())
             return
 
     # payment selected
     if data.startswith("pay|"):
         parts = data.split("|")
         if len(parts) != 3:
-            bot.answer_callback_query(call.id, "Bad payment data.")
+            say(call, "Bad payment data.")
             return
         _, oid, method = parts
         order = db_get_order(oid)
         if not order:
-            bot.answer_callback_query(call.id, "Order not found.")
+            say(call, "Order not found.")
+            return
+        if not db_transition_order(oid, EDITABLE_STATUSES, "awaiting_receipt", payment_method=method):
+            say(call, "This order is already being processed.")
             return
-        db_update_order_field(oid, "payment_method", method)
-        db_update_order_field(oid, "status", "awaiting_receipt")
         set_state(uid, "waiting_for_receipt", oid)
-        bot.answer_callback_query(call.id, f"{method} selected.")
         if method == "telebirr":
-            bot.send_message(call.message.chat.id, "Telebirr selected. Please transfer and upload the receipt when ready.", reply_markup=kb_attach_receipt(oid))
+            edit_or_send(call, "Telebirr selected. Please transfer and upload the receipt when ready.", kb_attach_receipt(oid))
         elif method == "cbe":
-            bot.send_message(call.message.chat.id, f"🏦 CBE Account:\n- Account Number: 1000498236271\n- Account Holder: Eyuel Abebe Bantie\n\nAmount: {order['price']}\n\nUpload receipt:", reply_markup=kb_attach_receipt(oid))
+            edit_or_send(call, f"🏦 CBE Account:\n- Account Number: 1000498236271\n- Account Holder: Eyuel Abebe Bantie\n\nAmount: {order['price']}\n\nUpload receipt:", kb_attach_receipt(oid))
         elif method == "abyssinia":
-            bot.send_message(call.message.chat.id, f"🏦 Abyssinia Bank:\n- Account Number: 236188477\n- Account Holder: Eyuel Abebe Bantie\n\nAmount: {order['price']}\n\nUpload receipt:", reply_markup=kb_attach_receipt(oid))
+            edit_or_send(call, f"🏦 Abyssinia Bank:\n- Account Number: 236188477\n- Account Holder: Eyuel Abebe Bantie\n\nAmount: {order['price']}\n\nUpload receipt:", kb_attach_receipt(oid))
         else:
-            bot.send_message(call.message.chat.id, "Selected payment method. Upload receipt when ready.", reply_markup=kb_attach_receipt(oid))
+            edit_or_send(call, "Selected payment method. Upload receipt when ready.", kb_attach_receipt(oid))
+        return
+
+    # order history paging
+    if data.startswith("myo|"):
+        send_orders_page(call.message.chat.id, uid, data.split("|", 1)[1])
+        return
+    if data.startswith("mya|"):
+        send_orders_page(call.message.chat.id, uid, data.split("|", 1)[1] or None, archived=True)
+        return
+
+    # /find paging
+    if data.startswith("fnd|"):
+        parts = data.split("|")
+        if len(parts) not in (3, 4) or not is_admin(uid):
+            say(call, "Denied.")
+            return
+        run_report(call.message.chat.id, send_find_page, call.message.chat.id, parts[1], int(parts[2]), parts[3:] == ["a"])
+        return
+
+# ----------------- admin commands -----------------
+# Registered before the text handlers: telebot runs the first handler that matches, and
+# text_router matches every text message, commands included.
+def is_admin(uid):
+    return uid in ADMIN_IDS
+
+# reports run on their own small pool, so a slow one never ties up the threads serving customers
+REPORT_POOL = ThreadPoolExecutor(max_workers=REPORT_CONCURRENCY, thread_name_prefix="report")
+
+def run_report(chat_id, fn, *args):
+    def job():
+        try:
+            fn(*args)
+        except reporting.ReportError as e:
+            bot.send_message(chat_id, str(e))
+        except Exception as e:
+            logging.exception("Report failed: %s", e)
+            bot.send_message(chat_id, "Report failed.")
+    REPORT_POOL.submit(job)
+
+ADMIN_ACTIONS = {
+    # action -> (allowed current statuses, new status, customer message)
+    "approve": (("pending_verification",), "processing", "🔄 Your order {oid} is now being processed."),
+    "done": (("pending_verification", "processing"), "done", "✅ Your order {oid} is complete. Thank you!"),
+    "reject": (("pending_verification",), "rejected", "❌ We couldn't verify the payment for order {oid}. Please contact support."),
+}
+
+def admin_name(user):
+    return f"@{user.username}" if user.username else str(user.id)
+
+def admin_transition(order, action):
+    # compare-and-set, so two admins acting at once can't both win; the customer is told via the outbox
+    from_statuses, to_status, text = ADMIN_ACTIONS[action]
+    notify = [outbox.message(order['telegram_id'], text.format(oid=order['id']))]
+    return db_transition_order(order['id'], from_statuses, to_status, notify=notify)
+
+def refresh_admin_messages(order_id, actor):
+    # edit every admin's copy of the notification to show the new status and remaining buttons
+    order = db_get_order(order_id)
+    for chat_id, message_id, kind in db_admin_messages(order_id):
+        try:
+            if kind == "digest":
+                orders = [o for o in map(db_get_order, db_message_orders(chat_id, message_id)) if o]
+                bot.edit_message_text(digest_status_text(orders), chat_id, message_id, reply_markup=kb_admin_digest(orders))
+            elif kind == "caption":
+                bot.edit_message_caption(receipt_text(order, order['status'], actor), chat_id, message_id, reply_markup=kb_admin_order(order_id, order['status']))
+            else:
+                bot.edit_message_text(receipt_text(order, order['status'], actor), chat_id, message_id, reply_markup=kb_admin_order(order_id, order['status']))
+        except Exception as e:
+            logging.warning("Could not update admin message %s/%s: %s", chat_id, message_id, e)
+
+@bot.message_handler(commands=['orders'])
+def cmd_orders(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "You are not allowed to use this.")
+        return
+    # /orders all - include archived orders
+    run_report(m.chat.id, send_recent_orders, m.chat.id, m.text.strip().split()[1:2] == ["all"])
+
+def send_recent_orders(chat_id, include_archived):
+    rows = db_recent_orders(include_archived)
+    if not rows:
+        bot.send_message(chat_id, "No orders found.")
         return
+    lines = []
+    for r in rows:
+        lines.append(f"ID:{r[0]} User:{r[2] or r[1]} Service:{r[3]} {r[4]}-{r[5]} Price:{r[6]} Status:{r[7]} At:{fmt_ts(r[8])}")
+    bot.send_message(chat_id, "\n\n".join(lines))
 
-    # unknown fallback
-    bot.answer_callback_query(call.id, "Unknown action. Use /start to begin.")
+@bot.message_handler(commands=['approve'])
+def cmd_approve(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    parts = m.text.strip().split()
+    if len(parts) < 2:
+        bot.reply_to(m, "Usage: /approve <order_id>")
+        return
+    oid = parts[1].strip()
+    order = db_get_order(oid)
+    if not order:
+        bot.reply_to(m, "Order not found.")
+        return
+    if not admin_transition(order, "approve"):
+        bot.reply_to(m, f"Order {oid} is {order['status']}; only pending_verification orders can be approved.")
+        return
+    refresh_admin_messages(oid, admin_name(m.from_user))
+    bot.reply_to(m, f"Order {oid} marked processing.")
+
+@bot.message_handler(commands=['done'])
+def cmd_done(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    parts = m.text.strip().split()
+    if len(parts) < 2:
+        bot.reply_to(m, "Usage: /done <order_id>")
+        return
+    oid = parts[1].strip()
+    order = db_get_order(oid)
+    if not order:
+        bot.reply_to(m, "Order not found.")
+        return
+    if not admin_transition(order, "done"):
+        bot.reply_to(m, f"Order {oid} is {order['status']}; it can't be marked done.")
+        return
+    refresh_admin_messages(oid, admin_name(m.from_user))
+    bot.reply_to(m, f"Order {oid} marked done.")
+
+@bot.message_handler(commands=['find'])
+def cmd_find(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    # /find <words> - matches username, link/username, service and package, best first
+    match = search.match_expression(m.text.partition(" ")[2])
+    if not match:
+        bot.reply_to(m, "Usage: /find <username, link, service…>")
+        return
+    token = uuid4().hex[:8]
+    USER_STATE.set(f"find:{token}", match, ttl=FIND_TTL)
+    run_report(m.chat.id, send_find_page, m.chat.id, token)
+
+@bot.message_handler(commands=['export'])
+def cmd_export(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    # /export [from YYYY-MM-DD] [to YYYY-MM-DD] [status] [csv|jsonl]
+    try:
+        opts = export.parse_command_args(m.text.strip().split()[1:], "orders")
+    except ValueError as e:
+        bot.reply_to(m, f"{e}.\nUsage: /export [from YYYY-MM-DD] [to YYYY-MM-DD] [status] [csv|jsonl]")
+        return
+    bot.reply_to(m, "Preparing export…")
+    # large exports take a while; don't tie up a handler thread
+    threading.Thread(target=run_export, args=(m.chat.id, opts), daemon=True).start()
+
+def run_export(chat_id, opts):
+    out_dir = tempfile.mkdtemp(prefix="enzo_export_")
+    try:
+        paths, count = export.export_table(DB_PATH, "orders", out_dir, tz=DEFAULT_ZONE, **opts)
+        for n, path in enumerate(paths, 1):
+            part = f" (part {n}/{len(paths)})" if len(paths) > 1 else ""
+            with open(path, "rb") as f:
+                bot.send_document(chat_id, f, caption=f"{count} order(s){part}")
+    except Exception as e:
+        logging.exception("Export failed: %s", e)
+        bot.send_message(chat_id, f"Export failed: {e}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+@bot.message_handler(commands=['backup'])
+def cmd_backup(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    # /backup [send] - take a snapshot now; 'send' also uploads it here
+    send = m.text.strip().split()[1:2] == ["send"]
+    bot.reply_to(m, "Backing up…")
+    threading.Thread(target=backup_and_report, args=(m.chat.id, send), daemon=True).start()
+
+def backup_and_report(chat_id, send):
+    try:
+        path, size, secs = run_backup()
+    except Exception as e:
+        logging.exception("Backup failed: %s", e)
+        bot.send_message(chat_id, f"Backup failed: {e}")
+        return
+    bot.send_message(chat_id, f"Backup OK: {os.path.basename(path)} ({size / 1048576:.1f} MB, {secs:.1f}s, integrity checked)")
+    if send:
+        try:
+            with open(path, "rb") as f:
+                bot.send_document(chat_id, f)
+        except Exception as e:
+            bot.send_message(chat_id, f"Could not upload the backup: {e}")
+
+@bot.message_handler(commands=['outbox'])
+def cmd_outbox(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    # /outbox [retry] - backlog by status; 'retry' re-queues dead-lettered messages
+    if m.text.strip().split()[1:2] == ["retry"]:
+        n = outbox.retry_dead(DB_PATH)
+        OUTBOX_WAKE.set()
+        bot.reply_to(m, f"Re-queued {n} dead message(s).")
+        return
+    counts = outbox.counts(DB_PATH)
+    bot.reply_to(m, f"Outbox: {counts.get('pending', 0)} pending, {counts.get('dead', 0)} dead.")
+
+@bot.message_handler(commands=['stats'])
+def cmd_stats(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    # /stats [YYYY-MM-DD [YYYY-MM-DD]] [daily]
+    args = m.text.strip().split()[1:]
+    daily = bool(args) and args[-1] == "daily"
+    if daily:
+        args.pop()
+    try:
+        since = datetime.strptime(args[0], "%Y-%m-%d").date().isoformat() if args else None
+        until = datetime.strptime(args[1], "%Y-%m-%d").date().isoformat() if len(args) > 1 else None
+    except ValueError:
+        bot.reply_to(m, "Usage: /stats [from YYYY-MM-DD] [to YYYY-MM-DD] [daily]")
+        return
+    run_report(m.chat.id, send_stats, m.chat.id, since, until, daily)
+
+def send_stats(chat_id, since, until, daily):
+    rows = db_status_counts(since, until, daily)
+    if not rows:
+        bot.send_message(chat_id, "No orders in that range.")
+        return
+    if daily:
+        txt = "\n".join(f"{day} {s}: {n}" for day, s, n in rows)
+    else:
+        txt = "\n".join(f"{s}: {n}" for s, n in rows)
+    if len(txt) > 3900:
+        txt = txt[:3900] + "\n… (narrow the date range)"
+    header = "Order stats" + (f" {since or '…'} → {until or '…'}" if since or until else "")
+    bot.send_message(chat_id, f"{header}:\n{txt}")
+
+@bot.message_handler(commands=['cachestats'])
+def cmd_cachestats(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    lines = []
+    for name, cache in (("orders", ORDER_CACHE), ("history", HISTORY_CACHE)):
+        st = cache.stats()
+        lines.append(f"{name}: {st['size']}/{st['maxsize']} entries, hits {st['hits']}, misses {st['misses']}, hit rate {st['hit_rate']:.1%}")
+    bot.send_message(m.chat.id, "\n".join(lines))
+
+@bot.message_handler(commands=['load'])
+def cmd_load(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    bot.send_message(m.chat.id, loadshed.format_stats(PIPELINE.stats()))
+
+@bot.message_handler(commands=['profile'])
+def cmd_profile(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    # /profile [on [rate] | off | dump | reset]
+    args = m.text.strip().split()[1:]
+    action = args[0].lower() if args else ""
+    if action == "on":
+        try:
+            rate = float(args[1]) if len(args) > 1 else PROFILE_SAMPLE_RATE or 0.05
+        except ValueError:
+            bot.reply_to(m, "Usage: /profile on [fraction of calls, e.g. 0.05]")
+            return
+        PROFILER.sample_rate = min(max(rate, 0.0), 1.0)
+        bot.reply_to(m, f"Profiling {PROFILER.sample_rate:.1%} of handler calls.")
+    elif action == "off":
+        PROFILER.sample_rate = 0.0
+        bot.reply_to(m, "Profiling off; calls are still timed.")
+    elif action == "reset":
+        PROFILER.reset()
+        bot.reply_to(m, "Profile cleared.")
+    elif action == "dump":
+        path = PROFILER.dump()
+        bot.send_message(m.chat.id, f"{PROFILER.report()[:3800]}\n\nWritten to {path}")
+    else:
+        bot.send_message(m.chat.id, PROFILER.report()[:3900])
+
+# ----------------- memory audit -----------------
+# Everything below grows with the number of users; /memstats shows what each one holds. See memaudit.py.
+MEMORY = memaudit.MemoryAudit()
+if isinstance(USER_STATE, cluster.MemoryStore):
+    MEMORY.register("user state", lambda: USER_STATE.data)
+MEMORY.register("order cache", lambda: ORDER_CACHE.data)
+MEMORY.register("history cache", lambda: HISTORY_CACHE.data)
+MEMORY.register("callback dedup", lambda: CALLBACK_DEDUP.data)
+MEMORY.register("flood limiter", lambda: FLOOD_LIMITER.windows, lambda ws: sum(len(w.hits) for w in ws))
+MEMORY.register("telebot next-step handlers", lambda: bot.next_step_backend.handlers)
+MEMORY.register("telebot reply handlers", lambda: bot.reply_backend.handlers)
+MEMORY.register("telebot states", lambda: bot.current_states.data)
+if MEMTRACE:
+    MEMORY.start_tracing()
+
+@bot.message_handler(commands=['memstats'])
+def cmd_memstats(m):
+    if not is_admin(m.from_user.id):
+        bot.reply_to(m, "Denied.")
+        return
+    # /memstats [trace on | trace off | snapshot]
+    args = [a.lower() for a in m.text.strip().split()[1:]]
+    if args == ["trace", "on"]:
+        MEMORY.start_tracing()
+        bot.reply_to(m, "tracemalloc on. Use /memstats snapshot now and again later to see what grows.")
+    elif args == ["trace", "off"]:
+        MEMORY.stop_tracing()
+        bot.reply_to(m, "tracemalloc off.")
+    else:
+        # walking the structures takes a moment on a big bot, so off the update workers
+        run_report(m.chat.id, send_memstats, m.chat.id, args == ["snapshot"])
+
+def send_memstats(chat_id, snapshot):
+    bot.send_message(chat_id, (MEMORY.snapshot() if snapshot else MEMORY.report())[:3900])
 
 # ----------------- text handlers -----------------
 @bot.message_handler(func=lambda m: m.text and m.text.strip().lower() == "❌ cancel")
@@ -422,24 +1664,29 @@ def text_cancel(m):
     bot.send_message(m.chat.id, "Operation cancelled.", reply_markup=kb_welcome())
 
 @bot.message_handler(func=lambda m: True, content_types=['text'])
+@flood_guard(FLOOD_LIMITER, sender_key, on_flood_message)
 def text_router(m):
     uid = m.from_user.id
     st = get_state(uid)
-    stage = st.get("stage")
-    oid = st.get("order_id")
+    stage = st.stage
+    oid = st.order_id
 
     # changing link/username for existing order
     if stage == "changing_link_or_username" and oid:
-        db_update_order_field(oid, "link_or_username", m.text.strip())
-        db_update_order_field(oid, "status", "link_updated")
+        if not db_transition_order(oid, EDITABLE_STATUSES, "link_updated", link_or_username=m.text.strip()):
+            clear_state(uid)
+            bot.send_message(m.chat.id, "This order is already being processed and can't be changed.", reply_markup=kb_welcome())
+            return
         bot.send_message(m.chat.id, "Updated. Please Submit Order when ready.", reply_markup=kb_order_confirm(oid))
         clear_state(uid)
         return
 
     # waiting for link or username (after package selection)
     if stage == "waiting_for_link_or_username" and oid:
-        db_update_order_field(oid, "link_or_username", m.text.strip())
-        db_update_order_field(oid, "status", "link_received")
+        if not db_transition_order(oid, ("created", "link_received"), "link_received", link_or_username=m.text.strip()):
+            clear_state(uid)
+            bot.send_message(m.chat.id, "This order is no longer open. Use /start to begin a new one.", reply_markup=kb_welcome())
+            return
         order = db_get_order(oid)
         summary = (
             f"Order Information\n"
@@ -483,11 +1730,12 @@ def text_router(m):
 
 # ----------------- media handler (receipt) -----------------
 @bot.message_handler(content_types=['photo','document'])
+@flood_guard(FLOOD_LIMITER, sender_key, on_flood_message)
 def media_handler(m):
     uid = m.from_user.id
     st = get_state(uid)
-    stage = st.get("stage")
-    oid = st.get("order_id")
+    stage = st.stage
+    oid = st.order_id
 
     # expected receipt
     if stage == "waiting_for_receipt" and oid:
@@ -502,13 +1750,13 @@ def media_handler(m):
             bot.send_message(m.chat.id, "Could not read the file. Send a photo or document file.", reply_markup=rb_cancel())
             return
 
-        # update DB
-        db_update_order_field(oid, "receipt_file_id", file_id)
-        db_update_order_field(oid, "status", "pending_verification")
-
-        # fetch order and notify admins with photo + details
+        # update DB and queue the admin notifications with photo + details in one transaction
         order = db_get_order(oid)
-        notify_admins_with_receipt(order, file_id)
+        notify = notify_admins_with_receipt(order, file_id, is_photo=bool(m.photo)) if order else None
+        if not db_transition_order(oid, ("awaiting_receipt",), "pending_verification", notify=notify, receipt_file_id=file_id):
+            clear_state(uid)
+            bot.send_message(m.chat.id, "We already have a receipt for this order. We'll notify you once it's checked.", reply_markup=kb_welcome())
+            return
 
         # confirm to user
         bot.send_message(m.chat.id, ORDER_RECEIVED_CONFIRM, reply_markup=kb_welcome())
@@ -518,71 +1766,42 @@ def media_handler(m):
     # if not expected
     bot.send_message(m.chat.id, "I wasn't expecting a file now. If you want to attach a receipt, first create an order and choose a payment method.", reply_markup=kb_welcome())
 
-# ----------------- admin commands -----------------
-def is_admin(uid):
-    return uid in ADMIN_IDS
-
-@bot.message_handler(commands=['orders'])
-def cmd_orders(m):
-    if not is_admin(m.from_user.id):
-        bot.reply_to(m, "You are not allowed to use this.")
-        return
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT id, telegram_id, username, service, package_group, package_qty, price, status, created_at FROM orders ORDER BY created_at DESC LIMIT 30")
-    rows = c.fetchall()
-    conn.close()
-    if not rows:
-        bot.send_message(m.chat.id, "No orders found.")
-        return
-    lines = []
-    for r in rows:
-        lines.append(f"ID:{r[0]} User:{r[2] or r[1]} Service:{r[3]} {r[4]}-{r[5]} Price:{r[6]} Status:{r[7]} At:{r[8]}")
-    bot.send_message(m.chat.id, "\n\n".join(lines))
-
-@bot.message_handler(commands=['approve'])
-def cmd_approve(m):
-    if not is_admin(m.from_user.id):
-        bot.reply_to(m, "Denied.")
-        return
-    parts = m.text.strip().split()
-    if len(parts) < 2:
-        bot.reply_to(m, "Usage: /approve <order_id>")
-        return
-    oid = parts[1].strip()
-    order = db_get_order(oid)
-    if not order:
-        bot.reply_to(m, "Order not found.")
-        return
-    db_update_order_field(oid, "status", "processing")
-    try:
-        bot.send_message(order['telegram_id'], f"🔄 Your order {oid} is now being processed.")
-    except Exception:
-        pass
-    bot.reply_to(m, f"Order {oid} marked processing.")
+# ----------------- profiling -----------------
+# Every handler registered above is timed, and PROFILE_SAMPLE_RATE of calls are profiled; see
+# profiling.py. Sampling can be switched on for a while with /profile on, then dumped.
+PROFILER = profiling.Profiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_TOP_N)
 
-@bot.message_handler(commands=['done'])
-def cmd_done(m):
-    if not is_admin(m.from_user.id):
-        bot.reply_to(m, "Denied.")
-        return
-    parts = m.text.strip().split()
-    if len(parts) < 2:
-        bot.reply_to(m, "Usage: /done <order_id>")
-        return
-    oid = parts[1].strip()
-    order = db_get_order(oid)
-    if not order:
-        bot.reply_to(m, "Order not found.")
-        return
-    db_update_order_field(oid, "status", "done")
-    try:
-        bot.send_message(order['telegram_id'], f"✅ Your order {oid} is complete. Thank you!")
-    except Exception:
-        pass
-    bot.reply_to(m, f"Order {oid} marked done.")
+for handler in bot.message_handlers + bot.callback_query_handlers:
+    handler["function"] = PROFILER.wrap(handler["function"])
 
 # ----------------- run -----------------
 if __name__ == "__main__":
     logging.info("Starting Enzo Promotion Bot...")
-    bot.infinity_polling()
+    profiling.dump_on_signal(PROFILER)
+    threading.Thread(target=outbox_worker, name="outbox", daemon=True).start()
+    threading.Thread(target=state_purge_worker, name="state-purge", daemon=True).start()
+    if ARCHIVE_AFTER_DAYS > 0:
+        threading.Thread(target=archive_worker, name="archive", daemon=True).start()
+    if BACKUP_INTERVAL > 0:
+        threading.Thread(target=backup_worker, name="backup", daemon=True).start()
+    if CLUSTER_MODE:
+        threading.Thread(target=leadership_worker, name="leadership", daemon=True).start()
+    elif WEBHOOK_URL:
+        on_elected()
+    if WEBHOOK_URL:
+        create_webhook_app().run(host=WEBHOOK_LISTEN, port=WEBHOOK_PORT, threaded=True)
+        if LEASE:
+            LEASE.release()  # hand over straight away instead of after LEASE_TTL
+    elif not CLUSTER_MODE:
+        bot.remove_webhook()  # Telegram refuses getUpdates while a webhook is set
+        poll_updates()
+    else:
+        # followers wait; losing the lease stops polling and we go back to waiting
+        try:
+            while True:
+                while not is_leader():
+                    time.sleep(1)
+                POLL_STOP.clear()
+                poll_updates()
+        finally:
+            LEASE.release()
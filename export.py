@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# export.py
+# Streaming CSV/JSONL export of orders or promotions, shared by both bots and usable from the shell:
+#
+#   python export.py orders --db enzo_bot.db --from 2025-01-01 --to 2025-01-31 --format csv
+#   python export.py promotions --db promo_bot.db --status posted --format jsonl --tz Africa/Addis_Ababa
+#
+# Rows are read in batches from a read-only connection and written straight into gzip files, so
+# memory stays flat however big the table is. Output is split into parts before it reaches the
+# Telegram upload limit. With the database in WAL mode the long read never blocks the bots' writes.
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+EXPORT_TABLES = ("orders", "promotions")
+# every status the bots write, per table; an unknown one is refused rather than exporting nothing
+STATUSES = {
+    "orders": ("created", "link_received", "link_updated", "awaiting_receipt", "pending_verification",
+               "processing", "done", "rejected", "cancelled"),
+    "promotions": ("pending", "approved", "rejected", "posted", "partially_posted", "post_failed"),
+}
+FORMATS = ("csv", "jsonl")
+FETCH_SIZE = 1000
+MAX_PART_BYTES = 45 * 1024 * 1024  # bots may upload documents up to 50 MB
+ROTATE_CHECK_EVERY = 500  # rows between size checks
+
+
+def day_bounds(since=None, until=None, tz=timezone.utc):
+    # inclusive YYYY-MM-DD days in `tz` -> [since_ms, until_ms) epoch milliseconds
+    since_ms = until_ms = None
+    if since:
+        d = datetime.strptime(since, "%Y-%m-%d").date()
+        since_ms = int(datetime.combine(d, time(), tz).timestamp() * 1000)
+    if until:
+        d = datetime.strptime(until, "%Y-%m-%d").date() + timedelta(days=1)
+        until_ms = int(datetime.combine(d, time(), tz).timestamp() * 1000)
+    return since_ms, until_ms
+
+
+def iter_rows(db_path, table, since_ms=None, until_ms=None, status=None, fetch_size=FETCH_SIZE):
+    # yields the column names first, then one tuple per row, oldest first
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"unknown table {table!r}")
+    where, params = [], []
+    if since_ms is not None:
+        where.append("created_at >= ?")
+        params.append(since_ms)
+    if until_ms is not None:
+        where.append("created_at < ?")
+        params.append(until_ms)
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    sql = f"SELECT * FROM {table}" + (f" WHERE {' AND '.join(where)}" if where else "") + " ORDER BY created_at, id"
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        c = conn.execute(sql, params)
+        yield [d[0] for d in c.description]
+        while True:
+            rows = c.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def readable(columns, rows, tz=timezone.utc):
+    # epoch-millisecond *_at columns become ISO 8601 strings in `tz`
+    ts_idx = [i for i, name in enumerate(columns) if name.endswith("_at")]
+    for row in rows:
+        if ts_idx:
+            row = list(row)
+            for i in ts_idx:
+                if isinstance(row[i], int):
+                    row[i] = datetime.fromtimestamp(row[i] / 1000, tz).isoformat(timespec="seconds")
+        yield row
+
+
+class PartWriter:
+    # gzip-compressed output that starts a new numbered file when the current one gets too big
+    def __init__(self, out_dir, base_name, fmt, columns, max_bytes=MAX_PART_BYTES):
+        self.out_dir = out_dir
+        self.base_name = base_name
+        self.fmt = fmt
+        self.columns = columns
+        self.max_bytes = max_bytes
+        self.paths = []
+        self.raw = self.gz = self.text = self.csv = None
+        self.rows_in_part = 0
+
+    def _open(self):
+        path = os.path.join(self.out_dir, f"{self.base_name}.part{len(self.paths) + 1:03d}.{self.fmt}.gz")
+        self.paths.append(path)
+        self.raw = open(path, "wb")
+        self.gz = gzip.GzipFile(fileobj=self.raw, mode="wb")
+        self.text = io.TextIOWrapper(self.gz, encoding="utf-8", newline="")
+        self.csv = csv.writer(self.text) if self.fmt == "csv" else None
+        if self.csv:
+            self.csv.writerow(self.columns)
+        self.rows_in_part = 0
+
+    def _close(self):
+        if self.text:
+            self.text.close()  # closes the gzip stream too
+            self.raw.close()
+            self.raw = self.gz = self.text = None
+
+    def write(self, row):
+        if self.text is None:
+            self._open()
+        elif self.rows_in_part % ROTATE_CHECK_EVERY == 0:
+            # the compressor holds back some output, so the file size lags a little; leave headroom
+            self.text.flush()
+            if self.raw.tell() > self.max_bytes * 0.95:
+                self._close()
+                self._open()
+        if self.csv:
+            self.csv.writerow(row)
+        else:
+            self.text.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=str) + "\n")
+        self.rows_in_part += 1
+
+    def finish(self):
+        if not self.paths:
+            self._open()  # an empty export still produces a file (with just the CSV header)
+        self._close()
+        if len(self.paths) == 1:
+            # single part: drop the .part001 suffix
+            single = os.path.join(self.out_dir, f"{self.base_name}.{self.fmt}.gz")
+            os.replace(self.paths[0], single)
+            self.paths = [single]
+        return self.paths
+
+
+def check_status(table, status):
+    if status is not None and status not in STATUSES[table]:
+        raise ValueError(f"unknown status {status!r}, expected one of: {', '.join(STATUSES[table])}")
+
+
+def check_day(value):
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"bad date {value!r}, expected YYYY-MM-DD") from None
+    return value
+
+
+def parse_command_args(args, table):
+    # bot command arguments in any order: [from YYYY-MM-DD] [to YYYY-MM-DD] [status] [csv|jsonl].
+    # The from/to keywords may be left out: bare dates are then the first and last day.
+    opts = {"fmt": "csv", "since": None, "until": None, "status": None}
+    days = []
+    words = iter(args)
+    for a in words:
+        word = a.lower()
+        if word in ("from", "to"):
+            day = next(words, None)
+            if day is None:
+                raise ValueError(f"{word!r} needs a date")
+            opts["since" if word == "from" else "until"] = check_day(day)
+        elif word in FORMATS:
+            opts["fmt"] = word
+        elif a[:1].isdigit():
+            days.append(check_day(a))
+        elif opts["status"] is None:
+            check_status(table, a)
+            opts["status"] = a
+        else:
+            raise ValueError("at most one status")
+    for day in days:
+        if opts["since"] is None:
+            opts["since"] = day
+        elif opts["until"] is None:
+            opts["until"] = day
+        else:
+            raise ValueError("at most two dates")
+    return opts
+
+
+def export_table(db_path, table, out_dir, fmt="csv", since=None, until=None, status=None,
+                 tz=timezone.utc, max_bytes=MAX_PART_BYTES):
+    # returns (paths, row_count)
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}")
+    if table in STATUSES:
+        check_status(table, status)
+    since_ms, until_ms = day_bounds(since, until, tz)
+    rows = iter_rows(db_path, table, since_ms, until_ms, status)
+    columns = next(rows)
+    base_name = "_".join(p for p in (table, since, until, status) if p)
+    writer = PartWriter(out_dir, base_name, fmt, columns, max_bytes)
+    count = 0
+    try:
+        for row in readable(columns, rows, tz):
+            writer.write(row)
+            count += 1
+    finally:
+        paths = writer.finish()
+    return paths, count
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export orders or promotions to gzip-compressed CSV/JSONL.")
+    ap.add_argument("table", choices=EXPORT_TABLES)
+    ap.add_argument("--db", required=True, help="path to the bot's SQLite database")
+    ap.add_argument("--from", dest="since", help="first day to include (YYYY-MM-DD)")
+    ap.add_argument("--to", dest="until", help="last day to include (YYYY-MM-DD)")
+    ap.add_argument("--status", help="only rows with this status")
+    ap.add_argument("--format", dest="fmt", choices=FORMATS, default="csv")
+    ap.add_argument("--tz", default="UTC", help="timezone for --from/--to and the exported timestamps")
+    ap.add_argument("--out", default=".", help="output directory")
+    args = ap.parse_args()
+    paths, count = export_table(args.db, args.table, args.out, args.fmt, args.since, args.until,
+                                args.status, ZoneInfo(args.tz))
+    print(f"Exported {count} row(s) to {', '.join(paths)}")
+
+
+if __name__ == "__main__":
+    main()
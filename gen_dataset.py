@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# gen_dataset.py
+# Fills a scratch database with synthetic orders (enzo) or promotions (promo) at production
+# scale, so query plans, pagination and admin command latency can be checked against millions
+# of rows instead of the handful in enzo_bot.db:
+#
+#   python gen_dataset.py enzo --db /tmp/enzo-10m.db --rows 10000000 --bench
+#   python gen_dataset.py promo --db /tmp/promo-1m.db --rows 1000000 --seed 7
+#   python gen_dataset.py enzo --db /tmp/enzo-10m.db --rows 0 --bench   (bench an existing file)
+#
+# The schema comes from the bot's own init_db(), so it is exactly what production runs. Rows are
+# deterministic for a given --seed (timestamps are relative to now): orders are drawn from the
+# SERVICES catalog, users are skewed (a few heavy buyers, a long tail), volume grows towards the
+# present, and in-flight statuses only appear on recent rows. They are written with executemany
+# in large transactions; the table's indexes and triggers are dropped for the load and recreated
+# afterwards, and the status counters and full-text index are rebuilt from the new rows, which
+# is much faster than maintaining them row by row and ends in the same state.
+#
+# --bench then times every admin query of the bot against the file (median of --repeat runs)
+# and exits non-zero if any is slower than --budget-ms.
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+import types
+import uuid
+
+BATCH_SIZE = 10000  # rows per executemany
+TXN_ROWS = 1000000  # rows per transaction
+DAY_MS = 86400 * 1000
+IN_FLIGHT_DAYS = 3  # rows in a non-final status are at most this old
+
+# status, weight, only on recent rows
+ORDER_STATUSES = (
+    ("done", 64, False), ("rejected", 4, False), ("cancelled", 7, False),
+    ("created", 9, False), ("link_received", 4, False), ("link_updated", 1, False),  # abandoned
+    ("awaiting_receipt", 5, False), ("pending_verification", 3, True), ("processing", 3, True),
+)
+PAID_STATUSES = ("pending_verification", "processing", "done", "rejected")
+PAYMENT_METHODS = ("telebirr", "cbe", "abyssinia")
+PROMO_STATUSES = (("posted", 80, False), ("rejected", 9, False), ("pending", 6, True), ("approved", 5, True))
+CONTENT_TYPES = (("text", 40), ("photo", 45), ("video", 10), ("document", 5))
+PRICES = (0, 5, 10, 15, 20, 25, 50, 100, 200)
+LINKS = {
+    "TikTok": "https://www.tiktok.com/@{handle}/video/{n}",
+    "Instagram": "https://www.instagram.com/p/{code}/",
+    "YouTube": "https://youtu.be/{code}",
+    "Telegram": "https://t.me/{handle}/{n}",
+    "Facebook": "https://www.facebook.com/{handle}/posts/{n}",
+}
+SYLLABLES = ("ab", "be", "ka", "lu", "mi", "ne", "ro", "sa", "ti", "yo", "ze", "da", "fi", "ha", "mo", "ye")
+WORDS = ("sale", "new", "discount", "shop", "delivery", "free", "best", "price", "quality", "order", "now",
+         "today", "fashion", "phone", "laptop", "shoes", "coffee", "addis", "ababa", "bole", "piassa", "rent",
+         "apartment", "car", "course", "training", "job", "vacancy", "event", "concert", "cosmetics", "gift",
+         "original", "wholesale", "retail", "contact", "call", "telegram", "channel", "join", "limited", "offer")
+
+
+def weighted(rng, choices):
+    # returns a function drawing from ((value, weight, ...), ...)
+    values = [c[0] for c in choices]
+    cum = list(itertools.accumulate(c[1] for c in choices))
+    return lambda: rng.choices(values, cum_weights=cum)[0]
+
+
+def timestamps(rng, n, days, now):
+    # n ascending epoch-ms timestamps over the last `days`, volume growing linearly towards now
+    start, span = now - days * DAY_MS, days * DAY_MS
+    for i in range(n):
+        yield start + int(span * ((i + rng.random()) / n) ** 0.5)
+
+
+def make_users(rng, n):
+    users = []
+    for _ in range(n):
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) + str(rng.randrange(1000))
+        users.append((rng.randrange(100000000, 7000000000), name))
+    return users
+
+
+def pick_user(rng, users):
+    # skewed: a few users place a large share of the orders, most place one or two
+    return users[int(len(users) * rng.random() ** 2.5)]
+
+
+def file_id(rng, prefix="AgACAgQAAxkBAA"):
+    return prefix + "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_") for _ in range(40))
+
+
+# ---------- loading ----------
+def bulk_insert(db_path, table, columns, rows):
+    # appends rows to table; returns how many. Indexes and triggers on the table are recreated
+    # afterwards from their stored SQL, then status_counters and {table}_fts are brought up to date.
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MiB
+    deferred = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,),
+    ).fetchall()
+    first_rowid = conn.execute(f"SELECT coalesce(max(rowid), 0) FROM {table}").fetchone()[0]
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    total, started = 0, time.monotonic()
+    conn.execute("BEGIN")
+    for kind, name, _ in deferred:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+        conn.executemany(sql, batch)
+        total += len(batch)
+        if total % TXN_ROWS == 0:
+            conn.execute("COMMIT")
+            print(f"  {total:,} rows, {total / (time.monotonic() - started):,.0f}/s", flush=True)
+            conn.execute("BEGIN")
+    conn.execute("COMMIT")
+    print(f"Inserted {total:,} {table} rows in {time.monotonic() - started:.0f}s; rebuilding indexes", flush=True)
+    conn.execute("BEGIN")
+    for _, _, create in deferred:
+        conn.execute(create)
+    conn.execute(
+        f"""INSERT INTO status_counters (tbl, day, status, n)
+            SELECT ?, date(created_at / 1000, 'unixepoch'), coalesce(status, ''), COUNT(*)
+            FROM {table} WHERE rowid > ? GROUP BY 2, 3
+            ON CONFLICT (tbl, day, status) DO UPDATE SET n = n + excluded.n""",
+        (table, first_rowid),
+    )
+    conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")  # planner statistics, as a long-running database would have
+    conn.close()
+    print(f"Done in {time.monotonic() - started:.0f}s", flush=True)
+    return total
+
+
+def order_rows(enzo, rng, n, users, days, now):
+    catalog = [(service, group, qty, price)
+               for service, groups in enzo.SERVICES.items()
+               for group, packages in groups
+               for qty, price in packages]
+    status = weighted(rng, ORDER_STATUSES)
+    in_flight = {s for s, _, recent in ORDER_STATUSES if recent}
+    for created_at in timestamps(rng, n, days, now):
+        telegram_id, handle = pick_user(rng, users)
+        service, group, qty, price = rng.choice(catalog)
+        st = status()
+        if st in in_flight and created_at < now - IN_FLIGHT_DAYS * DAY_MS:
+            st = "done"
+        if enzo.expects_username(group):
+            link = "@" + handle
+        else:
+            link = LINKS[service].format(handle=handle, n=rng.getrandbits(60), code=file_id(rng, "")[:11])
+        paid = st in PAID_STATUSES or (st == "cancelled" and rng.random() < 0.2)
+        yield (
+            str(uuid.UUID(int=rng.getrandbits(128), version=4))[:12],
+            telegram_id,
+            handle if rng.random() < 0.8 else None,  # not everyone has a username
+            service, group, qty, price, link,
+            rng.choice(PAYMENT_METHODS) if paid or st == "awaiting_receipt" else None,
+            file_id(rng) if paid else None,
+            st, created_at,
+        )
+
+
+def promo_rows(rng, n, users, days, now):
+    status = weighted(rng, PROMO_STATUSES)
+    content_type = weighted(rng, CONTENT_TYPES)
+    in_flight = {s for s, _, recent in PROMO_STATUSES if recent}
+    for created_at in timestamps(rng, n, days, now):
+        tg_user_id, _ = pick_user(rng, users)
+        st = status()
+        if st in in_flight and created_at < now - IN_FLIGHT_DAYS * DAY_MS:
+            st = "posted"
+        ct = content_type()
+        caption = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40)))
+        scheduled_at = created_at + rng.randint(1, 72) * 3600 * 1000 if rng.random() < 0.3 else None
+        yield (
+            tg_user_id, ct, None if ct == "text" else file_id(rng), caption, float(rng.choice(PRICES)),
+            file_id(rng) if st != "pending" or rng.random() < 0.7 else None,
+            st, "spam" if st == "rejected" else None, scheduled_at, created_at,
+        )
+
+
+# ---------- the bots ----------
+def open_bot(bot, db_path):
+    # imports the bot against db_path without reading config.py or the real environment;
+    # importing runs (or exposes) its init_db, which creates the schema
+    if bot == "enzo":
+        config = types.ModuleType("config")
+        config.BOT_TOKEN, config.ADMIN_IDS, config.WELCOME_GIF_FILE_ID, config.DB_PATH = "0:dataset", [], "", db_path
+        sys.modules["config"] = config
+        import enzo_promo_bot
+        return enzo_promo_bot
+    os.environ.update(BOT_TOKEN="0:dataset", DB_PATH=db_path, ADMIN_IDS="")
+    import promo_bot
+    promo_bot.init_db()
+    return promo_bot
+
+
+def sample(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute(sql).fetchone()
+    conn.close()
+    return row
+
+
+def enzo_queries(enzo, db_path):
+    # (name, call) for every admin-facing read, with arguments taken from the data
+    heavy, = sample(db_path, "SELECT telegram_id FROM orders GROUP BY telegram_id ORDER BY COUNT(*) DESC LIMIT 1")
+    oid, = sample(db_path, "SELECT id FROM orders ORDER BY rowid DESC LIMIT 1 OFFSET 1000")
+    middle, = sample(db_path, f"SELECT id FROM orders WHERE telegram_id = {heavy} ORDER BY created_at LIMIT 1 OFFSET 20")
+    day = time.strftime("%Y-%m-%d", time.gmtime(time.time() - 30 * 86400))
+    match = enzo.search.match_expression("tiktok followers")
+
+    def uncached(fn, *args):
+        def call():
+            enzo.ORDER_CACHE.clear()
+            enzo.HISTORY_CACHE.clear()
+            return fn(*args)
+        return call
+    return [
+        ("/orders", lambda: enzo.db_recent_orders()),
+        ("/orders all", lambda: enzo.db_recent_orders(include_archived=True)),
+        ("/stats", lambda: enzo.db_status_counts()),
+        ("/stats daily", lambda: enzo.db_status_counts(daily=True)),
+        ("/stats last 30 days", lambda: enzo.db_status_counts(since=day)),
+        ("/find", lambda: enzo.db_search_orders(match, enzo.HISTORY_PAGE_SIZE + 1)),
+        ("/find page 50", lambda: enzo.db_search_orders(match, enzo.HISTORY_PAGE_SIZE + 1, 49 * enzo.HISTORY_PAGE_SIZE)),
+        ("/find archived", lambda: enzo.db_search_archived_orders(match, enzo.HISTORY_PAGE_SIZE + 1)),
+        ("order lookup", uncached(enzo.db_get_order, oid)),
+        ("order lookup (missing)", uncached(enzo.db_get_order, "nonexistent")),
+        ("/myorders (heaviest user)", uncached(enzo.db_user_orders_page, heavy)),
+        ("/myorders deep page", uncached(enzo.db_user_orders_page, heavy, middle)),
+        ("/myorders with archive", uncached(enzo.db_user_orders_page, heavy, None, enzo.HISTORY_PAGE_SIZE, True)),
+        ("outbox due", lambda: enzo.outbox.fetch_due(db_path)),
+    ]
+
+
+def promo_queries(promo, db_path):
+    heavy, = sample(db_path, "SELECT tg_user_id FROM promotions GROUP BY tg_user_id ORDER BY COUNT(*) DESC LIMIT 1")
+    middle, = sample(db_path, f"SELECT id FROM promotions WHERE tg_user_id = {heavy} ORDER BY created_at LIMIT 1 OFFSET 20")
+    pending, = sample(db_path, "SELECT coalesce(max(id), 0) FROM promotions WHERE status = 'pending'")
+    day = time.strftime("%Y-%m-%d", time.gmtime(time.time() - 30 * 86400))
+    match = promo.search.match_expression("discount addis")
+
+    def uncached(fn, *args):
+        def call():
+            promo.HISTORY_CACHE.clear()
+            return fn(*args)
+        return call
+    return [
+        ("/pending", lambda: promo.db_get_pending_page()),
+        ("/pending next page", lambda: promo.db_get_pending_page(pending)),
+        ("/stats", lambda: promo.db_status_counts()),
+        ("/stats daily", lambda: promo.db_status_counts(daily=True)),
+        ("/stats last 30 days", lambda: promo.db_status_counts(since=day)),
+        ("/find", lambda: promo.db_search_promos(match, promo.HISTORY_PAGE_SIZE + 1)),
+        ("/find page 50", lambda: promo.db_search_promos(match, promo.HISTORY_PAGE_SIZE + 1, 49 * promo.HISTORY_PAGE_SIZE)),
+        ("/find archived", lambda: promo.db_search_archived_promos(match, promo.HISTORY_PAGE_SIZE + 1)),
+        ("promo lookup", lambda: promo.db_get_promo(1)),
+        ("/my_promos (heaviest user)", uncached(promo.db_user_promos_page, heavy)),
+        ("/my_promos deep page", uncached(promo.db_user_promos_page, heavy, middle)),
+        ("/my_promos with archive", uncached(promo.db_user_promos_page, heavy, None, promo.HISTORY_PAGE_SIZE, True)),
+        ("due promos (posting loop)", lambda: promo.db_get_due_promos()),
+        ("rate limiter warm-up", lambda: promo.db_recent_submissions(int(time.time() * 1000) - DAY_MS)),
+        ("outbox due", lambda: promo.outbox.fetch_due(db_path)),
+    ]
+
+
+def bench(queries, repeat, budget_ms):
+    # returns the names of queries whose median exceeded the budget
+    slow = []
+    for name, call in queries:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                call()
+            except Exception as e:  # e.g. reporting.ReportError when the report timeout trips
+                print(f"{name:32} FAILED: {e}")
+                slow.append(name)
+                break
+            times.append((time.perf_counter() - started) * 1000)
+        else:
+            median = statistics.median(times)
+            flag = "  SLOW" if median > budget_ms else ""
+            print(f"{name:32} median {median:8.1f} ms, max {max(times):8.1f} ms{flag}")
+            if flag:
+                slow.append(name)
+    return slow
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fill a scratch database with synthetic orders or promotions, and benchmark the admin queries.")
+    ap.add_argument("bot", choices=("enzo", "promo"))
+    ap.add_argument("--db", required=True, help="database to create or extend (never the production file)")
+    ap.add_argument("--rows", type=int, default=1000000, help="orders (enzo) or promotions (promo) to add")
+    ap.add_argument("--users", type=int, help="distinct users (default rows / 20)")
+    ap.add_argument("--days", type=int, default=730, help="history the rows are spread over")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--bench", action="store_true", help="time the admin queries afterwards")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=100, help="median a query may take before it is reported slow")
+    args = ap.parse_args()
+
+    module = open_bot(args.bot, args.db)
+    if args.rows > 0:
+        rng = random.Random(args.seed)
+        now = int(time.time() * 1000)
+        users = make_users(rng, max(1, args.users or args.rows // 20))
+        if args.bot == "enzo":
+            bulk_insert(args.db, "orders", ("id", "telegram_id", "username", "service", "package_group", "package_qty",
+                                            "price", "link_or_username", "payment_method", "receipt_file_id", "status", "created_at"),
+                        order_rows(module, rng, args.rows, users, args.days, now))
+        else:
+            conn = sqlite3.connect(args.db)
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO users (tg_id, name, registered_at) VALUES (?, ?, ?)",
+                                 ((tg_id, name, now - args.days * DAY_MS) for tg_id, name in users))
+            conn.close()
+            bulk_insert(args.db, "promotions", ("tg_user_id", "content_type", "media_file_id", "caption", "price",
+                                                "payment_proof", "status", "admin_note", "scheduled_at", "created_at"),
+                        promo_rows(rng, args.rows, users, args.days, now))
+    if args.bench:
+        queries = enzo_queries(module, args.db) if args.bot == "enzo" else promo_queries(module, args.db)
+        slow = bench(queries, args.repeat, args.budget_ms)
+        if slow:
+            sys.exit(f"{len(slow)} quer{'y' if len(slow) == 1 else 'ies'} over {args.budget_ms:.0f} ms: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
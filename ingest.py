@@ -0,0 +1,95 @@
+# ingest.py
+# Update offset checkpointing for the bots' long-polling loops, shared by both bots.
+#
+# Telegram forgets an update only once a later getUpdates call passes an offset past it, so the
+# last batch before a restart is always delivered again, while updates already handed to worker
+# threads are lost if the process dies first. The polling loops in the bots only save an
+# update_id here once its handler and those of every earlier update have finished, resume from
+# it on start, and skip anything at or below it.
+#
+# A loop that wants to fetch ahead of its handlers stashes each batch in the inbox first: once
+# the raw updates are on disk it can confirm them to Telegram, and whatever is still unhandled
+# after a restart comes back from pending(). save() drops inbox rows at or below the checkpoint.
+import json
+import sqlite3
+import time
+
+# the only update types either bot has handlers for; everything else is never sent to us
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
+class OffsetStore:
+    TABLE = """
+    CREATE TABLE IF NOT EXISTS update_offsets (
+        name TEXT PRIMARY KEY,
+        update_id INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+    """
+
+    INBOX = """
+    CREATE TABLE IF NOT EXISTS update_inbox (
+        name TEXT NOT NULL,
+        update_id INTEGER NOT NULL,
+        raw TEXT NOT NULL,
+        PRIMARY KEY (name, update_id)
+    ) WITHOUT ROWID
+    """
+
+    def __init__(self, db_path, name):
+        self.db_path = db_path
+        self.name = name
+        conn = sqlite3.connect(db_path, timeout=5)
+        conn.execute(self.TABLE)
+        conn.execute(self.INBOX)
+        conn.commit()
+        conn.close()
+
+    def load(self):
+        # last fully processed update_id, 0 if we never saved one
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        row = conn.execute("SELECT update_id FROM update_offsets WHERE name = ?", (self.name,)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def save(self, update_id):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.execute(
+            """
+            INSERT INTO update_offsets (name, update_id, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET update_id = excluded.update_id, updated_at = excluded.updated_at
+            WHERE excluded.update_id > update_offsets.update_id
+            """,
+            (self.name, update_id, int(time.time() * 1000)),
+        )
+        conn.execute("DELETE FROM update_inbox WHERE name = ? AND update_id <= ?", (self.name, update_id))
+        conn.commit()
+        conn.close()
+
+    def stash(self, raw_updates):
+        # raw update dicts fetched but not handled yet; one transaction per batch
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.executemany(
+            "INSERT OR IGNORE INTO update_inbox (name, update_id, raw) VALUES (?, ?, ?)",
+            [(self.name, u["update_id"], json.dumps(u)) for u in raw_updates],
+        )
+        conn.commit()
+        conn.close()
+
+    def pending(self):
+        # stashed updates past the checkpoint, oldest first
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        rows = conn.execute(
+            """SELECT raw FROM update_inbox WHERE name = ? AND update_id >
+                 coalesce((SELECT update_id FROM update_offsets WHERE name = ?), 0) ORDER BY update_id""",
+            (self.name, self.name),
+        ).fetchall()
+        conn.close()
+        return [json.loads(raw) for raw, in rows]
+
+
+def is_stale(sent_at, max_age, now=None):
+    # sent_at: epoch seconds the message was sent; max_age 0 disables dropping
+    if max_age <= 0 or sent_at is None:
+        return False
+    return (time.time() if now is None else now) - sent_at > max_age
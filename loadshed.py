@@ -0,0 +1,125 @@
+# loadshed.py
+# Backpressure and load shedding for the update pipeline, shared by both bots.
+#
+# Each bot classifies an update before it is handled: CRITICAL (payments, order submissions,
+# admin decisions), NORMAL, or LOW (/start, menu navigation). The Pipeline tracks how many
+# updates are queued and how far behind we are (now minus the time the user sent it), and
+# turns that into a load level:
+#
+#   normal    everything runs as usual
+#   degraded  optional work is skipped: the welcome GIF, immediate admin digests
+#   shedding  LOW updates are dropped as well; CRITICAL ones never are
+#
+# Every decision is counted, and stats() feeds the bots' /load command.
+import logging
+import threading
+import time
+from collections import deque
+
+CRITICAL, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = ("critical", "normal", "low")
+LEVEL_NAMES = ("normal", "degraded", "shedding")
+LAG_SMOOTHING = 0.2  # weight of the newest sample in the lag average
+LATENCY_SAMPLES = 500  # per priority
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class Pipeline:
+    def __init__(self, degrade_at=50, shed_at=200, degrade_lag=5, shed_lag=30):
+        self.degrade_at = degrade_at  # queued updates
+        self.shed_at = shed_at
+        self.degrade_lag = degrade_lag  # seconds behind
+        self.shed_lag = shed_lag
+        self.lock = threading.Lock()
+        self.depth = 0
+        self.backlog = 0  # queued outside the pipeline, as last reported to admit()
+        self.lag = 0.0
+        self.current = 0
+        self.admitted = [0, 0, 0]
+        self.shed = [0, 0, 0]
+        self.latency = [deque(maxlen=LATENCY_SAMPLES) for _ in PRIORITY_NAMES]
+        self.decisions = {}
+
+    def _update_level(self):
+        depth = self.depth + self.backlog
+        if depth >= self.shed_at or self.lag >= self.shed_lag:
+            level = 2
+        elif depth >= self.degrade_at or self.lag >= self.degrade_lag:
+            level = 1
+        else:
+            level = 0
+        if level != self.current:
+            logger.warning("Load level %s -> %s (queued %s, %.1fs behind)",
+                           LEVEL_NAMES[self.current], LEVEL_NAMES[level], depth, self.lag)
+            self.current = level
+        return level
+
+    def level(self):
+        return self.current
+
+    def degraded(self):
+        return self.current >= 1
+
+    def admit(self, priority, sent_at=None, backlog=0):
+        # returns a ticket for done(), or None when the update should be dropped.
+        # sent_at: epoch seconds the user sent it; backlog: updates queued outside the pipeline
+        with self.lock:
+            if sent_at is not None:
+                self.lag += LAG_SMOOTHING * (max(0.0, time.time() - sent_at) - self.lag)
+            self.backlog = backlog
+            level = self._update_level()
+            if level == 2 and priority == LOW:
+                self.shed[priority] += 1
+                return None
+            self.admitted[priority] += 1
+            self.depth += 1
+        return priority, time.monotonic()
+
+    def done(self, ticket):
+        priority, started = ticket
+        with self.lock:
+            self.depth -= 1
+            self.latency[priority].append(time.monotonic() - started)
+            if self.depth == 0:
+                self.lag *= 1 - LAG_SMOOTHING  # an empty queue means we are catching up
+            self._update_level()
+
+    def note(self, decision, n=1):
+        # counts a degradation the bot applied, e.g. "welcome_gif_skipped"
+        with self.lock:
+            self.decisions[decision] = self.decisions.get(decision, 0) + n
+
+    def stats(self):
+        with self.lock:
+            latency = {}
+            for name, samples in zip(PRIORITY_NAMES, self.latency):
+                s = sorted(samples)
+                latency[name] = {"p50": percentile(s, 0.5), "p95": percentile(s, 0.95), "samples": len(s)}
+            return {
+                "level": LEVEL_NAMES[self.current],
+                "queued": self.depth + self.backlog,
+                "lag": round(self.lag, 1),
+                "admitted": dict(zip(PRIORITY_NAMES, self.admitted)),
+                "shed": dict(zip(PRIORITY_NAMES, self.shed)),
+                "latency": latency,
+                "decisions": dict(self.decisions),
+            }
+
+
+def format_stats(st):
+    # plain-text summary for the /load admin command
+    lines = [f"Load: {st['level']} ({st['queued']} queued, {st['lag']}s behind)"]
+    for name in PRIORITY_NAMES:
+        lat = st["latency"][name]
+        lines.append(f"{name}: {st['admitted'][name]} handled, {st['shed'][name]} shed, "
+                     f"p50 {lat['p50'] * 1000:.0f} ms, p95 {lat['p95'] * 1000:.0f} ms")
+    if st["decisions"]:
+        lines.append("Degraded: " + ", ".join(f"{k} {v}" for k, v in sorted(st["decisions"].items())))
+    return "\n".join(lines)
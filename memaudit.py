@@ -0,0 +1,142 @@
+# memaudit.py
+# Memory footprint reports for the bots' long-lived in-process structures, shared by both bots.
+#
+# Each bot registers the structures that grow with its users (conversation state, caches, rate
+# limiter windows, library-internal handler state). report() walks them on demand and gives, per
+# structure, the live entry count and an estimate of the bytes it keeps alive: sys.getsizeof summed
+# over everything reachable through containers, __dict__ and __slots__, counting shared objects
+# (interned strings, small ints) once. Modules, classes and functions are not followed.
+#
+# For leaks the registry doesn't cover, tracemalloc can be switched on (it slows allocation
+# down and costs memory itself, so only while looking); each snapshot() then lists the
+# source lines whose allocations grew most since the previous one.
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+import types
+from collections import deque
+
+SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.CodeType)
+TRACE_FRAMES = 1  # stack depth kept per allocation; 1 = just the line that allocated
+
+
+def deep_size(obj, seen=None):
+    # bytes reachable from obj; objects already in `seen` (an id set) are not counted again
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, SKIP_TYPES):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, (dict, types.MappingProxyType)):
+            for k, v in list(o.items()):
+                stack.append(k)
+                stack.append(v)
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(list(o))
+        else:
+            d = getattr(o, "__dict__", None)
+            if d is not None:
+                stack.append(d)
+            for cls in type(o).__mro__:
+                for name in _slot_names(cls):
+                    if hasattr(o, name):
+                        stack.append(getattr(o, name))
+    return total
+
+
+def _slot_names(cls):
+    # attribute names behind cls.__slots__: a bare string is one slot, and private names are mangled
+    slots = cls.__dict__.get("__slots__", ())
+    for name in (slots,) if isinstance(slots, str) else slots:
+        if name.startswith("__") and not name.endswith("__"):
+            name = f"_{cls.__name__.lstrip('_')}{name}"
+        yield name
+
+
+def rss_bytes():
+    # resident set size now, or None where /proc isn't available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def fmt_bytes(n):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+class MemoryAudit:
+    def __init__(self):
+        self.structures = []  # (name, get the object, count its entries)
+        self.last_snapshot = None
+        self.lock = threading.Lock()
+
+    def register(self, name, get, count=len):
+        # get: returns the live object (looked up on each report, so rebinding is fine)
+        self.structures.append((name, get, count))
+
+    def report(self):
+        lines = []
+        seen = set()  # shared across structures, so an object two of them hold is counted once
+        for name, get, count in self.structures:
+            try:
+                obj = get()
+                n = count(obj)
+                size = deep_size(obj, seen)
+            except Exception as e:  # a structure mutated under us: report it, don't fail the command
+                lines.append(f"{name}: unavailable ({e.__class__.__name__})")
+                continue
+            per = f", {fmt_bytes(size / n)} each" if n else ""
+            lines.append(f"{name}: {n} entries, {fmt_bytes(size)}{per}")
+        rss = rss_bytes()
+        lines.append(f"Process: {fmt_bytes(rss) if rss else 'RSS unknown'}, {len(gc.get_objects())} tracked objects")
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"tracemalloc: {fmt_bytes(current)} traced, peak {fmt_bytes(peak)}")
+        return "\n".join(lines)
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self.last_snapshot = None
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self.last_snapshot = None
+
+    def snapshot(self, top_n=15):
+        # top allocation sites; growth since the previous snapshot once there is one
+        if not tracemalloc.is_tracing():
+            return "tracemalloc is off."
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        with self.lock:
+            previous, self.last_snapshot = self.last_snapshot, snap
+        if previous is None:
+            stats = snap.statistics("lineno")[:top_n]
+            lines = [f"Top {len(stats)} allocation sites (the next snapshot shows growth):"]
+            for st in stats:
+                frame = st.traceback[0]
+                lines.append(f"{os.path.basename(frame.filename)}:{frame.lineno}: {fmt_bytes(st.size)} in {st.count} blocks")
+        else:
+            stats = snap.compare_to(previous, "lineno")[:top_n]
+            lines = [f"Top {len(stats)} allocation sites by growth since the last snapshot:"]
+            for st in stats:
+                frame = st.traceback[0]
+                lines.append(f"{os.path.basename(frame.filename)}:{frame.lineno}: {fmt_bytes(st.size_diff)} "
+                             f"({st.count_diff:+d} blocks), now {fmt_bytes(st.size)}")
+        return "\n".join(lines)
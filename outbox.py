@@ -0,0 +1,105 @@
+# outbox.py
+# Transactional outbox shared by both bots.
+#
+# Handlers write outgoing notifications into the `outbox` table in the same transaction as
+# the status change that triggers them; a background worker in each bot drains it in batches,
+# retrying failures with exponential backoff and parking rows as 'dead' after too many tries.
+import sqlite3
+import time
+
+OUTBOX_TABLE = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'message',
+    text TEXT,
+    photo_file_id TEXT,
+    ref TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at INTEGER NOT NULL,
+    last_error TEXT,
+    created_at INTEGER NOT NULL
+)
+"""
+
+COLUMNS = ["id", "chat_id", "kind", "text", "photo_file_id", "ref", "attempts", "created_at"]
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def init_outbox(c):
+    c.execute(OUTBOX_TABLE)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+
+def message(chat_id, text, kind="message", photo_file_id=None, ref=None):
+    return {"chat_id": chat_id, "text": text, "kind": kind, "photo_file_id": photo_file_id, "ref": ref}
+
+
+def enqueue(c, rows):
+    # c is a cursor inside the caller's transaction
+    now = now_ms()
+    c.executemany(
+        "INSERT INTO outbox (chat_id, kind, text, photo_file_id, ref, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(r["chat_id"], r.get("kind", "message"), r.get("text"), r.get("photo_file_id"), r.get("ref"), now, now) for r in rows],
+    )
+
+
+def fetch_due(db_path, limit=50, defer_chats=(), defer_since=None):
+    # rows for defer_chats created after defer_since (epoch ms) are left for a later sweep
+    where, params = "", []
+    if defer_chats and defer_since is not None:
+        where = f" AND NOT (chat_id IN ({', '.join('?' for _ in defer_chats)}) AND created_at > ?)"
+        params = [*defer_chats, defer_since]
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?{where} ORDER BY next_attempt_at, id LIMIT ?",
+        (now_ms(), *params, limit),
+    )
+    rows = [dict(zip(COLUMNS, r)) for r in c.fetchall()]
+    conn.close()
+    return rows
+
+
+def mark_sent(db_path, ids):
+    # delivered rows are deleted so the table only ever holds the backlog
+    if not ids:
+        return
+    conn = sqlite3.connect(db_path)
+    conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+    conn.commit()
+    conn.close()
+
+
+def mark_failed(db_path, row, error, max_attempts, backoff_base, permanent=False):
+    attempts = row["attempts"] + 1
+    dead = permanent or attempts >= max_attempts
+    retry_at = now_ms() + backoff_base * 2 ** (attempts - 1) * 1000
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+        ("dead" if dead else "pending", attempts, retry_at, str(error)[:500], row["id"]),
+    )
+    conn.commit()
+    conn.close()
+    return dead
+
+
+def counts(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def retry_dead(db_path):
+    conn = sqlite3.connect(db_path)
+    c = conn.execute("UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'", (now_ms(),))
+    conn.commit()
+    n = c.rowcount
+    conn.close()
+    return n
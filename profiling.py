@@ -0,0 +1,224 @@
+# profiling.py
+# Sampling profiler for bot handlers, shared by both bots.
+#
+# Every handler the bot registers is wrapped once at startup. Each call is timed (a counter and
+# two additions), and a sample_rate fraction of calls also runs under cProfile; those profiles
+# are merged per handler. Coroutine handlers are stepped by hand with the profiler on only while
+# the coroutine itself runs, so time spent in other tasks during its awaits is not charged to it.
+# One call is profiled at a time; a sample that would overlap another just runs unprofiled.
+#
+# For the async bot, watch_loop() also notices when the event loop stops turning: a heartbeat
+# task runs every interval and a watchdog thread grabs the loop thread's stack whenever the
+# heartbeat is overdue, so each stall is charged to the code that was running.
+#
+# dump() writes one pstats file per handler (open with `python -m pstats`) and a top-N text
+# summary; the bots call it from /profile dump and on SIGUSR1.
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import signal
+import sys
+import threading
+import time
+import traceback
+import types
+from contextlib import contextmanager
+from datetime import datetime
+
+HEARTBEAT = 0.05  # seconds between event loop heartbeats
+THIS_FILE = os.path.abspath(__file__)
+HERE = os.path.dirname(THIS_FILE)
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    def __init__(self, out_dir, sample_rate=0.0, top_n=25):
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate  # 0 = time calls only, 1 = profile every call
+        self.top_n = top_n
+        self.lock = threading.Lock()
+        self.busy = threading.Lock()  # held while a profile is enabled
+        self.started = time.time()
+        self.calls = {}  # handler -> [calls, sampled, total secs, max secs]
+        self.stats = {}  # handler -> pstats.Stats merged from its samples
+        self.blocks = {}  # code location -> [stalls, total secs, max secs, stack]
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.calls, self.stats, self.blocks = {}, {}, {}
+
+    # ---------- handlers ----------
+    def wrap(self, fn, name=None):
+        # returns fn (sync or async) timed and sampled under `name` (default: its qualified name)
+        name = name or getattr(fn, "__qualname__", repr(fn))
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                prof = cProfile.Profile() if random.random() < self.sample_rate else None
+                started = time.perf_counter()
+                try:
+                    if prof is None:
+                        return await fn(*args, **kwargs)
+                    return await self._drive(fn(*args, **kwargs), prof)
+                finally:
+                    self._record(name, time.perf_counter() - started, prof)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            prof = cProfile.Profile() if random.random() < self.sample_rate else None
+            started = time.perf_counter()
+            try:
+                if prof is None:
+                    return fn(*args, **kwargs)
+                with self._profiling(prof):
+                    return fn(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter() - started, prof)
+        return wrapper
+
+    @contextmanager
+    def _profiling(self, prof):
+        # cProfile can't nest, so a step that finds another profile running goes unprofiled
+        if not self.busy.acquire(blocking=False):
+            yield
+            return
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            self.busy.release()
+
+    @types.coroutine
+    def _drive(self, coro, prof):
+        # runs coro step by step, profiling only the steps; whatever it awaits is passed through
+        send, value = coro.send, None
+        while True:
+            try:
+                with self._profiling(prof):
+                    pending = send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, send = (yield pending), coro.send
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, send = e, coro.throw
+
+    def _record(self, name, elapsed, prof):
+        with self.lock:
+            entry = self.calls.setdefault(name, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[2] += elapsed
+            entry[3] = max(entry[3], elapsed)
+            if prof is None:
+                return
+            prof.create_stats()
+            if not prof.stats:
+                return  # every step overlapped another profile
+            entry[1] += 1
+            if name in self.stats:
+                self.stats[name].add(prof)
+            else:
+                self.stats[name] = pstats.Stats(prof)
+
+    # ---------- event loop ----------
+    async def watch_loop(self, threshold):
+        # run as a task on the loop to watch; stalls longer than threshold seconds are recorded
+        loop_thread = threading.get_ident()
+        state = {"beat": time.monotonic(), "site": None}
+        threading.Thread(target=self._watchdog, args=(loop_thread, threshold, state),
+                         name="loop-watchdog", daemon=True).start()
+        try:
+            while True:
+                await asyncio.sleep(HEARTBEAT)
+                now = time.monotonic()
+                late = now - state["beat"] - HEARTBEAT
+                if late >= threshold:
+                    site, stack = state["site"] or ("(not caught)", "")
+                    logger.warning("Event loop blocked for %.0f ms at %s", late * 1000, site)
+                    with self.lock:
+                        entry = self.blocks.setdefault(site, [0, 0.0, 0.0, stack])
+                        entry[0] += 1
+                        entry[1] += late
+                        entry[2] = max(entry[2], late)
+                state["beat"], state["site"] = now, None
+        finally:
+            state["beat"] = None  # stops the watchdog
+
+    def _watchdog(self, loop_thread, threshold, state):
+        while True:
+            time.sleep(HEARTBEAT)
+            beat = state["beat"]
+            if beat is None:
+                return
+            if state["site"] is None and time.monotonic() - beat - HEARTBEAT >= threshold:
+                frame = sys._current_frames().get(loop_thread)
+                if frame is None:
+                    return  # the loop's thread is gone
+                stack = traceback.extract_stack(frame)
+                # the innermost frame in our own code (not this wrapper), else whatever was running
+                ours = [f for f in stack if f.filename.startswith(HERE) and f.filename != THIS_FILE] or stack
+                site = f"{os.path.basename(ours[-1].filename)}:{ours[-1].lineno} in {ours[-1].name}"
+                if state["beat"] == beat:  # still the same stall
+                    state["site"] = (site, "".join(traceback.format_list(stack[-12:])))
+
+    # ---------- reports ----------
+    def report(self):
+        # short plain-text table for the /profile admin command
+        with self.lock:
+            calls = sorted(self.calls.items(), key=lambda kv: kv[1][2], reverse=True)
+            blocks = sorted(self.blocks.items(), key=lambda kv: kv[1][1], reverse=True)
+        since = datetime.fromtimestamp(self.started).strftime("%Y-%m-%d %H:%M")
+        lines = [f"Profiling since {since}, sampling {self.sample_rate:.1%} of calls"]
+        for name, (n, sampled, total, worst) in calls[:self.top_n]:
+            lines.append(f"{name}: {n} calls ({sampled} profiled), mean {total / n * 1000:.1f} ms, "
+                         f"max {worst * 1000:.0f} ms, total {total:.1f} s")
+        if blocks:
+            lines.append("Event loop stalls:")
+            for site, (n, total, worst, _stack) in blocks[:self.top_n]:
+                lines.append(f"{site}: {n}x, max {worst * 1000:.0f} ms, total {total:.1f} s")
+        if not calls and not blocks:
+            lines.append("Nothing recorded yet.")
+        return "\n".join(lines)
+
+    def dump(self):
+        # writes <out_dir>/profile-<time>/ with a .prof per handler and summary.txt; returns the dir
+        path = os.path.join(self.out_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        os.makedirs(path, exist_ok=True)
+        out = io.StringIO()
+        out.write(self.report() + "\n")
+        with self.lock:  # held while printing too: samples are merged into these Stats in place
+            blocks = sorted(self.blocks.items(), key=lambda kv: kv[1][1], reverse=True)
+            for name, st in self.stats.items():
+                st.dump_stats(os.path.join(path, re.sub(r"[^\w.-]", "_", name) + ".prof"))
+                out.write(f"\n===== {name} =====\n")
+                st.stream = out
+                st.sort_stats("cumulative").print_stats(self.top_n)
+            for site, (n, total, worst, stack) in blocks:
+                out.write(f"\n===== loop stall at {site} ({n}x, max {worst * 1000:.0f} ms) =====\n{stack}")
+        with open(os.path.join(path, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        logger.info("Profile written to %s", path)
+        return path
+
+
+def dump_on_signal(profiler, loop=None):
+    # SIGUSR1 writes a dump from a background thread (or from the loop's default executor)
+    if not hasattr(signal, "SIGUSR1"):
+        return  # Windows
+    if loop is not None:
+        loop.add_signal_handler(signal.SIGUSR1, lambda: loop.run_in_executor(None, profiler.dump))
+    else:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(target=profiler.dump, daemon=True).start())
@@ -1,9 +1,16 @@
 # promo_bot.py
 import os
 import logging
+import shutil
 import sqlite3
-from datetime import datetime, timedelta
+import sys
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
 import asyncio
+import time
+from uuid import uuid4
 
 from telegram import (
     Update,
@@ -14,57 +21,269 @@ from telegram import (
 )
 from telegram.ext import (
     ApplicationBuilder,
+    ApplicationHandlerStop,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
     CallbackQueryHandler,
 )
 
+from telegram.error import BadRequest, Forbidden
+
+import archive
+import backup
+import capture
+import cluster
+import export
+import ingest
+import loadshed
+import memaudit
+import outbox
+import profiling
+import reporting
+import search
+from cache import LRUCache
+from ratelimit import RateLimiter, Tier, flood_guard
+
 # ---------- CONFIG ----------
 BOT_TOKEN = os.getenv("BOT_TOKEN")  # Required
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
 CHANNEL_IDS = [int(x) for x in os.getenv("CHANNEL_IDS", "").split(",") if x.strip()]  # where to post
 DB_PATH = os.getenv("DB_PATH", "promotions.db")
+DEFAULT_TZ = os.getenv("DEFAULT_TZ", "Africa/Addis_Ababa")  # used to read schedules unless the user set /timezone
 POST_CHECK_INTERVAL = int(os.getenv("POST_CHECK_INTERVAL", "15"))  # seconds
 RATE_LIMIT_PER_DAY = int(os.getenv("RATE_LIMIT_PER_DAY", "3"))
+RATE_LIMIT_PER_HOUR = int(os.getenv("RATE_LIMIT_PER_HOUR", "0"))  # 0 disables the tier
+GLOBAL_LIMIT_PER_HOUR = int(os.getenv("GLOBAL_LIMIT_PER_HOUR", "0"))  # across all users, 0 disables
+FLOOD_LIMIT_PER_MINUTE = int(os.getenv("FLOOD_LIMIT_PER_MINUTE", "20"))  # commands per user
+DRAFT_TIMEOUT = int(os.getenv("DRAFT_TIMEOUT", "3600"))  # seconds before an abandoned draft is dropped
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "10"))
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "1000"))  # users whose first /my_promos page is cached
+REVIEW_PAGE_SIZE = min(int(os.getenv("REVIEW_PAGE_SIZE", "10")), 10)  # media groups hold at most 10 items
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+DELIVERY_BACKOFF_BASE = int(os.getenv("DELIVERY_BACKOFF_BASE", "30"))  # seconds, doubled per failed attempt
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))  # posted/rejected promos older than this leave the live table; 0 = off
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", str(6 * 3600)))  # seconds between archive runs
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", str(24 * 3600)))  # seconds between scheduled backups; 0 = off
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))  # snapshots retained
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "1") == "1"
+REPORT_CONCURRENCY = int(os.getenv("REPORT_CONCURRENCY", "2"))  # admin reports running at once
+REPORT_TIMEOUT = float(os.getenv("REPORT_TIMEOUT", "10"))  # seconds before a report query is aborted
+OUTBOX_POLL_INTERVAL = int(os.getenv("OUTBOX_POLL_INTERVAL", "5"))  # seconds between outbox sweeps
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = int(os.getenv("OUTBOX_BACKOFF_BASE", "10"))  # seconds, doubled per failed attempt
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+CLUSTER_MODE = os.getenv("CLUSTER_MODE", "0") == "1"  # several instances share DB_PATH; one leads
+STATE_STORE = os.getenv("STATE_STORE", f"sqlite://{DB_PATH}" if CLUSTER_MODE else "memory")  # "memory" or "sqlite://<path>"
+LEASE_TTL = int(os.getenv("LEASE_TTL", "30"))  # seconds before a silent leader is replaced
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public https URL; set = webhook instead of polling
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+LONG_POLL_TIMEOUT = int(os.getenv("LONG_POLL_TIMEOUT", "25"))  # seconds getUpdates waits for news
+DROP_UPDATES_OLDER_THAN = int(os.getenv("DROP_UPDATES_OLDER_THAN", "0"))  # seconds; stale text after an outage is skipped; 0 = off
+LOAD_DEGRADE_AT = int(os.getenv("LOAD_DEGRADE_AT", "50"))  # updates waiting for a handler before optional work is skipped
+LOAD_SHED_AT = int(os.getenv("LOAD_SHED_AT", "200"))  # updates waiting for a handler before low-value updates are dropped
+LOAD_DEGRADE_LAG = int(os.getenv("LOAD_DEGRADE_LAG", "5"))  # seconds behind, same meaning
+LOAD_SHED_LAG = int(os.getenv("LOAD_SHED_LAG", "30"))
+UPDATE_QUEUE_MAX = int(os.getenv("UPDATE_QUEUE_MAX", "1000"))  # polling stops fetching while this many are waiting
+DEGRADED_DIGEST_WINDOW = int(os.getenv("DEGRADED_DIGEST_WINDOW", "60"))  # seconds admin notices wait while degraded
+CAPTURE_DIR = os.getenv("CAPTURE_DIR")  # record incoming updates here for replay.py; unset = off
+CAPTURE_SECRET = os.getenv("CAPTURE_SECRET")  # keys the user id pseudonyms; keep it stable and private
+CAPTURE_ROTATE_MB = int(os.getenv("CAPTURE_ROTATE_MB", "64"))
+CAPTURE_ROTATE_SECS = int(os.getenv("CAPTURE_ROTATE_SECS", "3600"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of handler calls run under cProfile; 0 = timing only
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # where /profile dump and SIGUSR1 write pstats files
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))  # functions per handler in the text summary
+LOOP_BLOCK_MS = int(os.getenv("LOOP_BLOCK_MS", "250"))  # event loop stalls longer than this are recorded; 0 = off
+MEMTRACE = os.getenv("MEMTRACE", "0") == "1"  # start tracemalloc at boot (else /memstats trace on)
+
+if CLUSTER_MODE:
+    # the cache is per process and only the writing instance would drop its stale entries
+    HISTORY_CACHE_SIZE = 0
 # ----------------------------
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MAX_MESSAGE_LEN = 4096
+DEFAULT_ZONE = ZoneInfo(DEFAULT_TZ)
+
+# first page of /my_promos per user, dropped whenever one of that user's promos changes
+HISTORY_CACHE = LRUCache(HISTORY_CACHE_SIZE)
+
 # ---------- DB helpers ----------
+# All timestamps are stored as integer epoch milliseconds (UTC).
+SCHEMA_VERSION = 1
+
+USERS_TABLE = """CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    tg_id INTEGER UNIQUE,
+    name TEXT,
+    tz TEXT,
+    registered_at INTEGER
+)"""
+
+PROMOTIONS_TABLE = """CREATE TABLE IF NOT EXISTS promotions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    tg_user_id INTEGER,
+    content_type TEXT,
+    media_file_id TEXT,
+    caption TEXT,
+    price REAL DEFAULT 0,
+    payment_proof TEXT,
+    status TEXT,
+    admin_note TEXT,
+    scheduled_at INTEGER,
+    created_at INTEGER
+)"""
+
+# one row per (promotion, channel): lets the publisher resume and edit/delete posts later
+DELIVERIES_TABLE = """CREATE TABLE IF NOT EXISTS promotion_deliveries (
+    promo_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    message_id INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at INTEGER,
+    last_error TEXT,
+    updated_at INTEGER,
+    PRIMARY KEY (promo_id, channel_id)
+)"""
+
+def now_ms():
+    return int(time.time() * 1000)
+
+def to_ms(dt):
+    return int(dt.timestamp() * 1000)
+
+def fmt_ts(ms, tz=None):
+    if ms is None:
+        return "-"
+    return datetime.fromtimestamp(ms / 1000, tz or DEFAULT_ZONE).strftime("%Y-%m-%d %H:%M")
+
+def iso_to_ms(value):
+    # legacy rows hold naive UTC strings from datetime.utcnow().isoformat()
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        dt = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return to_ms(dt)
+
+def rebuild_with_epoch(c, table, create_sql, time_cols):
+    # SQLite can't change a column's type in place: copy into a fresh table, converting time columns
+    c.execute(f"PRAGMA table_info({table})")
+    old_cols = [r[1] for r in c.fetchall()]
+    if not old_cols:
+        c.execute(create_sql)
+        return
+    c.execute(f"ALTER TABLE {table} RENAME TO {table}_pre_epoch")
+    c.execute(create_sql)
+    c.execute(f"PRAGMA table_info({table})")
+    cols = [r[1] for r in c.fetchall() if r[1] in old_cols]
+    select = ", ".join(f"iso_to_ms({col})" if col in time_cols else col for col in cols)
+    c.execute(f"INSERT INTO {table} ({', '.join(cols)}) SELECT {select} FROM {table}_pre_epoch")
+    dropped = [col for col in old_cols if col not in cols]
+    if dropped:
+        # unknown legacy columns: keep the old table around instead of losing data
+        logger.warning("Kept %s_pre_epoch: columns %s have no place in the new schema", table, dropped)
+        return
+    c.execute(f"DROP TABLE {table}_pre_epoch")
+
+def migrate_db(conn):
+    conn.create_function("iso_to_ms", 1, iso_to_ms)
+    c = conn.cursor()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # 1: ISO-8601 strings -> integer epoch milliseconds
+        rebuild_with_epoch(c, "users", USERS_TABLE, ("registered_at",))
+        rebuild_with_epoch(c, "promotions", PROMOTIONS_TABLE, ("scheduled_at", "created_at"))
+        rebuild_with_epoch(c, "promotion_deliveries", DELIVERIES_TABLE, ("next_attempt_at", "updated_at"))
+        if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'status_counters'").fetchone():
+            c.execute("DELETE FROM status_counters WHERE tbl = 'promotions'")  # reseeded by init_db
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
 def init_db():
     with sqlite3.connect(DB_PATH) as conn:
+        # WAL lets long reads (exports, reports) run without blocking writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        migrate_db(conn)
         c = conn.cursor()
+        c.execute(USERS_TABLE)
+        c.execute(PROMOTIONS_TABLE)
+        c.execute(DELIVERIES_TABLE)
+        # notifications written in the same transaction as the status change they announce
+        outbox.init_outbox(c)
+        # in-progress /newpromo conversations, so a restart doesn't lose drafts
         c.execute(
-            """CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                tg_id INTEGER UNIQUE,
-                name TEXT,
-                registered_at TEXT
-            )"""
-        )
-        c.execute(
-            """CREATE TABLE IF NOT EXISTS promotions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                tg_user_id INTEGER,
+            """CREATE TABLE IF NOT EXISTS promo_sessions (
+                tg_user_id INTEGER PRIMARY KEY,
+                state INTEGER NOT NULL,
+                promo_id INTEGER,
                 content_type TEXT,
                 media_file_id TEXT,
                 caption TEXT,
-                price REAL DEFAULT 0,
-                payment_proof TEXT,
-                status TEXT,
-                admin_note TEXT,
-                scheduled_at TEXT,
-                created_at TEXT
+                updated_at INTEGER
             )"""
         )
+        # /my_promos pages walk this index with a (created_at, id) cursor
+        c.execute("CREATE INDEX IF NOT EXISTS idx_promotions_user_created ON promotions (tg_user_id, created_at, id)")
+        # review queue pages walk this index with a (created_at, id) cursor
+        c.execute("CREATE INDEX IF NOT EXISTS idx_promotions_status_created ON promotions (status, created_at, id)")
+        # due-promo scan and rate limiter warm-up are integer range scans
+        c.execute("CREATE INDEX IF NOT EXISTS idx_promotions_status_scheduled ON promotions (status, scheduled_at)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_promotions_created ON promotions (created_at)")
+        # per-day (UTC) status counters kept current by triggers, so /stats never scans promotions
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS status_counters (
+                tbl TEXT NOT NULL,
+                day TEXT NOT NULL,
+                status TEXT NOT NULL,
+                n INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (tbl, day, status)
+            ) WITHOUT ROWID"""
+        )
+        c.execute(
+            """CREATE TRIGGER IF NOT EXISTS trg_promotions_count_insert AFTER INSERT ON promotions BEGIN
+                INSERT INTO status_counters (tbl, day, status, n)
+                VALUES ('promotions', date(NEW.created_at / 1000, 'unixepoch'), coalesce(NEW.status, ''), 1)
+                ON CONFLICT (tbl, day, status) DO UPDATE SET n = n + 1;
+            END"""
+        )
+        c.execute(
+            """CREATE TRIGGER IF NOT EXISTS trg_promotions_count_status AFTER UPDATE OF status ON promotions
+            WHEN OLD.status IS NOT NEW.status BEGIN
+                UPDATE status_counters SET n = n - 1
+                WHERE tbl = 'promotions' AND day = date(OLD.created_at / 1000, 'unixepoch') AND status = coalesce(OLD.status, '');
+                INSERT INTO status_counters (tbl, day, status, n)
+                VALUES ('promotions', date(NEW.created_at / 1000, 'unixepoch'), coalesce(NEW.status, ''), 1)
+                ON CONFLICT (tbl, day, status) DO UPDATE SET n = n + 1;
+            END"""
+        )
+        # first run on an existing database: seed the counters from history once
+        c.execute("SELECT 1 FROM status_counters WHERE tbl = 'promotions' LIMIT 1")
+        if c.fetchone() is None:
+            c.execute(
+                """INSERT INTO status_counters (tbl, day, status, n)
+                   SELECT 'promotions', date(created_at / 1000, 'unixepoch'), coalesce(status, ''), COUNT(*)
+                   FROM promotions GROUP BY 2, 3"""
+            )
+        # full-text index behind /find
+        search.init_fts(c, "promotions", ("caption",))
+        # monthly archive tables for finished promotions, and the promotions_all view over everything
+        archive.init_archive(c, "promotions", ("caption",))
         conn.commit()
 
 def db_add_user(tg_id, name):
-    now = datetime.utcnow().isoformat()
+    now = now_ms()
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
         c.execute(
@@ -73,8 +292,33 @@ def db_add_user(tg_id, name):
         )
         conn.commit()
 
+def db_get_user_tz(tg_id):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("SELECT tz FROM users WHERE tg_id = ?", (tg_id,))
+        row = c.fetchone()
+        return row[0] if row else None
+
+def db_set_user_tz(tg_id, tz_name):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO users (tg_id, tz, registered_at) VALUES (?, ?, ?) ON CONFLICT (tg_id) DO UPDATE SET tz = excluded.tz",
+            (tg_id, tz_name, now_ms()),
+        )
+        conn.commit()
+
+def user_zone(tg_id):
+    name = db_get_user_tz(tg_id)
+    if name:
+        try:
+            return ZoneInfo(name)
+        except Exception:
+            logger.warning("Invalid stored timezone %r for user %s", name, tg_id)
+    return DEFAULT_ZONE
+
 def db_create_promo(tg_user_id, content_type, media_file_id, caption, price, scheduled_at=None):
-    now = datetime.utcnow().isoformat()
+    now = now_ms()
     status = "pending"
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
@@ -84,34 +328,77 @@ def db_create_promo(tg_user_id, content_type, media_file_id, caption, price, sch
         )
         promo_id = c.lastrowid
         conn.commit()
-        return promo_id
+    HISTORY_CACHE.pop(tg_user_id)
+    return promo_id
 
-def db_set_payment_proof(promo_id, proof):
+def invalidate_history(c, promo_id):
+    # returns the promo owner's tg id (None if the promo doesn't exist)
+    c.execute("SELECT tg_user_id FROM promotions WHERE id = ?", (promo_id,))
+    row = c.fetchone()
+    if row:
+        HISTORY_CACHE.pop(row[0])
+        return row[0]
+    return None
+
+def notify_owner(c, promo_id, text):
+    # queue a message to the promo's owner inside the caller's transaction; returns True if one
+    # was queued, and the caller sets OUTBOX_WAKE once it has committed
+    tg_user_id = invalidate_history(c, promo_id)
+    if text and tg_user_id:
+        outbox.enqueue(c, [outbox.message(tg_user_id, text)])
+        return True
+    return False
+
+def db_set_payment_proof(promo_id, proof, notify=None):
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
         c.execute("UPDATE promotions SET payment_proof = ? WHERE id = ?", (proof, promo_id))
+        if notify:
+            outbox.enqueue(c, notify)
         conn.commit()
+    if notify:
+        OUTBOX_WAKE.set()
 
-def db_get_pending():
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, tg_user_id, content_type, caption, media_file_id, price, created_at FROM promotions WHERE status = 'pending' ORDER BY created_at ASC")
-        return c.fetchall()
+# admin reports read through their own read-only connections; see reporting.py
+REPORTS = reporting.ReportingDB(DB_PATH, REPORT_CONCURRENCY, REPORT_TIMEOUT)
 
-def db_update_status(promo_id, status, admin_note=None):
+def db_get_pending_page(after_id=None, limit=REVIEW_PAGE_SIZE):
+    # keyset page over idx_promotions_status_created; after_id is the last promo of the previous page
+    if after_id is None:
+        return REPORTS.query("""SELECT id, tg_user_id, content_type, caption, media_file_id, price, created_at FROM promotions
+                                WHERE status = 'pending' ORDER BY created_at ASC, id ASC LIMIT ?""", (limit,))
+    return REPORTS.query("""SELECT id, tg_user_id, content_type, caption, media_file_id, price, created_at FROM promotions
+                            WHERE status = 'pending' AND (created_at, id) > (SELECT created_at, id FROM promotions WHERE id = ?)
+                            ORDER BY created_at ASC, id ASC LIMIT ?""", (after_id, limit))
+
+def db_review_promo(promo_id, status, admin_note=None, notify_text=None):
+    # pending -> status; False when the promo is no longer pending (a second tap, or already
+    # posted/rejected), in which case nothing changes and the owner isn't notified again
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
-        c.execute("UPDATE promotions SET status = ?, admin_note = ? WHERE id = ?", (status, admin_note, promo_id))
+        c.execute("UPDATE promotions SET status = ?, admin_note = ? WHERE id = ? AND status = 'pending'",
+                  (status, admin_note, promo_id))
+        if c.rowcount == 0:
+            return False
+        queued = notify_owner(c, promo_id, notify_text)
         conn.commit()
+    if queued:
+        OUTBOX_WAKE.set()
+    return True
 
 def db_get_promo(promo_id):
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
         c.execute("SELECT * FROM promotions WHERE id = ?", (promo_id,))
-        return c.fetchone()
+        row = c.fetchone()
+        if row is None:
+            # archived promos are finished, but /editpost and reviews may still look them up
+            c.execute("SELECT * FROM promotions_all WHERE id = ?", (promo_id,))
+            row = c.fetchone()
+        return row
 
 def db_get_due_promos():
-    now = datetime.utcnow().isoformat()
+    now = now_ms()
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
         # approved and scheduled_at <= now OR approved and scheduled_at is null (post immediately)
@@ -119,25 +406,225 @@ def db_get_due_promos():
                      WHERE status = 'approved' AND (scheduled_at IS NULL OR scheduled_at <= ?)""", (now,))
         return c.fetchall()
 
-def db_mark_posted(promo_id):
+def db_mark_posted(promo_id, notify_text=None):
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
         c.execute("UPDATE promotions SET status = 'posted' WHERE id = ?", (promo_id,))
+        queued = notify_owner(c, promo_id, notify_text)
+        conn.commit()
+    if queued:
+        OUTBOX_WAKE.set()
+
+# ---------- delivery ledger ----------
+def db_ensure_deliveries(promo_id, channel_ids):
+    now = now_ms()
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.executemany(
+            "INSERT OR IGNORE INTO promotion_deliveries (promo_id, channel_id, status, updated_at) VALUES (?, ?, 'pending', ?)",
+            [(promo_id, ch, now) for ch in channel_ids],
+        )
+        conn.commit()
+
+def db_due_deliveries(promo_id):
+    now = now_ms()
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("""SELECT channel_id, attempts FROM promotion_deliveries
+                     WHERE promo_id = ? AND status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= ?)""",
+                  (promo_id, now))
+        return c.fetchall()
+
+def db_delivery_sent(promo_id, channel_id, message_id):
+    now = now_ms()
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("""UPDATE promotion_deliveries SET status = 'sent', message_id = ?, attempts = attempts + 1,
+                     last_error = NULL, updated_at = ? WHERE promo_id = ? AND channel_id = ?""",
+                  (message_id, now, promo_id, channel_id))
         conn.commit()
 
-def db_user_daily_count(tg_user_id):
-    since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+def db_delivery_failed(promo_id, channel_id, attempts, error):
+    now = now_ms()
+    attempts += 1
+    status = 'failed' if attempts >= DELIVERY_MAX_ATTEMPTS else 'pending'
+    retry_at = now + DELIVERY_BACKOFF_BASE * 2 ** (attempts - 1) * 1000
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM promotions WHERE tg_user_id = ? AND created_at >= ?", (tg_user_id, since))
+        c.execute("""UPDATE promotion_deliveries SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?,
+                     updated_at = ? WHERE promo_id = ? AND channel_id = ?""",
+                  (status, attempts, retry_at, str(error)[:500], now, promo_id, channel_id))
+        conn.commit()
+
+def db_open_deliveries(promo_id):
+    # deliveries still waiting for a (re)try
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM promotion_deliveries WHERE promo_id = ? AND status = 'pending'", (promo_id,))
         return c.fetchone()[0]
 
-def db_user_promos(tg_user_id):
+def db_failed_deliveries(promo_id):
+    # deliveries that ran out of attempts; the promo is fully published only when this and
+    # db_open_deliveries are both empty
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("SELECT channel_id, last_error FROM promotion_deliveries WHERE promo_id = ? AND status = 'failed'", (promo_id,))
+        return c.fetchall()
+
+def db_mark_unpublished(promo_id, status, notify):
+    # 'partially_posted' / 'post_failed': off the posting loop until an admin runs /repost
     with sqlite3.connect(DB_PATH) as conn:
         c = conn.cursor()
-        c.execute("SELECT id, content_type, caption, status, created_at FROM promotions WHERE tg_user_id = ? ORDER BY created_at DESC", (tg_user_id,))
+        c.execute("UPDATE promotions SET status = ? WHERE id = ?", (status, promo_id))
+        invalidate_history(c, promo_id)
+        outbox.enqueue(c, notify)
+        conn.commit()
+    OUTBOX_WAKE.set()
+
+def db_retry_deliveries(promo_id):
+    # failed channels get a fresh set of attempts and the promo goes back to the posting loop
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("""UPDATE promotion_deliveries SET status = 'pending', attempts = 0, next_attempt_at = NULL, updated_at = ?
+                     WHERE promo_id = ? AND status = 'failed'""", (now_ms(), promo_id))
+        n = c.rowcount
+        if n:
+            c.execute("UPDATE promotions SET status = 'approved' WHERE id = ? AND status IN ('partially_posted', 'post_failed')", (promo_id,))
+            invalidate_history(c, promo_id)
+        conn.commit()
+        return n
+
+def db_sent_deliveries(promo_id):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("SELECT channel_id, message_id FROM promotion_deliveries WHERE promo_id = ? AND status = 'sent'", (promo_id,))
         return c.fetchall()
 
+def db_set_delivery_status(promo_id, channel_id, status):
+    now = now_ms()
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("UPDATE promotion_deliveries SET status = ?, updated_at = ? WHERE promo_id = ? AND channel_id = ?",
+                  (status, now, promo_id, channel_id))
+        conn.commit()
+
+def db_update_caption(promo_id, caption):
+    # False for an archived promo: archive rows are never rewritten
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("UPDATE promotions SET caption = ? WHERE id = ?", (caption, promo_id))
+        if c.rowcount == 0:
+            return False
+        invalidate_history(c, promo_id)
+        conn.commit()
+    return True
+
+def db_save_session(tg_user_id, session):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO promo_sessions (tg_user_id, state, promo_id, content_type, media_file_id, caption, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (tg_user_id, session.state, session.promo_id, session.content_type,
+             session.media_file_id, session.caption, session.updated_at),
+        )
+        conn.commit()
+
+def db_load_session(tg_user_id):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("SELECT state, promo_id, content_type, media_file_id, caption, updated_at FROM promo_sessions WHERE tg_user_id = ?", (tg_user_id,))
+        row = c.fetchone()
+    return Session(*row) if row else None
+
+def db_delete_session(tg_user_id):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM promo_sessions WHERE tg_user_id = ?", (tg_user_id,))
+        conn.commit()
+
+def db_expire_sessions(older_than):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM promo_sessions WHERE updated_at < ?", (older_than,))
+        conn.commit()
+        return c.rowcount
+
+def db_status_counts(since=None, until=None, daily=False):
+    # since/until are inclusive YYYY-MM-DD bounds on the promotion's creation day
+    sql = "SELECT {cols}, SUM(n) FROM status_counters WHERE tbl = 'promotions' AND day >= ? AND day <= ? GROUP BY {cols} HAVING SUM(n) != 0 ORDER BY {cols}"
+    cols = "day, status" if daily else "status"
+    return REPORTS.query(sql.format(cols=cols), (since or "0000-00-00", until or "9999-99-99"))
+
+def db_search_promos(match, limit, offset=0):
+    # best bm25 matches first
+    return REPORTS.query(
+        """SELECT p.id, p.tg_user_id, p.content_type, p.caption, p.status, p.created_at
+           FROM promotions_fts JOIN promotions p ON p.id = promotions_fts.rowid
+           WHERE promotions_fts MATCH ? ORDER BY promotions_fts.rank LIMIT ? OFFSET ?""",
+        (match, limit, offset),
+    )
+
+def db_recent_submissions(since):
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("SELECT tg_user_id, created_at FROM promotions WHERE created_at >= ? ORDER BY created_at ASC", (since,))
+        return c.fetchall()
+
+def db_user_promos_page(tg_user_id, before_id=None, limit=HISTORY_PAGE_SIZE, archived=False):
+    # newest first; before_id is the last promo shown on the previous page.
+    # archived=True pages through promotions_all, i.e. live and archived promos together
+    src = "promotions_all" if archived else "promotions"
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        if before_id is None:
+            c.execute(f"""SELECT id, content_type, caption, status, created_at FROM {src}
+                          WHERE tg_user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?""", (tg_user_id, limit))
+        else:
+            c.execute(f"""SELECT id, content_type, caption, status, created_at FROM {src}
+                          WHERE tg_user_id = ? AND (created_at, id) < (SELECT created_at, id FROM {src} WHERE id = ?)
+                          ORDER BY created_at DESC, id DESC LIMIT ?""", (tg_user_id, before_id, limit))
+        return c.fetchall()
+
+def db_search_archived_promos(match, limit, offset=0):
+    refs = archive.search_archive(DB_PATH, "promotions", match, limit, offset)
+    if not refs:
+        return []
+    rows = REPORTS.query(
+        f"""SELECT id, tg_user_id, content_type, caption, status, created_at FROM promotions_all
+            WHERE id IN ({", ".join("?" for _ in refs)})""",
+        refs,
+    )
+    found = {r[0]: r for r in rows}
+    return [found[ref] for ref in refs if ref in found]  # keep the bm25 order
+
+# ---------- Rate limiting ----------
+# Submission quotas are enforced in memory; the windows are warmed from the DB at startup,
+# and in CLUSTER_MODE rebuilt every sweep so submissions made through other instances count.
+def new_promo_limiter():
+    return RateLimiter([
+        Tier("hour", RATE_LIMIT_PER_HOUR, 3600),
+        Tier("day", RATE_LIMIT_PER_DAY, 86400),
+        Tier("global_hour", GLOBAL_LIMIT_PER_HOUR, 3600, "global"),
+    ])
+
+PROMO_LIMITER = new_promo_limiter()
+FLOOD_LIMITER = RateLimiter([Tier("minute", FLOOD_LIMIT_PER_MINUTE, 60)])
+
+def warm_rate_limiters():
+    global PROMO_LIMITER
+    rows = db_recent_submissions(now_ms() - 86400 * 1000)
+    limiter = new_promo_limiter()
+    limiter.warm((uid, ts / 1000) for uid, ts in rows)
+    PROMO_LIMITER = limiter
+    logger.info("Rate limiter warmed with %s submissions", len(rows))
+
+async def on_flood(update: Update, context: ContextTypes.DEFAULT_TYPE, retry_after):
+    if update.message:
+        await update.message.reply_text(f"Too many requests. Try again in {int(retry_after) + 1}s.")
+
+def user_key(update, context):
+    return update.effective_user.id
+
 # ---------- Bot Handlers ----------
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -148,36 +635,166 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Commands:\n"
         "/newpromo - create a new promotion\n"
         "/my_promos - view your promotions\n"
+        "/timezone - set the timezone used for scheduled posts\n"
         "/help - help\n"
     )
     await update.message.reply_text(text)
 
+async def timezone_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tg_user_id = update.effective_user.id
+    if not context.args:
+        await update.message.reply_text(f"Your timezone: {user_zone(tg_user_id)}. Change it with /timezone <Area/City>, e.g. /timezone Africa/Addis_Ababa")
+        return
+    name = context.args[0]
+    try:
+        ZoneInfo(name)
+    except Exception:
+        await update.message.reply_text(f"Unknown timezone '{name}'. Use a name like Africa/Addis_Ababa or Europe/London.")
+        return
+    db_set_user_tz(tg_user_id, name)
+    await update.message.reply_text(f"Timezone set to {name}. Scheduled times you send will be read in this timezone.")
+
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Use /newpromo to create, /my_promos to view, or contact support.")
 
-# create promotion: simplified flow
-# 1) user sends /newpromo, bot asks for media or text
-# 2) user sends media/text; bot asks for price and scheduled datetime (optional)
-# 3) user sends payment proof
+# ---------- Conversation state machine ----------
+# /newpromo walks DRAFT -> PRICE -> PROOF. The session lives in SESSIONS, is mirrored to
+# promo_sessions so it survives restarts, and incoming messages are dispatched with a single
+# dict lookup on the current state. In CLUSTER_MODE the user's next message may reach another
+# instance, so promo_sessions is read every time.
+STATE_IDLE, STATE_DRAFT, STATE_PRICE, STATE_PROOF = 0, 1, 2, 3
+SESSION_SWEEP_INTERVAL = 60  # seconds
+
+class Session:
+    # one per user with a draft open, so kept small: no per-instance dict, and the content
+    # type is interned (one shared "photo" instead of a copy per draft)
+    __slots__ = ("state", "promo_id", "content_type", "media_file_id", "caption", "updated_at")
+
+    def __init__(self, state, promo_id=None, content_type=None, media_file_id=None, caption=None, updated_at=0):
+        self.state = state
+        self.promo_id = promo_id
+        self.content_type = sys.intern(content_type) if content_type else None
+        self.media_file_id = media_file_id
+        self.caption = caption
+        self.updated_at = updated_at
+
+SESSIONS = {}  # tg_user_id -> Session; PTB's per-user user_data dicts are never created
+
+def load_session(tg_user_id):
+    session = None if CLUSTER_MODE else SESSIONS.get(tg_user_id)
+    if session is None:
+        session = db_load_session(tg_user_id)  # after a restart
+        if session is None:
+            return None
+        if not CLUSTER_MODE:
+            SESSIONS[tg_user_id] = session
+    if session.updated_at < now_ms() - DRAFT_TIMEOUT * 1000:
+        end_session(tg_user_id)
+        return None
+    return session
+
+def save_session(tg_user_id, session):
+    session.updated_at = now_ms()
+    if not CLUSTER_MODE:
+        SESSIONS[tg_user_id] = session
+    db_save_session(tg_user_id, session)
+
+def end_session(tg_user_id):
+    SESSIONS.pop(tg_user_id, None)
+    db_delete_session(tg_user_id)
+
+async def run_backup():
+    # the backup API steps and sleeps in a worker thread, never on the event loop
+    path, size, secs = await asyncio.to_thread(backup.take_backup, DB_PATH, BACKUP_DIR, BACKUP_KEEP, BACKUP_COMPRESS)
+    logger.info("Backup written to %s (%s bytes, %.1fs)", path, size, secs)
+    return path, size, secs
+
+async def backup_loop(app):
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL)
+        if not is_leader():
+            continue
+        try:
+            await run_backup()
+        except Exception as e:
+            logger.exception("Scheduled backup failed: %s", e)
+
+async def backup_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    # /backup [send] - take a snapshot now; 'send' also uploads it here
+    await update.message.reply_text("Backing up…")
+    try:
+        path, size, secs = await run_backup()
+    except Exception as e:
+        logger.exception("Backup failed: %s", e)
+        await update.message.reply_text(f"Backup failed: {e}")
+        return
+    await update.message.reply_text(f"Backup OK: {os.path.basename(path)} ({size / 1048576:.1f} MB, {secs:.1f}s, integrity checked)")
+    if context.args[:1] == ["send"]:
+        try:
+            with open(path, "rb") as f:
+                await context.bot.send_document(chat_id=update.effective_chat.id, document=f, filename=os.path.basename(path))
+        except Exception as e:
+            await update.message.reply_text(f"Could not upload the backup: {e}")
+
+async def archive_loop(app):
+    # keeps the live promotions table down to the working set; see archive.py
+    while True:
+        try:
+            moved = await asyncio.to_thread(archive.archive_rows, DB_PATH, "promotions", ARCHIVE_AFTER_DAYS) if is_leader() else 0
+            if moved:
+                logger.info("Archived %s finished promotion(s)", moved)
+                HISTORY_CACHE.clear()
+        except Exception as e:
+            logger.exception("Error in archive loop: %s", e)
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+async def session_sweeper(app):
+    # frees abandoned drafts from SESSIONS and the sessions table, and expired shared state
+    next_purge = 0
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            cutoff = now_ms() - DRAFT_TIMEOUT * 1000
+            for uid in [uid for uid, session in SESSIONS.items() if session.updated_at < cutoff]:
+                del SESSIONS[uid]
+            expired = db_expire_sessions(cutoff)
+            if expired:
+                logger.info("Dropped %s abandoned promo drafts", expired)
+            if is_leader() and time.monotonic() >= next_purge:
+                # expired entries are invisible to get() but stay in memory (or the file) until purged
+                next_purge = time.monotonic() + STATE_PURGE_INTERVAL
+                await asyncio.to_thread(SHARED_STATE.purge)
+            if CLUSTER_MODE:
+                warm_rate_limiters()
+        except Exception as e:
+            logger.exception("Error in session sweeper: %s", e)
+
+def limit_text(tier, retry_after):
+    if tier == "day":
+        return f"You have reached the daily limit ({RATE_LIMIT_PER_DAY}) for submissions."
+    if tier == "hour":
+        return f"You have reached the hourly limit ({RATE_LIMIT_PER_HOUR}) for submissions."
+    return f"We're receiving too many submissions. Please try again in {int(retry_after // 60) + 1} min."
+
+@flood_guard(FLOOD_LIMITER, user_key, on_flood)
 async def newpromo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tg_user_id = update.effective_user.id
-    count = db_user_daily_count(tg_user_id)
-    if count >= RATE_LIMIT_PER_DAY:
-        await update.message.reply_text(f"You have reached the daily limit ({RATE_LIMIT_PER_DAY}) for submissions.")
+    # early answer only; the quota is taken in on_price, when the promo row is created
+    allowed, retry_after, tier = PROMO_LIMITER.check(tg_user_id)
+    if not allowed:
+        await update.message.reply_text(limit_text(tier, retry_after))
         return
-    context.user_data['creating_promo'] = True
-    await update.message.reply_text("Send the promo text, or send a photo/video with a caption. When done, reply with /done to submit or /cancel to abort.")
+    save_session(tg_user_id, Session(STATE_DRAFT))
+    await update.message.reply_text("Send the promo text, or send a photo/video with a caption. Send /cancel to abort.")
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data.pop('creating_promo', None)
-    context.user_data.pop('promo_media', None)
-    context.user_data.pop('promo_caption', None)
+    end_session(update.effective_user.id)
     await update.message.reply_text("Promo creation cancelled.")
 
-async def handle_media_or_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.user_data.get('creating_promo'):
-        return  # ignore for now
-
+async def on_draft(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
     # store media or text
     msg = update.message
     media_file_id = None
@@ -196,23 +813,22 @@ async def handle_media_or_text(update: Update, context: ContextTypes.DEFAULT_TYP
         media_file_id = msg.document.file_id
         content_type = 'document'
         caption = caption or msg.caption or ""
-    else:
-        # plain text
-        content_type = 'text'
-        caption = msg.text
+    elif not msg.text:
+        await msg.reply_text("Please send text, a photo, a video or a document.")
+        return
 
-    context.user_data['promo_media'] = media_file_id
-    context.user_data['promo_caption'] = caption
-    context.user_data['promo_content_type'] = content_type
+    session = Session(STATE_PRICE, content_type=content_type, media_file_id=media_file_id, caption=caption)
+    save_session(update.effective_user.id, session)
 
     await update.message.reply_text(
-        "Got it. Now reply with the price (number) or package name (e.g. 'standard'), and optionally include scheduled datetime in ISO (YYYY-MM-DD HH:MM) separated by a '|'.\n"
+        "Got it. Now reply with the price (number) or package name (e.g. 'standard'), and optionally include scheduled datetime in ISO (YYYY-MM-DD HH:MM, your local time - see /timezone) separated by a '|'.\n"
         "Example: `10` or `standard | 2025-11-12 15:00`\n\n"
         "After you send that, upload payment proof (image) or a transaction ID."
     )
 
-async def price_and_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.user_data.get('creating_promo'):
+async def on_price(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    if not update.message.text:
+        await update.message.reply_text("Please reply with the price, e.g. `10` or `standard | 2025-11-12 15:00`.")
         return
     text = update.message.text.strip()
     parts = [p.strip() for p in text.split("|")]
@@ -222,36 +838,46 @@ async def price_and_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE)
         price = float(price_part)
     except:
         price = 0.0
+    zone = None
     if len(parts) > 1:
         try:
-            scheduled = datetime.fromisoformat(parts[1]).isoformat()
-        except Exception as e:
-            scheduled = None
-
-    context.user_data['promo_price'] = price
-    context.user_data['promo_scheduled'] = scheduled
+            when = datetime.fromisoformat(parts[1])
+        except ValueError:
+            when = None
+        if when is not None:
+            # naive times are in the user's timezone (East Africa Time unless changed)
+            if when.tzinfo is None:
+                zone = user_zone(update.effective_user.id)
+                when = when.replace(tzinfo=zone)
+            scheduled = to_ms(when)
 
+    # take the quota and create the row together: drafts opened side by side all passed the
+    # check in /newpromo, and only one hit per free slot may get through here
+    allowed, retry_after, tier = PROMO_LIMITER.hit(update.effective_user.id)
+    if not allowed:
+        end_session(update.effective_user.id)
+        await update.message.reply_text(limit_text(tier, retry_after))
+        return
     # create promo in DB (status pending) -> user needs to send payment proof next
     promo_id = db_create_promo(
         tg_user_id=update.effective_user.id,
-        content_type=context.user_data.get('promo_content_type') or 'text',
-        media_file_id=context.user_data.get('promo_media'),
-        caption=context.user_data.get('promo_caption') or "",
+        content_type=session.content_type or 'text',
+        media_file_id=session.media_file_id,
+        caption=session.caption or "",
         price=price,
         scheduled_at=scheduled,
     )
-    context.user_data['last_promo_id'] = promo_id
+    # the draft now lives in the promotions row; keep only the id
+    save_session(update.effective_user.id, Session(STATE_PROOF, promo_id=promo_id))
 
+    when_txt = f" Scheduled for {fmt_ts(scheduled, zone)} ({zone or DEFAULT_ZONE})." if scheduled else ""
     await update.message.reply_text(
-        f"Promo saved as ID #{promo_id}. Now please upload payment proof image or send the transaction ID (text). Admin will review when payment proof is received."
+        f"Promo saved as ID #{promo_id}.{when_txt} Now please upload payment proof image or send the transaction ID (text). Admin will review when payment proof is received."
     )
 
-async def payment_proof_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Accept image or text and attach to last_promo_id
-    promo_id = context.user_data.get('last_promo_id')
-    if not promo_id:
-        await update.message.reply_text("No promo in progress. Start with /newpromo.")
-        return
+async def on_proof(update: Update, context: ContextTypes.DEFAULT_TYPE, session):
+    # Accept image or text and attach to the session's promo
+    promo_id = session.promo_id
     proof = None
     if update.message.photo:
         proof = update.message.photo[-1].file_id
@@ -263,149 +889,788 @@ async def payment_proof_handler(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("Couldn't read that. Please send an image or the transaction id as text.")
         return
 
-    db_set_payment_proof(promo_id, proof)
-
-    # notify admins
+    # save proof and queue the admin notifications together
     text = f"New payment proof for promo #{promo_id}. Review with /pending"
-    for aid in ADMIN_IDS:
-        try:
-            await context.bot.send_message(chat_id=aid, text=text)
-        except Exception as e:
-            logger.warning("Could not notify admin %s: %s", aid, e)
+    db_set_payment_proof(promo_id, proof, notify=[outbox.message(aid, text) for aid in ADMIN_IDS])
 
-    context.user_data.pop('creating_promo', None)
+    end_session(update.effective_user.id)
     await update.message.reply_text(f"Payment proof saved. Promo #{promo_id} is pending admin review. We'll notify you when approved.")
 
+STATE_HANDLERS = {
+    STATE_DRAFT: on_draft,
+    STATE_PRICE: on_price,
+    STATE_PROOF: on_proof,
+}
+
+async def route_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # single entry point for non-command messages
+    if not update.message or not update.effective_user:
+        return
+    session = load_session(update.effective_user.id)
+    handler = STATE_HANDLERS.get(session.state) if session else None
+    if handler is None:
+        await unknown(update, context)
+        return
+    await handler(update, context, session)
+
 # Admin handlers
+# Review queue: each page is one media-group album plus one summary message whose inline
+# buttons approve/reject single promos or lazily load the next page.
+def review_keyboard(rows, has_more):
+    buttons = [
+        [InlineKeyboardButton(f"✅ #{row[0]}", callback_data=f"rv|approve|{row[0]}"),
+         InlineKeyboardButton(f"❌ #{row[0]}", callback_data=f"rv|reject|{row[0]}")]
+        for row in rows
+    ]
+    if has_more:
+        buttons.append([InlineKeyboardButton("Next page ▶", callback_data=f"rv|next|{rows[-1][0]}")])
+    return InlineKeyboardMarkup(buttons)
+
+async def send_review_page(bot, chat_id, after_id=None):
+    # reports run in a worker thread, so customers' updates keep flowing meanwhile
+    try:
+        rows = await asyncio.to_thread(db_get_pending_page, after_id, REVIEW_PAGE_SIZE + 1)
+    except reporting.ReportError as e:
+        await bot.send_message(chat_id=chat_id, text=str(e))
+        return
+    has_more = len(rows) > REVIEW_PAGE_SIZE
+    rows = rows[:REVIEW_PAGE_SIZE]
+    if not rows:
+        await bot.send_message(chat_id=chat_id, text="No more pending promotions." if after_id else "No pending promotions.")
+        return
+
+    media = []
+    for pid, uid, ctype, caption, media_file_id, price, created_at in rows:
+        if media_file_id and ctype == 'photo':
+            media.append(InputMediaPhoto(media=media_file_id, caption=f"#{pid}"))
+        elif media_file_id and ctype == 'video':
+            media.append(InputMediaVideo(media=media_file_id, caption=f"#{pid}"))
+    try:
+        if len(media) > 1:
+            await bot.send_media_group(chat_id=chat_id, media=media)
+        elif media:
+            item = media[0]
+            if isinstance(item, InputMediaPhoto):
+                await bot.send_photo(chat_id=chat_id, photo=item.media, caption=item.caption)
+            else:
+                await bot.send_video(chat_id=chat_id, video=item.media, caption=item.caption)
+    except Exception as e:
+        logger.warning("Could not send review album: %s", e)
+
+    lines = []
+    for pid, uid, ctype, caption, media_file_id, price, created_at in rows:
+        caption = caption or ""
+        short = (caption[:200] + '...') if len(caption) > 200 else caption
+        lines.append(f"#{pid} | from {uid} | {ctype} | {price} | {fmt_ts(created_at)}\n{short}")
+    await bot.send_message(chat_id=chat_id, text="\n\n".join(lines), reply_markup=review_keyboard(rows, has_more))
+
 async def cmd_pending(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         await update.message.reply_text("Unauthorized.")
         return
-    pending = db_get_pending()
-    if not pending:
-        await update.message.reply_text("No pending promotions.")
-        return
-    texts = []
-    for row in pending:
-        pid, uid, ctype, caption, media_file_id, price, created_at = row
-        txt = f"ID: {pid}\nFrom: {uid}\nType: {ctype}\nPrice: {price}\nCreated: {created_at}\nCaption: {caption[:300]}"
-        texts.append(txt)
-        # If media exists, send it
-        if media_file_id:
-            try:
-                if ctype == 'photo':
-                    await context.bot.send_photo(chat_id=update.effective_chat.id, photo=media_file_id, caption=txt)
-                elif ctype == 'video':
-                    await context.bot.send_video(chat_id=update.effective_chat.id, video=media_file_id, caption=txt)
-                else:
-                    await context.bot.send_message(chat_id=update.effective_chat.id, text=txt)
-            except Exception:
-                await context.bot.send_message(chat_id=update.effective_chat.id, text=txt)
-        else:
-            await context.bot.send_message(chat_id=update.effective_chat.id, text=txt)
-    await update.message.reply_text("Use /approve <id> or /reject <id> <reason> to manage promos.")
+    await send_review_page(context.bot, update.effective_chat.id)
+
+def approve_promo(promo_id, admin_id):
+    # the user is notified through the outbox; False if the promo wasn't pending
+    return db_review_promo(promo_id, "approved", admin_note=f"Approved by {admin_id}",
+                           notify_text=f"Your promo #{promo_id} has been approved and will be posted soon.")
+
+def reject_promo(promo_id, reason):
+    return db_review_promo(promo_id, "rejected", admin_note=reason,
+                           notify_text=f"Your promo #{promo_id} was rejected. Reason: {reason}")
 
 async def approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         await update.message.reply_text("Unauthorized.")
         return
     args = context.args
-    if not args:
+    if not args or not args[0].isdigit():
         await update.message.reply_text("Usage: /approve <promo_id>")
         return
     promo_id = int(args[0])
-    db_update_status(promo_id, "approved", admin_note=f"Approved by {update.effective_user.id}")
+    if not approve_promo(promo_id, update.effective_user.id):
+        await update.message.reply_text(f"Promo #{promo_id} is not pending.")
+        return
     await update.message.reply_text(f"Promo #{promo_id} approved.")
-    # notify user
-    promo = db_get_promo(promo_id)
-    if promo:
-        tg_user = promo[2]  # tg_user_id (table columns from creation)
-        try:
-            await context.bot.send_message(chat_id=tg_user, text=f"Your promo #{promo_id} has been approved and will be posted soon.")
-        except Exception:
-            pass
 
 async def reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         await update.message.reply_text("Unauthorized.")
         return
     args = context.args
-    if not args:
+    if not args or not args[0].isdigit():
         await update.message.reply_text("Usage: /reject <promo_id> [reason]")
         return
     promo_id = int(args[0])
     reason = " ".join(args[1:]) if len(args) > 1 else "No reason provided."
-    db_update_status(promo_id, "rejected", admin_note=reason)
+    if not reject_promo(promo_id, reason):
+        await update.message.reply_text(f"Promo #{promo_id} is not pending.")
+        return
     await update.message.reply_text(f"Promo #{promo_id} rejected.")
-    promo = db_get_promo(promo_id)
-    if promo:
-        tg_user = promo[2]
+
+async def review_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if update.effective_user.id not in ADMIN_IDS:
+        await query.answer("Unauthorized.")
+        return
+    parts = (query.data or "").split("|")
+    if len(parts) != 3 or parts[0] != "rv" or not parts[2].isdigit():
+        await query.answer("Bad data.")
+        return
+    _, action, pid = parts
+    promo_id = int(pid)
+    if action not in ("next", "approve", "reject"):
+        await query.answer("Unknown action.")
+        return
+
+    if action == "next":
+        # acknowledge concurrently with the page load so the button spinner stops after one round trip
+        ack = asyncio.create_task(query.answer("Loading next page..."))
+        await send_review_page(context.bot, update.effective_chat.id, after_id=promo_id)
+    else:
+        # the conditional update is a single local write; its result decides the toast
+        if action == "approve":
+            done, text = approve_promo(promo_id, update.effective_user.id), f"Promo #{promo_id} approved."
+        else:
+            done, text = reject_promo(promo_id, "Rejected during review."), f"Promo #{promo_id} rejected."
+        ack = asyncio.create_task(query.answer(text if done else f"Promo #{promo_id} was already handled."))
+        # drop the handled promo's buttons from the summary message
+        keep = [row for row in query.message.reply_markup.inline_keyboard
+                if not any(b.callback_data in (f"rv|approve|{promo_id}", f"rv|reject|{promo_id}") for b in row)]
         try:
-            await context.bot.send_message(chat_id=tg_user, text=f"Your promo #{promo_id} was rejected. Reason: {reason}")
-        except Exception:
-            pass
+            await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(keep))
+        except Exception as e:
+            logger.warning("Could not update review keyboard: %s", e)
+    try:
+        await ack
+    except Exception as e:
+        logger.warning("Could not answer callback: %s", e)
 
-async def my_promos(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    tg_user = update.effective_user.id
-    rows = db_user_promos(tg_user)
+def split_messages(entries, sep="\n\n", limit=MAX_MESSAGE_LEN):
+    # pack entries into as few messages as possible without crossing Telegram's size limit
+    chunks, current = [], ""
+    for entry in entries:
+        entry = entry[:limit]
+        if current and len(current) + len(sep) + len(entry) > limit:
+            chunks.append(current)
+            current = entry
+        else:
+            current = current + sep + entry if current else entry
+    if current:
+        chunks.append(current)
+    return chunks
+
+def user_promos_page(tg_user_id, before_id=None, archived=False):
+    # returns (rows, has_more); the first live page is served from HISTORY_CACHE when possible
+    cacheable = before_id is None and not archived
+    if cacheable:
+        cached = HISTORY_CACHE.get(tg_user_id)
+        if cached is not None:
+            return cached
+    rows = db_user_promos_page(tg_user_id, before_id, HISTORY_PAGE_SIZE + 1, archived)
+    page = (rows[:HISTORY_PAGE_SIZE], len(rows) > HISTORY_PAGE_SIZE)
+    if cacheable:
+        HISTORY_CACHE.put(tg_user_id, page)
+    return page
+
+async def send_promos_page(bot, chat_id, tg_user_id, before_id=None, archived=False):
+    rows, has_more = user_promos_page(tg_user_id, before_id, archived)
+    # once the live promos run out, older ones can still be pulled from the archive
+    archive_markup = None
+    if not has_more and not archived and archive.has_archive(DB_PATH, "promotions"):
+        last_id = rows[-1][0] if rows else before_id
+        archive_markup = InlineKeyboardMarkup([[InlineKeyboardButton("Archived promotions ▶", callback_data=f"mpa|{last_id or ''}")]])
     if not rows:
-        await update.message.reply_text("You have no promotions.")
+        await bot.send_message(chat_id=chat_id, text="No older promotions." if before_id else ("No recent promotions." if archive_markup else "You have no promotions."),
+                               reply_markup=archive_markup)
         return
+    zone = user_zone(tg_user_id)
     msgs = []
     for r in rows:
         pid, ctype, caption, status, created_at = r
-        msgs.append(f"#{pid} | {ctype} | {status} | {created_at}\n{(caption[:120] + '...') if caption and len(caption) > 120 else caption}")
-    await update.message.reply_text("\n\n".join(msgs))
+        msgs.append(f"#{pid} | {ctype} | {status} | {fmt_ts(created_at, zone)}\n{(caption[:120] + '...') if caption and len(caption) > 120 else caption}")
+    chunks = split_messages(msgs)
+    for chunk in chunks[:-1]:
+        await bot.send_message(chat_id=chat_id, text=chunk)
+    markup = archive_markup
+    if has_more:
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton("Older ▶", callback_data=f"{'mpa' if archived else 'mp'}|{rows[-1][0]}")]])
+    await bot.send_message(chat_id=chat_id, text=chunks[-1], reply_markup=markup)
+
+@flood_guard(FLOOD_LIMITER, user_key, on_flood)
+async def my_promos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await send_promos_page(context.bot, update.effective_chat.id, update.effective_user.id)
+
+async def my_promos_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # mp|<before_id> pages live promos, mpa|[before_id] live and archived together
+    prefix, _, rest = query.data.partition("|")
+    try:
+        before_id = int(rest) if rest else None
+    except ValueError:
+        await query.answer("Bad data.")
+        return
+    await query.answer()
+    await send_promos_page(context.bot, update.effective_chat.id, update.effective_user.id, before_id, archived=prefix == "mpa")
+
+# /find queries by short token, so "More" buttons fit in callback data; they live in the
+# shared state store, so any instance can serve the next page
+FIND_TTL = 24 * 3600
+
+async def send_find_page(bot, chat_id, token, offset=0, archived=False):
+    match = SHARED_STATE.get(f"find:{token}")
+    if match is None:
+        await bot.send_message(chat_id=chat_id, text="This search has expired. Run /find again.")
+        return
+    search_fn = db_search_archived_promos if archived else db_search_promos
+    try:
+        rows = await asyncio.to_thread(search_fn, match, HISTORY_PAGE_SIZE + 1, offset)
+    except reporting.ReportError as e:
+        await bot.send_message(chat_id=chat_id, text=str(e))
+        return
+    has_more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    # live results first; the archive is searched only when asked for
+    archive_markup = None
+    if not has_more and not archived and archive.has_archive(DB_PATH, "promotions"):
+        archive_markup = InlineKeyboardMarkup([[InlineKeyboardButton("Search archive ▶", callback_data=f"fd|{token}|0|a")]])
+    if not rows:
+        await bot.send_message(chat_id=chat_id, text="No more matches." if offset else "No matching promotions.",
+                               reply_markup=archive_markup)
+        return
+    msgs = []
+    for pid, tg_user_id, ctype, caption, status, created_at in rows:
+        msgs.append(f"#{pid} | user {tg_user_id} | {ctype} | {status} | {fmt_ts(created_at)}\n{(caption[:120] + '...') if caption and len(caption) > 120 else caption}")
+    chunks = split_messages(msgs)
+    for chunk in chunks[:-1]:
+        await bot.send_message(chat_id=chat_id, text=chunk)
+    markup = archive_markup
+    if has_more:
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton("More ▶", callback_data=f"fd|{token}|{offset + HISTORY_PAGE_SIZE}{'|a' if archived else ''}")]])
+    await bot.send_message(chat_id=chat_id, text=chunks[-1], reply_markup=markup)
+
+async def find_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    # /find <words> - searches promotion captions, best match first
+    match = search.match_expression(" ".join(context.args))
+    if not match:
+        await update.message.reply_text("Usage: /find <words from the caption>")
+        return
+    token = uuid4().hex[:8]
+    SHARED_STATE.set(f"find:{token}", match, ttl=FIND_TTL)
+    await send_find_page(context.bot, update.effective_chat.id, token)
+
+async def find_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if update.effective_user.id not in ADMIN_IDS:
+        await query.answer("Unauthorized.")
+        return
+    # fd|<token>|<offset>[|a]
+    parts = query.data.split("|")
+    try:
+        token, offset = parts[1], int(parts[2])
+    except (IndexError, ValueError):
+        await query.answer("Bad data.")
+        return
+    await query.answer()
+    await send_find_page(context.bot, update.effective_chat.id, token, offset, archived=parts[3:] == ["a"])
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         await update.message.reply_text("Unauthorized.")
         return
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("SELECT status, COUNT(*) FROM promotions GROUP BY status")
-        rows = c.fetchall()
-    txt = "\n".join(f"{s}: {n}" for s, n in rows)
-    await update.message.reply_text(f"Promotion stats:\n{txt}")
+    # /stats [YYYY-MM-DD [YYYY-MM-DD]] [daily]
+    args = list(context.args)
+    daily = bool(args) and args[-1] == "daily"
+    if daily:
+        args.pop()
+    try:
+        since = datetime.strptime(args[0], "%Y-%m-%d").date().isoformat() if args else None
+        until = datetime.strptime(args[1], "%Y-%m-%d").date().isoformat() if len(args) > 1 else None
+    except ValueError:
+        await update.message.reply_text("Usage: /stats [from YYYY-MM-DD] [to YYYY-MM-DD] [daily]")
+        return
+    try:
+        rows = await asyncio.to_thread(db_status_counts, since, until, daily)
+    except reporting.ReportError as e:
+        await update.message.reply_text(str(e))
+        return
+    if daily:
+        txt = "\n".join(f"{day} {s}: {n}" for day, s, n in rows)
+    else:
+        txt = "\n".join(f"{s}: {n}" for s, n in rows)
+    header = "Promotion stats" + (f" {since or '…'} → {until or '…'}" if since or until else "")
+    if len(txt) > 3900:
+        txt = txt[:3900] + "\n… (narrow the date range)"
+    await update.message.reply_text(f"{header}:\n{txt}")
+
+async def send_promo(bot, chat_id, ctype, caption, media_file_id):
+    if ctype == 'photo' and media_file_id:
+        return await bot.send_photo(chat_id=chat_id, photo=media_file_id, caption=caption)
+    if ctype == 'video' and media_file_id:
+        return await bot.send_video(chat_id=chat_id, video=media_file_id, caption=caption)
+    return await bot.send_message(chat_id=chat_id, text=caption)
+
+# Scheduler to post approved promotions when due.
+# Every (promo, channel) pair is tracked in promotion_deliveries, so after a crash only the
+# missing deliveries are sent and failed channels are retried with exponential backoff.
+# A channel that is still failing after DELIVERY_MAX_ATTEMPTS is reported to the admins and the
+# promo parks as 'partially_posted' (or 'post_failed' if nothing went out) until /repost.
+async def publish_promo(app, promo):
+    promo_id, tg_user_id, ctype, caption, media_file_id = promo
+    db_ensure_deliveries(promo_id, CHANNEL_IDS)
+    for ch, attempts in db_due_deliveries(promo_id):
+        try:
+            msg = await send_promo(app.bot, ch, ctype, caption, media_file_id)
+        except Exception as e:
+            logger.warning("Failed to post promo %s to channel %s (attempt %s): %s", promo_id, ch, attempts + 1, e)
+            db_delivery_failed(promo_id, ch, attempts, e)
+            continue
+        db_delivery_sent(promo_id, ch, msg.message_id)
+    if db_open_deliveries(promo_id):
+        return  # retried on a later tick
+    failed = db_failed_deliveries(promo_id)
+    if failed:
+        status = "partially_posted" if db_sent_deliveries(promo_id) else "post_failed"
+        logger.error("Promo %s could not be posted to channel(s) %s", promo_id, [ch for ch, _ in failed])
+        text = (f"Promo #{promo_id} could not be posted to {len(failed)} channel(s) after {DELIVERY_MAX_ATTEMPTS} attempts:\n"
+                + "\n".join(f"{ch}: {err}" for ch, err in failed)
+                + f"\nRetry with /repost {promo_id}")
+        db_mark_unpublished(promo_id, status, [outbox.message(aid, text[:MAX_MESSAGE_LEN]) for aid in ADMIN_IDS])
+        return
+    db_mark_posted(promo_id, notify_text=f"Your promo #{promo_id} has been posted.")
 
-# Scheduler to post approved promotions when due
 async def posting_loop(app):
     while True:
         try:
-            due = db_get_due_promos()
+            due = db_get_due_promos() if is_leader() else []
             for promo in due:
-                promo_id, tg_user_id, ctype, caption, media_file_id = promo
-                # post to configured channels
-                for ch in CHANNEL_IDS:
-                    try:
-                        if ctype == 'photo' and media_file_id:
-                            await app.bot.send_photo(chat_id=ch, photo=media_file_id, caption=caption)
-                        elif ctype == 'video' and media_file_id:
-                            await app.bot.send_video(chat_id=ch, video=media_file_id, caption=caption)
-                        else:
-                            await app.bot.send_message(chat_id=ch, text=caption)
-                    except Exception as e:
-                        logger.exception("Failed to post promo %s to channel %s: %s", promo_id, ch, e)
-                db_mark_posted(promo_id)
-                # notify user
-                try:
-                    await app.bot.send_message(chat_id=tg_user_id, text=f"Your promo #{promo_id} has been posted.")
-                except Exception:
-                    pass
+                if not is_leader():
+                    break  # lost the lease mid-run; the new leader picks up the rest
+                await publish_promo(app, promo)
         except Exception as e:
             logger.exception("Error in posting loop: %s", e)
         await asyncio.sleep(POST_CHECK_INTERVAL)
 
+# Admin: edit or delete an already published promo in every channel it was posted to
+async def edit_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    args = context.args
+    if len(args) < 2 or not args[0].isdigit():
+        await update.message.reply_text("Usage: /editpost <promo_id> <new text>")
+        return
+    promo_id = int(args[0])
+    new_text = update.message.text.split(None, 2)[2]
+    promo = db_get_promo(promo_id)
+    if not promo:
+        await update.message.reply_text("Promo not found.")
+        return
+    if not db_update_caption(promo_id, new_text):
+        await update.message.reply_text(f"Promo #{promo_id} is archived and can no longer be edited.")
+        return
+    ctype = promo[3]
+    ok = failed = 0
+    for ch, message_id in db_sent_deliveries(promo_id):
+        try:
+            if ctype in ('photo', 'video') and promo[4]:
+                await context.bot.edit_message_caption(chat_id=ch, message_id=message_id, caption=new_text)
+            else:
+                await context.bot.edit_message_text(chat_id=ch, message_id=message_id, text=new_text)
+            ok += 1
+        except Exception as e:
+            logger.warning("Failed to edit promo %s in channel %s: %s", promo_id, ch, e)
+            failed += 1
+    await update.message.reply_text(f"Promo #{promo_id} edited in {ok} channel(s), {failed} failed.")
+
+async def delete_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    args = context.args
+    if not args or not args[0].isdigit():
+        await update.message.reply_text("Usage: /deletepost <promo_id>")
+        return
+    promo_id = int(args[0])
+    ok = failed = 0
+    for ch, message_id in db_sent_deliveries(promo_id):
+        try:
+            await context.bot.delete_message(chat_id=ch, message_id=message_id)
+            db_set_delivery_status(promo_id, ch, 'deleted')
+            ok += 1
+        except Exception as e:
+            logger.warning("Failed to delete promo %s in channel %s: %s", promo_id, ch, e)
+            failed += 1
+    await update.message.reply_text(f"Promo #{promo_id} deleted from {ok} channel(s), {failed} failed.")
+
+async def repost(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    args = context.args
+    if not args or not args[0].isdigit():
+        await update.message.reply_text("Usage: /repost <promo_id>")
+        return
+    promo_id = int(args[0])
+    n = db_retry_deliveries(promo_id)
+    if not n:
+        await update.message.reply_text(f"Promo #{promo_id} has no failed channels.")
+        return
+    await update.message.reply_text(f"Retrying promo #{promo_id} in {n} channel(s).")
+
+# ---------- Outbox worker ----------
+OUTBOX_WAKE = asyncio.Event()
+
+async def deliver_outbox_row(bot, row):
+    if row["photo_file_id"]:
+        try:
+            await bot.send_photo(chat_id=row["chat_id"], photo=row["photo_file_id"], caption=row["text"])
+            return
+        except (BadRequest, Forbidden):
+            raise
+        except Exception as e:
+            logger.warning("Photo to %s failed, sending text only: %s", row["chat_id"], e)
+    await bot.send_message(chat_id=row["chat_id"], text=row["text"])
+
+async def drain_outbox(bot):
+    # under load, admin notices wait up to DEGRADED_DIGEST_WINDOW; customers' go out first
+    if PIPELINE.degraded():
+        rows = outbox.fetch_due(DB_PATH, OUTBOX_BATCH_SIZE, ADMIN_IDS, outbox.now_ms() - DEGRADED_DIGEST_WINDOW * 1000)
+        PIPELINE.note("admin_notices_deferred")
+    else:
+        rows = outbox.fetch_due(DB_PATH, OUTBOX_BATCH_SIZE)
+    sent = []
+    for row in rows:
+        try:
+            await deliver_outbox_row(bot, row)
+            sent.append(row["id"])
+        except Exception as e:
+            # blocked by the user / chat not found: retrying won't help
+            permanent = isinstance(e, (BadRequest, Forbidden))
+            if outbox.mark_failed(DB_PATH, row, e, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE, permanent):
+                logger.error("Outbox message %s to %s dead-lettered: %s", row["id"], row["chat_id"], e)
+    outbox.mark_sent(DB_PATH, sent)
+    return len(rows)
+
+async def outbox_loop(app):
+    while True:
+        OUTBOX_WAKE.clear()
+        try:
+            # a full batch means there is more backlog: go again without waiting
+            if is_leader() and await drain_outbox(app.bot) >= OUTBOX_BATCH_SIZE:
+                continue
+        except Exception as e:
+            logger.exception("Error in outbox loop: %s", e)
+        try:
+            await asyncio.wait_for(OUTBOX_WAKE.wait(), OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+async def export_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    # /export [from YYYY-MM-DD] [to YYYY-MM-DD] [status] [csv|jsonl]
+    try:
+        opts = export.parse_command_args(context.args, "promotions")
+    except ValueError as e:
+        await update.message.reply_text(f"{e}.\nUsage: /export [from YYYY-MM-DD] [to YYYY-MM-DD] [status] [csv|jsonl]")
+        return
+    await update.message.reply_text("Preparing export…")
+    out_dir = tempfile.mkdtemp(prefix="promo_export_")
+    try:
+        # the export reads and compresses synchronously; keep it off the event loop
+        paths, count = await asyncio.to_thread(export.export_table, DB_PATH, "promotions", out_dir, tz=DEFAULT_ZONE, **opts)
+        for n, path in enumerate(paths, 1):
+            part = f" (part {n}/{len(paths)})" if len(paths) > 1 else ""
+            with open(path, "rb") as f:
+                await context.bot.send_document(chat_id=update.effective_chat.id, document=f,
+                                                filename=os.path.basename(path), caption=f"{count} promotion(s){part}")
+    except Exception as e:
+        logger.exception("Export failed: %s", e)
+        await update.message.reply_text(f"Export failed: {e}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+async def outbox_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    # /outbox [retry] - backlog by status; 'retry' re-queues dead-lettered messages
+    if context.args[:1] == ["retry"]:
+        n = outbox.retry_dead(DB_PATH)
+        OUTBOX_WAKE.set()
+        await update.message.reply_text(f"Re-queued {n} dead message(s).")
+        return
+    counts = outbox.counts(DB_PATH)
+    await update.message.reply_text(f"Outbox: {counts.get('pending', 0)} pending, {counts.get('dead', 0)} dead.")
+
 # fallback message handler
 async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Sorry, I didn't understand that. Use /help.")
 
+# ---------- Clustering ----------
+# In CLUSTER_MODE every instance handles updates, but only the holder of the leader lease
+# long-polls and runs the posting, outbox, archive and backup loops. See cluster.py.
+SHARED_STATE = cluster.open_store(STATE_STORE)
+LEASE = cluster.Lease(DB_PATH, "promo-leader", LEASE_TTL) if CLUSTER_MODE else None
+STATE_PURGE_INTERVAL = 600  # seconds between sweeps of expired shared state
+
+def is_leader():
+    return LEASE is None or LEASE.held()
+
+async def leadership_loop(app):
+    leading = False
+    while True:
+        try:
+            held = await asyncio.to_thread(LEASE.acquire)
+        except sqlite3.Error as e:
+            logger.warning("Lease renewal failed: %s", e)
+            held = LEASE.held()
+        try:
+            if held and not leading:
+                logger.info("Instance %s is now the leader", LEASE.holder)
+                if not WEBHOOK_URL:
+                    await start_polling(app)
+            elif leading and not held:
+                logger.warning("Instance %s lost the leader lease", LEASE.holder)
+                POLL_STOP.set()
+            leading = held
+        except Exception as e:
+            logger.exception("Leadership change failed, retrying: %s", e)
+        await asyncio.sleep(LEASE_TTL / 3)
+
+# ---------- Load shedding ----------
+# Every update passes load_guard (handler group -1) first and load_done (group 99) last, in
+# polling and webhook mode alike. Under load /start, /help and history browsing are shed
+# first; payment proofs, promo content and anything from an admin never are. See loadshed.py.
+PIPELINE = loadshed.Pipeline(LOAD_DEGRADE_AT, LOAD_SHED_AT, LOAD_DEGRADE_LAG, LOAD_SHED_LAG)
+TICKETS = {}  # update_id -> ticket, between load_guard and load_done
+LOW_CALLBACKS = ("mp|", "mpa|")
+LOW_COMMANDS = ("/start", "/help", "/my_promos")
+BUSY_TEXT = "We're very busy right now. Please try again in a minute."
+
+def command_of(text):
+    # "/start@PromoBot payload" -> "/start"
+    words = (text or "").split(maxsplit=1)
+    return words[0].split("@")[0] if words else ""
+
+def update_priority(update):
+    user = update.effective_user
+    if user is not None and user.id in ADMIN_IDS:
+        return loadshed.CRITICAL
+    if update.callback_query is not None:
+        return loadshed.LOW if (update.callback_query.data or "").startswith(LOW_CALLBACKS) else loadshed.NORMAL
+    m = update.message
+    if m is None:
+        return loadshed.NORMAL
+    if m.effective_attachment:
+        return loadshed.CRITICAL  # payment proof or promo content
+    return loadshed.LOW if command_of(m.text) in LOW_COMMANDS else loadshed.NORMAL
+
+async def load_guard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    m = update.message
+    # waiting behind this one: polled (UPDATE_QUEUE) or received by the webhook (PTB's queue)
+    backlog = context.application.update_queue.qsize() + UPDATE_QUEUE.qsize()
+    ticket = PIPELINE.admit(update_priority(update), m.date.timestamp() if m else None, backlog)
+    if ticket is None:
+        if update.callback_query is not None:
+            await update.callback_query.answer(BUSY_TEXT)
+        raise ApplicationHandlerStop
+    TICKETS[update.update_id] = ticket
+
+async def load_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    ticket = TICKETS.pop(update.update_id, None)
+    if ticket:
+        PIPELINE.done(ticket)
+
+async def load_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    await update.message.reply_text(loadshed.format_stats(PIPELINE.stats()))
+
+# ---------- Traffic capture ----------
+# Opt-in: every incoming update, before load shedding, is recorded for replay.py. See capture.py.
+if CAPTURE_DIR and not CAPTURE_SECRET:
+    logger.warning("CAPTURE_SECRET is not set: pseudonyms will change on every restart")
+CAPTURE = capture.Capture(CAPTURE_DIR, CAPTURE_SECRET or os.urandom(32), ADMIN_IDS, CAPTURE_ROTATE_MB * 1024 * 1024,
+                          CAPTURE_ROTATE_SECS, prefix="promo") if CAPTURE_DIR else None
+
+async def capture_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    CAPTURE.record(update.to_dict())
+
+# ---------- Memory audit ----------
+# Everything below grows with the number of users; /memstats shows what each one holds. build_app
+# adds PTB's own per-user and per-chat dicts. See memaudit.py.
+MEMORY = memaudit.MemoryAudit()
+MEMORY.register("sessions", lambda: SESSIONS)
+if isinstance(SHARED_STATE, cluster.MemoryStore):
+    MEMORY.register("shared state", lambda: SHARED_STATE.data)
+MEMORY.register("history cache", lambda: HISTORY_CACHE.data)
+MEMORY.register("flood limiter", lambda: FLOOD_LIMITER.windows, lambda ws: sum(len(w.hits) for w in ws))
+MEMORY.register("promo limiter", lambda: PROMO_LIMITER.windows, lambda ws: sum(len(w.hits) for w in ws))
+MEMORY.register("load tickets", lambda: TICKETS)
+if MEMTRACE:
+    MEMORY.start_tracing()
+
+async def memstats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    # /memstats [trace on | trace off | snapshot]
+    args = [a.lower() for a in context.args]
+    if args == ["trace", "on"]:
+        MEMORY.start_tracing()
+        await update.message.reply_text("tracemalloc on. Use /memstats snapshot now and again later to see what grows.")
+    elif args == ["trace", "off"]:
+        MEMORY.stop_tracing()
+        await update.message.reply_text("tracemalloc off.")
+    else:
+        # walking the structures takes a moment on a big bot, so not on the event loop
+        text = await asyncio.to_thread(MEMORY.snapshot if args == ["snapshot"] else MEMORY.report)
+        await update.message.reply_text(text[:3900])
+
+# ---------- Profiling ----------
+# Every handler is timed and PROFILE_SAMPLE_RATE of calls are profiled (build_app wraps them), and
+# event loop stalls are traced to the code that caused them; see profiling.py.
+PROFILER = profiling.Profiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_TOP_N)
+
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("Unauthorized.")
+        return
+    # /profile [on [rate] | off | dump | reset]
+    args = context.args
+    action = args[0].lower() if args else ""
+    if action == "on":
+        try:
+            rate = float(args[1]) if len(args) > 1 else PROFILE_SAMPLE_RATE or 0.05
+        except ValueError:
+            await update.message.reply_text("Usage: /profile on [fraction of calls, e.g. 0.05]")
+            return
+        PROFILER.sample_rate = min(max(rate, 0.0), 1.0)
+        await update.message.reply_text(f"Profiling {PROFILER.sample_rate:.1%} of handler calls.")
+    elif action == "off":
+        PROFILER.sample_rate = 0.0
+        await update.message.reply_text("Profiling off; calls are still timed.")
+    elif action == "reset":
+        PROFILER.reset()
+        await update.message.reply_text("Profile cleared.")
+    elif action == "dump":
+        path = await asyncio.to_thread(PROFILER.dump)
+        await update.message.reply_text(f"{PROFILER.report()[:3800]}\n\nWritten to {path}")
+    else:
+        await update.message.reply_text(PROFILER.report()[:3900])
+
+# ---------- Update ingestion ----------
+# Our own getUpdates loop instead of updater.start_polling(): only the update types we handle
+# are requested, and updates are stashed on disk before Telegram is told we have them. Polling
+# carries on while handle_updates works through UPDATE_QUEUE in order, so the queue is the real
+# backlog load_guard sees. The checkpoint only moves past updates whose handlers have finished,
+# and a restart resumes from it. Delivery is at-least-once: nothing is lost, but updates handled
+# since the last checkpoint (at most about CHECKPOINT_INTERVAL's worth) are handled again after
+# a crash. See ingest.py.
+OFFSETS = ingest.OffsetStore(DB_PATH, "promo")
+POLL_STOP = asyncio.Event()
+UPDATE_QUEUE = asyncio.Queue()  # (update, stale) fetched but not handled yet, oldest first
+HANDLED = 0  # newest update_id whose handlers have finished
+CHECKPOINT_INTERVAL = 1  # getUpdates wait while updates are queued, so the checkpoint keeps up
+
+def is_stale_update(update):
+    # after a long outage old texts and commands are skipped; media and button taps never are
+    m = update.message
+    if m is None or m.text is None:
+        return False
+    return ingest.is_stale(m.date.timestamp(), DROP_UPDATES_OLDER_THAN)
+
+async def handle_updates(app):
+    # one at a time and in order, as PTB's own update loop does; runs for the life of the app
+    global HANDLED
+    while True:
+        update, stale = await UPDATE_QUEUE.get()
+        try:
+            if not stale:
+                await app.process_update(update)  # errors go to the application's error handlers
+        except Exception as e:
+            logger.exception("Error handling update %s: %s", update.update_id, e)
+        finally:
+            HANDLED = update.update_id
+            UPDATE_QUEUE.task_done()
+
+async def poll_updates(app):
+    # runs until POLL_STOP is set (lost leadership); pauses once UPDATE_QUEUE_MAX updates are queued
+    last = await asyncio.to_thread(OFFSETS.load)  # everything up to here is handled
+    seen = last  # newest update put on UPDATE_QUEUE
+
+    def enqueue(raw):
+        nonlocal seen
+        stale = 0
+        for update in (Update.de_json(u, app.bot) for u in raw):
+            dropped = is_stale_update(update)
+            stale += dropped
+            UPDATE_QUEUE.put_nowait((update, dropped))
+            seen = update.update_id
+        if stale:
+            logger.info("Dropped %s stale update(s)", stale)
+
+    async def checkpoint():
+        nonlocal last
+        if last < HANDLED <= seen:
+            last = HANDLED
+            await asyncio.to_thread(OFFSETS.save, last)
+
+    logger.info("Polling from update %s", last + 1 if last else "(first run)")
+    try:
+        enqueue(await asyncio.to_thread(OFFSETS.pending))  # fetched before a restart but never handled
+        while not POLL_STOP.is_set():
+            await checkpoint()
+            if UPDATE_QUEUE.qsize() >= UPDATE_QUEUE_MAX:
+                # backpressure: leave the rest with Telegram until the handlers catch up
+                await asyncio.sleep(CHECKPOINT_INTERVAL)
+                continue
+            try:
+                updates = await app.bot.get_updates(offset=seen + 1 if seen else None,
+                                                    timeout=CHECKPOINT_INTERVAL if seen > last else LONG_POLL_TIMEOUT,
+                                                    allowed_updates=ingest.ALLOWED_UPDATES)
+            except Exception as e:
+                logger.warning("getUpdates failed: %s", e)
+                await asyncio.sleep(3)
+                continue
+            raw = [u.to_dict() for u in updates if u.update_id > seen]
+            if not raw:
+                continue
+            # on disk before the next getUpdates confirms them to Telegram
+            await asyncio.to_thread(OFFSETS.stash, raw)
+            enqueue(raw)
+    finally:
+        # on lost leadership, what was fetched still gets handled and checkpointed
+        await UPDATE_QUEUE.join()
+        await checkpoint()
+
+async def start_polling(app):
+    POLL_STOP.clear()
+    await app.bot.delete_webhook()  # Telegram refuses getUpdates while a webhook is set
+    asyncio.get_running_loop().create_task(poll_updates(app))
+
 # ---------- Main ----------
-def main():
-    if not BOT_TOKEN:
-        raise RuntimeError("BOT_TOKEN environment variable required.")
-    init_db()
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+def build_app(request=None):
+    # request: a telegram.request.BaseRequest to use instead of HTTP (replay.py passes a stub)
+    builder = ApplicationBuilder().token(BOT_TOKEN)
+    if request is not None:
+        builder = builder.request(request)
+    app = builder.build()
+    MEMORY.register("ptb user_data", lambda: app.user_data)
+    MEMORY.register("ptb chat_data", lambda: app.chat_data)
+
+    if CAPTURE:
+        app.add_handler(TypeHandler(Update, capture_update), group=-2)
+    # load shedding wraps every other handler
+    app.add_handler(TypeHandler(Update, load_guard), group=-1)
+    app.add_handler(TypeHandler(Update, load_done), group=99)
 
     # Commands
     app.add_handler(CommandHandler("start", start))
@@ -413,32 +1678,75 @@ def main():
     app.add_handler(CommandHandler("newpromo", newpromo))
     app.add_handler(CommandHandler("cancel", cancel))
     app.add_handler(CommandHandler("my_promos", my_promos))
+    app.add_handler(CommandHandler("timezone", timezone_cmd))
     app.add_handler(CommandHandler("pending", cmd_pending))
     app.add_handler(CommandHandler("approve", approve))
     app.add_handler(CommandHandler("reject", reject))
     app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("editpost", edit_post))
+    app.add_handler(CommandHandler("deletepost", delete_post))
+    app.add_handler(CommandHandler("repost", repost))
+    app.add_handler(CommandHandler("outbox", outbox_cmd))
+    app.add_handler(CommandHandler("export", export_cmd))
+    app.add_handler(CommandHandler("find", find_cmd))
+    app.add_handler(CommandHandler("backup", backup_cmd))
+    app.add_handler(CommandHandler("load", load_cmd))
+    app.add_handler(CommandHandler("profile", profile_cmd))
+    app.add_handler(CommandHandler("memstats", memstats_cmd))
+    app.add_handler(CallbackQueryHandler(review_callback, pattern=r"^rv\|"))
+    app.add_handler(CallbackQueryHandler(my_promos_callback, pattern=r"^mpa?\|"))
+    app.add_handler(CallbackQueryHandler(find_callback, pattern=r"^fd\|"))
 
-    # Message handlers
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_media_or_text))
-    app.add_handler(MessageHandler(filters.PHOTO | filters.VIDEO | filters.DOCUMENT, handle_media_or_text))
-    # price/schedule detection: if user sends text that looks like price or has '|' we treat as price
-    app.add_handler(MessageHandler(filters.Regex(r".*\|.*") | filters.Regex(r"^\d+(\.\d+)?$"), price_and_schedule))
-    # payment proof (photo or text) - catch all after a promo id exists in session
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), payment_proof_handler))
-    app.add_handler(MessageHandler(filters.PHOTO | filters.DOCUMENT, payment_proof_handler))
+    # Message handlers: one router, dispatching on the user's conversation state
+    app.add_handler(MessageHandler(~filters.COMMAND, route_message))
 
     # fallback
     app.add_handler(MessageHandler(filters.ALL, unknown))
 
+    for group in app.handlers.values():
+        for handler in group:
+            handler.callback = PROFILER.wrap(handler.callback)
+    return app
+
+def main():
+    if not BOT_TOKEN:
+        raise RuntimeError("BOT_TOKEN environment variable required.")
+    init_db()
+    warm_rate_limiters()
+    app = build_app()
+
     # Start posting loop
     async def run():
         # run scheduler concurrently
         loop = asyncio.get_running_loop()
         loop.create_task(posting_loop(app))
+        loop.create_task(handle_updates(app))
+        loop.create_task(session_sweeper(app))
+        loop.create_task(outbox_loop(app))
+        if ARCHIVE_AFTER_DAYS > 0:
+            loop.create_task(archive_loop(app))
+        if BACKUP_INTERVAL > 0:
+            loop.create_task(backup_loop(app))
+        if LOOP_BLOCK_MS > 0:
+            loop.create_task(PROFILER.watch_loop(LOOP_BLOCK_MS / 1000))
+        profiling.dump_on_signal(PROFILER, loop)
         await app.initialize()
         await app.start()
-        await app.updater.start_polling()
-        await app.wait_closed()
+        if WEBHOOK_URL:
+            # every instance serves the webhook, so a load balancer can spread updates across them
+            await app.updater.start_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT,
+                                            url_path=urlparse(WEBHOOK_URL).path.lstrip("/"),
+                                            webhook_url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET,
+                                            allowed_updates=ingest.ALLOWED_UPDATES)
+        if CLUSTER_MODE:
+            loop.create_task(leadership_loop(app))
+        elif not WEBHOOK_URL:
+            await start_polling(app)
+        try:
+            await app.wait_closed()
+        finally:
+            if LEASE:
+                await asyncio.to_thread(LEASE.release)  # hand over straight away instead of after LEASE_TTL
 
     logger.info("Starting bot...")
     import asyncio
@@ -0,0 +1,125 @@
+# ratelimit.py
+# In-memory sliding-window rate limiting shared by both bots.
+#
+# Each tier keeps, per key, a ring buffer of the last `limit` hit timestamps. A new hit is
+# allowed when the buffer is not full or its oldest entry has left the window, so a check is
+# O(1) and never touches the database. Limiters are warmed from the DB once at startup.
+import asyncio
+import functools
+import threading
+import time
+from collections import deque, namedtuple
+
+# scope: "user" -> one window per key, "global" -> a single window shared by everyone
+Tier = namedtuple("Tier", "name limit window scope")
+Tier.__new__.__defaults__ = ("user",)
+
+GLOBAL_KEY = "*"
+PRUNE_EVERY = 1000  # records between sweeps of idle keys
+
+
+class SlidingWindow:
+    __slots__ = ("limit", "window", "hits")
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.hits = {}  # key -> deque(maxlen=limit) of epoch seconds
+
+    def retry_after(self, key, now):
+        q = self.hits.get(key)
+        if q is None or len(q) < self.limit:
+            return 0
+        wait = q[0] + self.window - now
+        return wait if wait > 0 else 0
+
+    def record(self, key, now):
+        q = self.hits.get(key)
+        if q is None:
+            q = self.hits[key] = deque(maxlen=self.limit)
+        q.append(now)
+
+    def prune(self, now):
+        # drop keys whose newest hit is outside the window; they can't limit anything anymore
+        cutoff = now - self.window
+        for key in [k for k, q in self.hits.items() if not q or q[-1] <= cutoff]:
+            del self.hits[key]
+
+
+class RateLimiter:
+    def __init__(self, tiers):
+        self.tiers = [t for t in tiers if t.limit > 0]
+        self.windows = [SlidingWindow(t.limit, t.window) for t in self.tiers]
+        self.lock = threading.Lock()
+        self.records = 0
+
+    def _key(self, tier, key):
+        return GLOBAL_KEY if tier.scope == "global" else key
+
+    def check(self, key, now=None):
+        # returns (allowed, retry_after_seconds, tier_name)
+        now = time.time() if now is None else now
+        with self.lock:
+            return self._check(key, now)
+
+    def record(self, key, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self._record(key, now)
+
+    def hit(self, key, now=None):
+        # check and record in one step under one lock, so concurrent hits for the same key
+        # can't both pass; a rejected hit is not recorded
+        now = time.time() if now is None else now
+        with self.lock:
+            allowed, wait, tier = self._check(key, now)
+            if allowed:
+                self._record(key, now)
+        return allowed, wait, tier
+
+    def _check(self, key, now):
+        for tier, win in zip(self.tiers, self.windows):
+            wait = win.retry_after(self._key(tier, key), now)
+            if wait:
+                return False, wait, tier.name
+        return True, 0, None
+
+    def _record(self, key, now):
+        for tier, win in zip(self.tiers, self.windows):
+            win.record(self._key(tier, key), now)
+        self.records += 1
+        if self.records % PRUNE_EVERY == 0:
+            for win in self.windows:
+                win.prune(now)
+
+    def warm(self, rows):
+        # rows: iterable of (key, epoch_seconds) in ascending time order, e.g. from the DB
+        with self.lock:
+            for key, ts in rows:
+                for tier, win in zip(self.tiers, self.windows):
+                    win.record(self._key(tier, key), ts)
+
+
+def flood_guard(limiter, key_func, on_limited=None):
+    # Decorator for bot handlers (sync or async). Calls on_limited(*args, retry_after) instead
+    # of the handler when the key returned by key_func(*args) is over the limit.
+    def deco(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                allowed, wait, _tier = limiter.hit(key_func(*args))
+                if allowed:
+                    return await fn(*args, **kwargs)
+                if on_limited:
+                    await on_limited(*args, wait)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            allowed, wait, _tier = limiter.hit(key_func(*args))
+            if allowed:
+                return fn(*args, **kwargs)
+            if on_limited:
+                on_limited(*args, wait)
+        return wrapper
+    return deco
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# replay.py
+# Plays updates recorded by capture.py into either bot and reports how fast they were handled,
+# so a production peak can be reproduced on a laptop:
+#
+#   python replay.py enzo captures/enzo-*.jsonl.gz --db /tmp/replay.db --speed 10
+#   python replay.py promo captures/promo-*.jsonl.gz --db /tmp/replay.db --speed max --api-latency 80
+#
+# --speed 1 keeps the original pacing, N plays N times faster, "max" sends everything at once.
+# Nothing leaves the machine: every Bot API call gets a well-formed fake reply (after
+# --api-latency ms) and is counted per method. Updates go through the bot's real pipeline,
+# load shedding included. Use a scratch --db (or a copy of a backup): the bots' own config
+# and databases are never touched.
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import types as pytypes
+from collections import Counter
+
+import capture
+
+MESSAGE_KEYS = ("message", "edited_message")
+
+
+class FakeBotAPI:
+    # answers Bot API methods the way Telegram would, minus the side effects
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def _message(self, params):
+        try:
+            chat_id = int(params.get("chat_id", 0))
+        except (TypeError, ValueError):
+            chat_id = -1  # "@channel"
+        return {"message_id": next(self.ids), "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+
+    def result(self, method, params):
+        with self.lock:
+            self.calls[method] += 1
+        name = method.lower()
+        if name == "getme":
+            return {"id": 1, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+        if name == "getupdates":
+            return []
+        if name == "sendmediagroup":
+            media = params.get("media", [])
+            if isinstance(media, str):
+                media = json.loads(media)
+            return [self._message(params) for _ in media]
+        if name.startswith(("send", "edit", "copy", "forward")) and name != "sendchataction":
+            return self._message(params)
+        return True
+
+
+class FakeResponse:
+    # the parts of requests.Response that telebot's apihelper reads
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+
+def retime(update, shift):
+    # moves message dates by `shift` seconds, so lag-based load shedding sees replay time
+    for key in MESSAGE_KEYS:
+        if isinstance(update.get(key), dict) and "date" in update[key]:
+            update[key]["date"] = int(update[key]["date"] + shift)
+    cq = update.get("callback_query")
+    if isinstance(cq, dict) and isinstance(cq.get("message"), dict) and "date" in cq["message"]:
+        cq["message"]["date"] = int(cq["message"]["date"] + shift)
+    return update
+
+
+def schedule(items, speed):
+    # yields (due, update) with due on the monotonic clock; speed None = as fast as possible
+    start = time.monotonic()
+    first = None
+    for t, update in items:
+        first = t if first is None else first
+        due = start + (t - first) / speed if speed else time.monotonic()
+        wait = due - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        yield due, retime(update, time.time() - t - (time.monotonic() - due))
+
+
+def percentiles(samples):
+    s = sorted(samples)
+    if not s:
+        return "no samples"
+    pick = lambda p: s[min(len(s) - 1, int(len(s) * p))] * 1000
+    return f"p50 {pick(0.5):.0f} ms, p95 {pick(0.95):.0f} ms, p99 {pick(0.99):.0f} ms, max {s[-1] * 1000:.0f} ms"
+
+
+def replay_enzo(items, args, api):
+    from telebot import apihelper
+    apihelper.CUSTOM_REQUEST_SENDER = lambda method, url, params=None, files=None, **kw: (
+        time.sleep(api.latency), FakeResponse({"ok": True, "result": api.result(url.rsplit("/", 1)[-1], params or {})}))[1]
+    config = pytypes.ModuleType("config")  # stands in for config.py so the real one is never read
+    config.BOT_TOKEN, config.ADMIN_IDS, config.WELCOME_GIF_FILE_ID, config.DB_PATH = "0:replay", args.admin, "replay", args.db
+    sys.modules["config"] = config
+    import enzo_promo_bot as enzo
+    from telebot import types
+
+    latencies, futures, shed = [], [], 0
+    for due, raw in schedule(items, args.speed):
+        future = enzo.submit_update(types.Update.de_json(raw))
+        if future is None:
+            shed += 1
+            continue
+        future.add_done_callback(lambda f, due=due: latencies.append(time.monotonic() - due))
+        futures.append(future)
+    for f in futures:
+        f.result()
+    return latencies, shed, enzo.loadshed.format_stats(enzo.PIPELINE.stats())
+
+
+def replay_promo(items, args, api):
+    os.environ.update(BOT_TOKEN="0:replay", DB_PATH=args.db, ADMIN_IDS=",".join(map(str, args.admin)))
+    import promo_bot
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    from telegram.request import BaseRequest
+
+    class ReplayRequest(BaseRequest):
+        @property
+        def read_timeout(self):
+            return None
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, *a, **kw):
+            await asyncio.sleep(api.latency)
+            params = request_data.parameters if request_data else {}
+            return 200, json.dumps({"ok": True, "result": api.result(url.rsplit("/", 1)[-1], params)}).encode()
+
+    async def run():
+        promo_bot.init_db()
+        promo_bot.warm_rate_limiters()
+        app = promo_bot.build_app(ReplayRequest())
+        due_at, latencies = {}, []
+
+        async def finished(update, context):
+            latencies.append(time.monotonic() - due_at.pop(update.update_id))
+        app.add_handler(TypeHandler(Update, finished), group=100)
+        await app.initialize()
+        await app.start()
+        # paced on a thread, so waiting for the next update never blocks the bot's event loop
+        arrived = queue.Queue()
+
+        def feed():
+            for item in schedule(items, args.speed):
+                arrived.put(item)
+            arrived.put(None)
+        threading.Thread(target=feed, daemon=True).start()
+        # handled the way poll_updates hands them over in production: each update goes on
+        # UPDATE_QUEUE as it arrives and handle_updates works through the queue in order
+        worker = asyncio.get_running_loop().create_task(promo_bot.handle_updates(app))
+        fed = 0
+        while (item := await asyncio.to_thread(arrived.get)) is not None:
+            due, raw = item
+            due_at[raw["update_id"]] = due
+            promo_bot.UPDATE_QUEUE.put_nowait((Update.de_json(raw, app.bot), False))
+            fed += 1
+        await promo_bot.UPDATE_QUEUE.join()
+        worker.cancel()
+        await app.stop()
+        await app.shutdown()
+        return latencies, fed - len(latencies), promo_bot.loadshed.format_stats(promo_bot.PIPELINE.stats())
+
+    return asyncio.run(run())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay captured updates into a bot against a stubbed Bot API.")
+    ap.add_argument("bot", choices=("enzo", "promo"))
+    ap.add_argument("files", nargs="+", help="capture files (*.jsonl.gz)")
+    ap.add_argument("--db", required=True, help="scratch database the bot runs against")
+    ap.add_argument("--speed", default="1", help='playback speed factor, or "max"')
+    ap.add_argument("--api-latency", type=float, default=0, help="milliseconds each fake Bot API call takes")
+    ap.add_argument("--admin", default="", help="comma-separated admin ids (those kept unpseudonymized in the capture)")
+    ap.add_argument("--limit", type=int, help="stop after this many updates")
+    args = ap.parse_args()
+    args.speed = None if args.speed == "max" else float(args.speed)
+    args.admin = [int(x) for x in args.admin.split(",") if x.strip()]
+
+    items = list(itertools.islice(capture.read_capture(args.files), args.limit))
+    if not items:
+        sys.exit("No updates in the given files.")
+    api = FakeBotAPI(args.api_latency)
+    started = time.monotonic()
+    latencies, shed, load = (replay_enzo if args.bot == "enzo" else replay_promo)(items, args, api)
+    elapsed = time.monotonic() - started
+    span = items[-1][0] - items[0][0]
+    print(f"Replayed {len(items)} updates ({span:.0f}s of traffic) in {elapsed:.1f}s, {len(items) / elapsed:.1f}/s, {shed} shed")
+    print(f"Latency (due -> handled): {percentiles(latencies)}")
+    print("Bot API calls: " + ", ".join(f"{m} {n}" for m, n in api.calls.most_common()))
+    print(load)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# reporting.py
+# Read-only query path for admin reports, shared by both bots.
+#
+# Reports open their own read-only connections (mode=ro), so they can never take a write lock;
+# with the database in WAL mode they read a consistent snapshot while customer writes carry on.
+# A semaphore caps how many reports run at once and a progress handler aborts any query that
+# runs past its time budget.
+import sqlite3
+import threading
+import time
+
+PROGRESS_STEPS = 10000  # SQLite VM instructions between deadline checks
+
+
+class ReportError(Exception):
+    pass
+
+
+class ReportBusy(ReportError):
+    pass
+
+
+class ReportTimeout(ReportError):
+    pass
+
+
+class ReportingDB:
+    def __init__(self, db_path, max_concurrent=2, timeout=10.0, wait=2.0):
+        self.db_path = db_path
+        self.timeout = timeout  # seconds a single query may run
+        self.wait = wait  # seconds to wait for a free slot before giving up
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+
+    def query(self, sql, params=()):
+        if not self.slots.acquire(timeout=self.wait):
+            raise ReportBusy("Too many reports are running. Try again in a moment.")
+        try:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            deadline = time.monotonic() + self.timeout
+            conn.set_progress_handler(lambda: int(time.monotonic() > deadline), PROGRESS_STEPS)
+            try:
+                return conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                if time.monotonic() > deadline:
+                    raise ReportTimeout(f"The report took longer than {self.timeout:g}s. Narrow it down and try again.") from e
+                raise
+            finally:
+                conn.close()
+        finally:
+            self.slots.release()
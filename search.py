@@ -0,0 +1,47 @@
+# search.py
+# SQLite FTS5 indexes behind /find in both bots.
+#
+# Each index is an external-content FTS5 table over the bot's own table: the text lives only
+# in the original rows, the index holds tokens, and triggers keep it in step with every
+# insert, update and delete. Queries are ranked with bm25 and answered from the index alone.
+import re
+
+WORD = re.compile(r"\w+")
+MAX_WORDS = 8
+
+
+def init_fts(c, table, columns):
+    # creates {table}_fts plus its sync triggers; fills it from existing rows on first run
+    fts = f"{table}_fts"
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,))
+    exists = c.fetchone() is not None
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{col}" for col in columns)
+    old = ", ".join(f"old.{col}" for col in columns)
+    # prefix indexes make the "word*" queries built by match_expression cheap
+    c.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', prefix='2 3')")
+    c.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts} (rowid, {cols}) VALUES (new.rowid, {new});
+    END
+    """)
+    c.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old});
+    END
+    """)
+    c.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {cols} ON {table} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old});
+        INSERT INTO {fts} (rowid, {cols}) VALUES (new.rowid, {new});
+    END
+    """)
+    if not exists:
+        c.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def match_expression(text):
+    # free text -> FTS5 MATCH string where every word must match as a prefix. Only word
+    # characters survive, so quotes, *, ^, : and the like in user input can't break the query.
+    words = WORD.findall(text)[:MAX_WORDS]
+    return " ".join(f'"{w}"*' for w in words)
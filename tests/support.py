@@ -0,0 +1,194 @@
+# Shared set-up for the tests that import promo_bot or enzo_promo_bot.
+import functools
+import logging
+import os
+import sys
+import tempfile
+import threading
+import types
+import unittest
+from concurrent.futures import Executor, Future
+from types import SimpleNamespace
+from unittest import mock
+
+try:
+    import telegram  # noqa: F401
+except ImportError:
+    telegram = None
+
+try:
+    import telebot  # noqa: F401
+except ImportError:
+    telebot = None
+
+# promo_bot opens DB_PATH at import time; point it at a scratch file so no real database is
+# touched. Each test then gets a fresh database of its own.
+_SCRATCH = tempfile.TemporaryDirectory()
+
+
+def import_promo_bot():
+    os.environ["DB_PATH"] = os.path.join(_SCRATCH.name, "import.db")
+    import promo_bot
+    promo_bot.logger.setLevel(logging.CRITICAL)  # the expected send failures would flood the output
+    return promo_bot
+
+
+class FakeBot:
+    # records what the handlers send; chats in `failing` raise on every send
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent, self.edited, self.deleted = [], [], []
+        self.next_message_id = 100
+
+    async def _send(self, chat_id, **kwargs):
+        if chat_id in self.failing:
+            raise telegram.error.NetworkError("channel unreachable")
+        self.next_message_id += 1
+        self.sent.append((chat_id, kwargs))
+        return SimpleNamespace(message_id=self.next_message_id)
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        return await self._send(chat_id, text=text, reply_markup=reply_markup)
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        return await self._send(chat_id, photo=photo, caption=caption)
+
+    async def send_video(self, chat_id, video, caption=None, **kwargs):
+        return await self._send(chat_id, video=video, caption=caption)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.edited.append((chat_id, message_id, text))
+
+    async def edit_message_caption(self, chat_id, message_id, caption, **kwargs):
+        self.edited.append((chat_id, message_id, caption))
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        self.deleted.append((chat_id, message_id))
+
+
+def command(user_id, text, bot=None):
+    # (update, context) for a command handler; replies collect in update.replies
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(
+        effective_user=SimpleNamespace(id=user_id), effective_chat=SimpleNamespace(id=user_id), replies=replies,
+        message=SimpleNamespace(text=text, reply_text=reply_text),
+    )
+    context = SimpleNamespace(args=text.split()[1:], bot=bot or FakeBot())
+    return update, context
+
+
+@unittest.skipIf(telegram is None, "python-telegram-bot is not installed")
+class PromoBotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pb = import_promo_bot()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = os.path.join(tmp.name, "promo.db")
+        for name, value in (("DB_PATH", self.db), ("ADMIN_IDS", [7]), ("CHANNEL_IDS", [])):
+            patcher = mock.patch.object(self.pb, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pb.HISTORY_CACHE.clear()
+        self.pb.init_db()
+
+    def patch(self, name, value):
+        patcher = mock.patch.object(self.pb, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def outbox_texts(self, chat_id):
+        return [r["text"] for r in self.pb.outbox.fetch_due(self.db) if r["chat_id"] == chat_id]
+
+
+# ---------- enzo_promo_bot ----------
+ENZO_ADMIN = 42
+
+
+def import_enzo():
+    # enzo_promo_bot reads config.py at import time; a stand-in module keeps the real one unread
+    if "enzo_promo_bot" not in sys.modules:
+        config = types.ModuleType("config")
+        config.BOT_TOKEN, config.ADMIN_IDS, config.WELCOME_GIF_FILE_ID = "0:test", [ENZO_ADMIN], ""
+        config.DB_PATH = os.path.join(_SCRATCH.name, "enzo.db")
+        sys.modules["config"] = config
+    import enzo_promo_bot
+    logging.getLogger().setLevel(logging.CRITICAL)  # enzo logs through the root logger
+    return enzo_promo_bot
+
+
+class FakeTeleBot:
+    # records every TeleBot method call as (name, args, kwargs); sends return a fresh message id
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.next_message_id = 100
+
+    def _call(self, name, *args, **kwargs):
+        with self.lock:
+            self.calls.append((name, args, kwargs))
+            self.next_message_id += 1
+            return SimpleNamespace(message_id=self.next_message_id)
+
+    def __getattr__(self, name):
+        return functools.partial(self._call, name)
+
+    def of(self, name):
+        return [(args, kwargs) for n, args, kwargs in self.calls if n == name]
+
+
+class InlineExecutor(Executor):
+    # runs submitted work straight away, so acknowledgements happen in a predictable order
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def tap(user_id, data, message_id=1, username="user"):
+    # a telebot CallbackQuery as far as callback_router looks at it
+    return SimpleNamespace(id=f"cb-{user_id}-{message_id}-{data}", data=data,
+                           from_user=SimpleNamespace(id=user_id, username=username),
+                           message=SimpleNamespace(message_id=message_id, chat=SimpleNamespace(id=user_id)))
+
+
+@unittest.skipIf(telebot is None, "pyTelegramBotAPI is not installed")
+class EnzoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.enzo = enzo = import_enzo()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = os.path.join(tmp.name, "enzo.db")
+        self.bot = FakeTeleBot()
+        for name, value in (("DB_PATH", self.db), ("ADMIN_IDS", [ENZO_ADMIN]), ("bot", self.bot),
+                            ("REPORTS", enzo.reporting.ReportingDB(self.db)), ("USER_STATE", enzo.cluster.MemoryStore()),
+                            ("CALLBACK_DEDUP", enzo.ExpiringSet(enzo.CALLBACK_DEDUP_TTL)), ("ACK_POOL", InlineExecutor()),
+                            ("FLOOD_LIMITER", enzo.RateLimiter([enzo.Tier("minute", 1000, 60)]))):
+            self.patch(name, value)
+        enzo.ORDER_CACHE.clear()
+        enzo.HISTORY_CACHE.clear()
+        enzo.init_db()
+
+    def patch(self, name, value):
+        patcher = mock.patch.object(self.enzo, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def order(self, user_id=500, status="awaiting_receipt", **fields):
+        order = {"id": self.enzo.new_order_id(), "telegram_id": user_id, "username": "buyer", "service": "TikTok",
+                 "package_group": "Views", "package_qty": "1K", "price": "100 ETB", "link_or_username": "@buyer",
+                 "payment_method": "telebirr", "status": status, **fields}
+        self.enzo.db_insert_order(order)
+        return order["id"]
+
+    def status(self, order_id):
+        return self.enzo.db_get_order(order_id)["status"]
+
+    def outbox_rows(self):
+        return self.enzo.outbox.fetch_due(self.db, 1000)
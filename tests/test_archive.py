@@ -0,0 +1,62 @@
+# Run from the repository root: python -m unittest
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import archive
+import search
+
+DAY_MS = 86400 * 1000
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, "bot.db")
+        now = int(time.time() * 1000)
+        with sqlite3.connect(self.db) as conn:
+            c = conn.cursor()
+            c.execute("CREATE TABLE orders (id TEXT PRIMARY KEY, telegram_id INTEGER, username TEXT, status TEXT, created_at INTEGER)")
+            search.init_fts(c, "orders", ("username",))
+            archive.init_archive(c, "orders", ("username",))
+            c.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", [
+                ("old-done", 1, "abebe", "done", now - 200 * DAY_MS),
+                ("old-rejected", 1, "kebede", "rejected", now - 100 * DAY_MS),
+                ("old-open", 1, "almaz", "processing", now - 200 * DAY_MS),  # not finished: stays
+                ("new-done", 1, "tigist", "done", now - DAY_MS),  # too recent: stays
+            ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ids(self, sql):
+        with sqlite3.connect(self.db) as conn:
+            return sorted(r[0] for r in conn.execute(sql))
+
+    def test_moves_only_old_finished_rows(self):
+        self.assertFalse(archive.has_archive(self.db, "orders"))
+        self.assertEqual(archive.archive_rows(self.db, "orders", 90, batch_size=1), 2)
+        self.assertTrue(archive.has_archive(self.db, "orders"))
+        self.assertEqual(self.ids("SELECT id FROM orders"), ["new-done", "old-open"])
+        self.assertEqual(self.ids("SELECT id FROM orders_all"), ["new-done", "old-done", "old-open", "old-rejected"])
+        self.assertEqual(archive.archive_rows(self.db, "orders", 90), 0)
+
+    def test_archived_rows_stay_searchable(self):
+        archive.archive_rows(self.db, "orders", 90)
+        self.assertEqual(archive.search_archive(self.db, "orders", search.match_expression("abe"), 10), ["old-done"])
+        self.assertEqual(self.ids("SELECT o.id FROM orders_fts JOIN orders o ON o.rowid = orders_fts.rowid "
+                                  "WHERE orders_fts MATCH 'abebe'"), [])
+
+    def test_view_tolerates_columns_added_later(self):
+        archive.archive_rows(self.db, "orders", 90)
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("ALTER TABLE orders ADD COLUMN note TEXT")
+            archive.refresh_view(conn.cursor(), "orders")
+            rows = conn.execute("SELECT id, note FROM orders_all WHERE id = 'old-done'").fetchall()
+        self.assertEqual(rows, [("old-done", None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
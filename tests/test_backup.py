@@ -0,0 +1,92 @@
+# Run from the repository root: python -m unittest
+import gzip
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import backup
+
+
+class BackupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, "bot.db")
+        self.dest = os.path.join(self.tmp.name, "backups")
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, blob TEXT)")
+            conn.executemany("INSERT INTO orders (blob) VALUES (?)", [("x" * 500,) for _ in range(2000)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def count(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("SELECT count(*) FROM orders").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_uncompressed_snapshot_is_a_usable_copy(self):
+        path, size, _ = backup.take_backup(self.db, self.dest, compress=False)
+        self.assertTrue(os.path.basename(path).startswith("bot-") and path.endswith(".db"))
+        self.assertEqual(size, os.path.getsize(path))
+        self.assertEqual(self.count(path), 2000)
+        self.assertEqual([n for n in os.listdir(self.dest) if n.endswith(".part")], [])
+
+    def test_compressed_snapshot(self):
+        path, _, _ = backup.take_backup(self.db, self.dest)
+        self.assertTrue(path.endswith(".db.gz"))
+        restored = os.path.join(self.tmp.name, "restored.db")
+        with gzip.open(path, "rb") as f_in, open(restored, "wb") as f_out:
+            f_out.write(f_in.read())
+        self.assertEqual(self.count(restored), 2000)
+
+    def test_completes_under_write_load(self):
+        stop = threading.Event()
+
+        def writer():
+            conn = sqlite3.connect(self.db, timeout=5)
+            while not stop.is_set():
+                conn.execute("INSERT INTO orders (blob) VALUES ('y')")
+                conn.commit()
+            conn.close()
+
+        t = threading.Thread(target=writer)
+        t.start()
+        try:
+            path, _, _ = backup.take_backup(self.db, self.dest, compress=False)
+        finally:
+            stop.set()
+            t.join()
+        self.assertGreaterEqual(self.count(path), 2000)
+
+    def test_back_to_back_backups_are_both_kept(self):
+        first, _, _ = backup.take_backup(self.db, self.dest)
+        second, _, _ = backup.take_backup(self.db, self.dest)
+        self.assertNotEqual(first, second)
+        self.assertEqual(backup.snapshots(self.dest, self.db), [first, second])
+
+    def test_refuses_to_run_twice_at_once(self):
+        backup._running.acquire()
+        try:
+            with self.assertRaises(backup.BackupError):
+                backup.take_backup(self.db, self.dest)
+        finally:
+            backup._running.release()
+
+    def test_rotation_keeps_the_newest(self):
+        os.makedirs(self.dest)
+        for stamp in ("20250101-000000", "20250102-000000", "20250103-000000"):
+            open(os.path.join(self.dest, f"bot-{stamp}.db.gz"), "w").close()
+        open(os.path.join(self.dest, "other-20250101-000000.db.gz"), "w").close()
+        self.assertEqual(backup.rotate(self.dest, self.db, keep=2), 1)
+        self.assertEqual([os.path.basename(p) for p in backup.snapshots(self.dest, self.db)],
+                         ["bot-20250102-000000.db.gz", "bot-20250103-000000.db.gz"])
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "other-20250101-000000.db.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
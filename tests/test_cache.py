@@ -0,0 +1,66 @@
+# Run from the repository root: python -m unittest
+import unittest
+
+from cache import ExpiringSet, LRUCache
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")  # "b" is now the oldest
+        cache.put("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_stats_count_hits_and_misses(self):
+        cache = LRUCache(10)
+        cache.put("a", 1)
+        cache.get("a")
+        cache.get("a")
+        cache.get("missing")
+        st = cache.stats()
+        self.assertEqual((st["hits"], st["misses"], st["size"]), (2, 1, 1))
+        self.assertAlmostEqual(st["hit_rate"], 0.667)
+
+    def test_pop_and_clear(self):
+        cache = LRUCache(10)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.pop("a"))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_zero_size_disables_caching(self):
+        cache = LRUCache(0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+class ExpiringSetTest(unittest.TestCase):
+    def test_duplicates_within_ttl_are_reported(self):
+        seen = ExpiringSet(5)
+        self.assertTrue(seen.add("tap", now=0))
+        self.assertFalse(seen.add("tap", now=4))
+        self.assertEqual(seen.duplicates, 1)
+
+    def test_keys_expire_after_ttl(self):
+        seen = ExpiringSet(5)
+        seen.add("tap", now=0)
+        self.assertTrue(seen.add("tap", now=5))
+        self.assertEqual(len(seen), 1)
+
+    def test_size_is_bounded(self):
+        seen = ExpiringSet(60, maxsize=3)
+        for k in range(10):
+            seen.add(k, now=0)
+        self.assertEqual(len(seen), 3)
+        self.assertTrue(seen.add(0, now=0))  # evicted, so no longer a duplicate
+
+
+if __name__ == "__main__":
+    unittest.main()
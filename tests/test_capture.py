@@ -0,0 +1,103 @@
+# Run from the repository root: python -m unittest
+import glob
+import gzip
+import os
+import tempfile
+import unittest
+
+import capture
+
+SECRET = b"capture-test-secret"
+ADMIN = 7
+
+
+def message(user_id, chat_id, text="hi"):
+    person = {"id": user_id, "is_bot": False, "first_name": "Abebe", "last_name": "Kebede", "username": "abebe"}
+    return {"update_id": 1, "message": {"message_id": 1, "date": 0, "text": text, "from": person,
+                                        "chat": {"id": chat_id, "type": "private", "first_name": "Abebe"},
+                                        "contact": {"user_id": user_id, "phone_number": "+251911000000"}}}
+
+
+class PseudonymizeTest(unittest.TestCase):
+    def test_same_secret_same_ids(self):
+        a = capture.pseudonymize(message(1001, 1001), SECRET)
+        b = capture.pseudonymize(message(1001, 1001), SECRET)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a["message"]["from"]["id"], 1001)
+        # the sender and their private chat stay linked, as in the real update
+        self.assertEqual(a["message"]["from"]["id"], a["message"]["chat"]["id"])
+        self.assertEqual(a["message"]["contact"]["user_id"], a["message"]["from"]["id"])
+
+    def test_other_secret_other_ids(self):
+        a = capture.pseudonymize(message(1001, 1001), SECRET)
+        b = capture.pseudonymize(message(1001, 1001), b"another-secret")
+        self.assertNotEqual(a["message"]["from"]["id"], b["message"]["from"]["id"])
+
+    def test_channel_ids_stay_negative(self):
+        self.assertLess(capture.pseudonym(SECRET, -1001234567890), 0)
+        self.assertLess(abs(capture.pseudonym(SECRET, -1001234567890)), 2 ** 48)
+
+    def test_admins_are_kept(self):
+        out = capture.pseudonymize(message(ADMIN, ADMIN), SECRET, keep_ids={ADMIN})
+        self.assertEqual(out["message"]["from"]["id"], ADMIN)
+        self.assertEqual(out["message"]["chat"]["id"], ADMIN)
+        self.assertNotEqual(out["message"]["from"]["first_name"], "Abebe")
+
+    def test_personal_fields_are_replaced(self):
+        out = capture.pseudonymize(message(1001, 1001), SECRET)
+        dumped = repr(out)
+        for value in ("Abebe", "Kebede", "abebe", "+251911000000", "1001"):
+            self.assertNotIn(value, dumped)
+        self.assertEqual(out["message"]["text"], "hi")
+        self.assertEqual(message(1001, 1001)["message"]["from"]["first_name"], "Abebe")  # input left alone
+
+
+class CaptureFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def files(self):
+        return sorted(glob.glob(os.path.join(self.tmp.name, "*.jsonl.gz")))
+
+    def test_rotation_and_read_back(self):
+        cap = capture.Capture(self.tmp.name, "secret", keep_ids={ADMIN}, rotate_bytes=1000)
+        for i in range(30):
+            update = message(ADMIN, ADMIN, text=f"msg {i}")
+            update["update_id"] = i
+            cap.record(update)
+        cap.close()
+        self.assertEqual(cap.recorded, 30)
+        self.assertEqual(cap.dropped, 0)
+        self.assertGreater(len(self.files()), 1)
+        self.assertEqual(len(self.files()), cap.files)
+        updates = [u for _, u in capture.read_capture(self.files())]
+        self.assertEqual([u["update_id"] for u in updates], list(range(30)))
+        self.assertEqual(updates[0]["message"]["from"]["id"], ADMIN)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        cap = capture.Capture(self.tmp.name, "secret")
+        cap.close()  # the writer is gone, so nothing drains the queue
+        for _ in range(capture.QUEUE_SIZE + 5):
+            cap.record({"update_id": 1})
+        self.assertEqual(cap.dropped, 5)
+
+    def test_read_back_stops_at_a_cut_short_line(self):
+        path = os.path.join(self.tmp.name, "updates-20250101-000000-0001.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write('{"t":1.0,"update":{"update_id":1}}\n{"t":2.0,"upd')
+        self.assertEqual(list(capture.read_capture([path])), [(1.0, {"update_id": 1})])
+
+    def test_read_back_of_a_file_without_its_gzip_trailer(self):
+        path = os.path.join(self.tmp.name, "updates-20250101-000000-0001.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for i in range(200):
+                f.write(f'{{"t":{i},"update":{{"update_id":{i}}}}}\n')
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 8)  # crashed before the trailer was written
+        ids = [u["update_id"] for _, u in capture.read_capture([path])]
+        self.assertEqual(ids, list(range(len(ids))))
+
+
+if __name__ == "__main__":
+    unittest.main()
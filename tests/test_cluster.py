@@ -0,0 +1,123 @@
+# Run from the repository root: python -m unittest
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import cluster
+
+
+class StoreContract:
+    # behaviour every StateStore backend must share; mixed into one TestCase per backend
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.store = self.make_store()
+
+    def test_round_trip_is_a_copy(self):
+        value = {"stage": "awaiting_link", "items": [1, 2]}
+        self.store.set("fsm:1", value)
+        value["items"].append(3)
+        self.assertEqual(self.store.get("fsm:1"), {"stage": "awaiting_link", "items": [1, 2]})
+        self.assertIsNone(self.store.get("fsm:2"))
+        self.assertEqual(self.store.get("fsm:2", "none"), "none")
+
+    def test_delete(self):
+        self.store.set("k", 1)
+        self.store.delete("k")
+        self.store.delete("k")
+        self.assertIsNone(self.store.get("k"))
+
+    def test_ttl_expiry_and_purge(self):
+        self.store.set("short", "a", ttl=60)
+        self.store.set("forever", "b")
+        self.assertEqual(self.store.get("short"), "a")
+        later = cluster.now_ms() + 61 * 1000
+        with mock.patch.object(cluster, "now_ms", return_value=later):
+            self.assertIsNone(self.store.get("short"))
+            self.assertEqual(self.store.get("forever"), "b")
+            self.assertEqual(self.store.purge(), 1)
+            self.assertEqual(self.store.purge(), 0)
+
+    def test_set_again_resets_the_ttl(self):
+        self.store.set("k", 1, ttl=60)
+        self.store.set("k", 2)
+        with mock.patch.object(cluster, "now_ms", return_value=cluster.now_ms() + 120 * 1000):
+            self.assertEqual(self.store.get("k"), 2)
+
+
+class MemoryStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return cluster.open_store("memory")
+
+
+class SQLiteStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return cluster.open_store(f"sqlite://{os.path.join(self.dir, 'state.db')}")
+
+    def test_instances_share_state(self):
+        other = cluster.open_store(f"sqlite://{os.path.join(self.dir, 'state.db')}")
+        self.store.set("fsm:9", ["awaiting_receipt", "o1"], ttl=60)
+        self.assertEqual(other.get("fsm:9"), ["awaiting_receipt", "o1"])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            cluster.open_store("redis://localhost")
+
+
+class LeaseTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = os.path.join(tmp.name, "leases.db")
+        self.a = cluster.Lease(self.db, "poller", ttl=30, holder="a")
+        self.b = cluster.Lease(self.db, "poller", ttl=30, holder="b")
+
+    def test_only_one_holder(self):
+        self.assertTrue(self.a.acquire())
+        self.assertFalse(self.b.acquire())
+        self.assertTrue(self.a.held())
+        self.assertFalse(self.b.held())
+        self.assertEqual(self.a.current()[0], "a")
+
+    def test_renewal_extends_the_claim(self):
+        self.a.acquire()
+        first = self.a.current()[1]
+        time.sleep(0.01)
+        self.assertTrue(self.a.acquire())
+        self.assertGreater(self.a.current()[1], first)
+
+    def test_takeover_after_the_ttl(self):
+        self.a.acquire()
+        later = cluster.now_ms() + 31 * 1000
+        with mock.patch.object(cluster, "now_ms", return_value=later):
+            self.assertTrue(self.b.acquire())
+        self.assertEqual(self.b.current()[0], "b")
+        self.assertFalse(self.a.acquire())  # the old holder finds out on its next renewal
+
+    def test_stalled_holder_stops_trusting_its_claim(self):
+        self.a.acquire()
+        with mock.patch.object(cluster.time, "monotonic", return_value=time.monotonic() + 31):
+            self.assertFalse(self.a.held())
+
+    def test_release_hands_over_at_once(self):
+        self.a.acquire()
+        self.b.release()  # not the holder: nothing happens
+        self.assertFalse(self.b.acquire())
+        self.a.release()
+        self.assertFalse(self.a.held())
+        self.assertTrue(self.b.acquire())
+
+    def test_leases_are_independent(self):
+        other = cluster.Lease(self.db, "scheduler", holder="b")
+        self.assertTrue(self.a.acquire())
+        self.assertTrue(other.acquire())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+# Run from the repository root: python -m unittest
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.support import EnzoTestCase, tap
+
+BUYER = 500
+
+
+class AckFirstTest(EnzoTestCase):
+    def test_toast_text_comes_from_the_data_alone(self):
+        ack_text = self.enzo.ack_text
+        self.assertEqual(ack_text("svc|TikTok"), "TikTok selected.")
+        self.assertEqual(ack_text("pay|abc123|telebirr"), "telebirr selected.")
+        self.assertEqual(ack_text("adm|approve|abc123"), "Updating order…")
+        self.assertIsNone(ack_text("myo|abc123"))
+        self.assertEqual(ack_text("nonsense"), "Unknown action. Use /start to begin.")
+
+    def test_ack_goes_out_before_anything_else(self):
+        oid = self.order(status="created")
+        self.enzo.callback_router(tap(BUYER, f"pay|{oid}|cbe"))
+        self.assertEqual([name for name, _, _ in self.bot.calls], ["answer_callback_query", "edit_message_text"])
+        self.assertEqual(self.bot.of("answer_callback_query")[0][0][1], "cbe selected.")
+
+    def test_slow_database_does_not_hold_the_ack(self):
+        self.patch("ACK_POOL", ThreadPoolExecutor(max_workers=1))
+        self.addCleanup(self.enzo.ACK_POOL.shutdown)
+        acked, release = threading.Event(), threading.Event()
+        answer = self.bot._call
+
+        def record(name, *args, **kwargs):
+            if name == "answer_callback_query":
+                acked.set()
+            return answer(name, *args, **kwargs)
+
+        self.bot._call = record
+        slow = self.enzo.db_transition_order
+
+        def blocked(*args, **kwargs):
+            release.wait(5)
+            return slow(*args, **kwargs)
+
+        self.patch("db_transition_order", blocked)
+        oid = self.order(status="created")
+        worker = threading.Thread(target=self.enzo.callback_router, args=(tap(BUYER, f"pay|{oid}|cbe"),))
+        worker.start()
+        try:
+            self.assertTrue(acked.wait(2), "the tap was not acknowledged while the DB was busy")
+            self.assertEqual(self.status(oid), "created")
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual(self.status(oid), "awaiting_receipt")
+
+    def test_failed_ack_does_not_stop_the_handler(self):
+        def answer_fails(name, *args, **kwargs):
+            if name == "answer_callback_query":
+                raise RuntimeError("query is too old")
+            return type(self.bot)._call(self.bot, name, *args, **kwargs)
+
+        self.bot._call = answer_fails
+        oid = self.order(status="created")
+        with self.assertLogs(level="WARNING") as logs:
+            self.enzo.callback_router(tap(BUYER, f"pay|{oid}|cbe"))
+        self.assertIn("query is too old", logs.output[0])
+        self.assertEqual(self.status(oid), "awaiting_receipt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Run from the repository root: python -m unittest
+import unittest
+from types import SimpleNamespace
+
+from tests.support import ENZO_ADMIN, EnzoTestCase, tap
+
+OTHER_ADMIN = 43
+BUYER = 500
+
+
+def buttons(markup):
+    return [b.callback_data for row in markup.keyboard for b in row]
+
+
+class AdminButtonsTest(EnzoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("ADMIN_IDS", [ENZO_ADMIN, OTHER_ADMIN])
+        self.oid = self.order(user_id=BUYER, status="awaiting_receipt")
+        order = self.enzo.db_get_order(self.oid)
+        notify = self.enzo.notify_admins_with_receipt(order, "receipt-photo")
+        self.enzo.db_transition_order(self.oid, ("awaiting_receipt",), "pending_verification", notify=notify)
+        self.enzo.drain_outbox()
+        self.bot.calls.clear()
+
+    def edits(self):
+        return {args[1]: (args[0], kwargs["reply_markup"]) for args, kwargs in self.bot.of("edit_message_caption")}
+
+    def test_every_admin_copy_carries_the_buttons(self):
+        copies = self.enzo.db_admin_messages(self.oid)
+        self.assertEqual(sorted(chat for chat, _, _ in copies), [ENZO_ADMIN, OTHER_ADMIN])
+        self.assertEqual({kind for _, _, kind in copies}, {"caption"})
+
+    def test_tap_updates_every_copy_and_tells_the_customer(self):
+        self.enzo.callback_router(tap(ENZO_ADMIN, f"adm|approve|{self.oid}", username="finance"))
+        self.assertEqual(self.status(self.oid), "processing")
+        edits = self.edits()
+        self.assertEqual(sorted(edits), [ENZO_ADMIN, OTHER_ADMIN])
+        caption, markup = edits[OTHER_ADMIN]
+        self.assertTrue(caption.endswith("Status: processing (by @finance)"))
+        self.assertEqual(buttons(markup), [f"adm|done|{self.oid}"])
+        self.assertEqual([(r["chat_id"], r["text"]) for r in self.outbox_rows()],
+                         [(BUYER, f"🔄 Your order {self.oid} is now being processed.")])
+
+    def test_finished_order_has_no_buttons_left(self):
+        self.enzo.callback_router(tap(ENZO_ADMIN, f"adm|done|{self.oid}"))
+        self.assertEqual(self.status(self.oid), "done")
+        self.assertTrue(all(buttons(markup) == [] for _, markup in self.edits().values()))
+
+    def test_commands_refresh_the_buttons_too(self):
+        m = SimpleNamespace(text=f"/approve {self.oid}", from_user=SimpleNamespace(id=OTHER_ADMIN, username=None),
+                            chat=SimpleNamespace(id=OTHER_ADMIN))
+        self.enzo.cmd_approve(m)
+        self.assertEqual(self.bot.of("reply_to")[0][0][1], f"Order {self.oid} marked processing.")
+        caption, _ = self.edits()[ENZO_ADMIN]
+        self.assertTrue(caption.endswith(f"(by {OTHER_ADMIN})"))
+
+    def test_refused_taps(self):
+        for user, data in ((BUYER, f"adm|approve|{self.oid}"), (ENZO_ADMIN, f"adm|delete|{self.oid}"), (ENZO_ADMIN, "adm|approve")):
+            with self.subTest(data=data):
+                self.bot.calls.clear()
+                self.enzo.callback_router(tap(user, data))
+                self.assertEqual(self.bot.of("send_message")[0][0][1], "Denied.")
+        self.assertEqual(self.status(self.oid), "pending_verification")
+
+    def test_text_fallback_when_the_photo_cannot_be_sent(self):
+        def photo_fails(name, *args, **kwargs):
+            if name == "send_photo":
+                raise RuntimeError("wrong file identifier")
+            return type(self.bot)._call(self.bot, name, *args, **kwargs)
+
+        self.bot._call = photo_fails
+        oid = self.order(status="pending_verification")
+        self.enzo.deliver_outbox_row({"chat_id": ENZO_ADMIN, "kind": "receipt", "text": "receipt",
+                                      "photo_file_id": "bad", "ref": oid})
+        (args, kwargs), = self.bot.of("send_message")
+        self.assertEqual(buttons(kwargs["reply_markup"]), [f"adm|{a}|{oid}" for a in ("approve", "done", "reject")])
+        self.assertEqual([kind for _, _, kind in self.enzo.db_admin_messages(oid)], ["text"])
+
+
+if __name__ == "__main__":
+    unittest.main()
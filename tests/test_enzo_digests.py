@@ -0,0 +1,113 @@
+# Run from the repository root: python -m unittest
+import sqlite3
+import unittest
+from unittest import mock
+
+from tests.support import ENZO_ADMIN, EnzoTestCase
+
+MINUTE = 60 * 1000
+
+
+def row(n, created_at, kind="receipt", attempts=0, chat_id=ENZO_ADMIN):
+    return {"id": n, "chat_id": chat_id, "kind": kind, "text": f"receipt {n}", "photo_file_id": f"f{n}",
+            "ref": f"o{n}", "attempts": attempts, "created_at": created_at}
+
+
+class TakeDigestsTest(EnzoTestCase):
+    NOW = 10_000_000
+
+    def setUp(self):
+        super().setUp()
+        self.patch("DIGEST_WINDOW", 60)
+
+    def take(self, rows):
+        singles, albums, held = self.enzo.take_digests(rows, self.NOW)
+        return [r["id"] for r in singles], [[r["id"] for r in a] for a in albums], held
+
+    def test_off_by_default(self):
+        self.patch("DIGEST_WINDOW", 0)
+        rows = [row(i, 0) for i in range(3)]
+        self.assertEqual(self.take(rows), ([0, 1, 2], [], 0))
+
+    def test_fresh_receipts_wait_for_the_window(self):
+        self.assertEqual(self.take([row(1, self.NOW - MINUTE // 2), row(2, self.NOW)]), ([], [], 2))
+
+    def test_window_over_makes_an_album_per_admin(self):
+        old = self.NOW - 2 * MINUTE
+        rows = [row(1, old), row(2, old), row(3, old, chat_id=43), row(4, old, chat_id=43), row(5, old, chat_id=44)]
+        self.assertEqual(self.take(rows), ([5], [[1, 2], [3, 4]], 0))
+
+    def test_full_album_goes_at_once_and_leftovers_alone(self):
+        rows = [row(i, self.NOW) for i in range(11)]
+        self.assertEqual(self.take(rows), ([10], [list(range(10))], 0))
+
+    def test_documents_and_retries_are_never_bundled(self):
+        old = self.NOW - 2 * MINUTE
+        rows = [row(1, old, kind="receipt_document"), row(2, old, attempts=1), row(3, old, kind="message")]
+        self.assertEqual(self.take(rows), ([1, 2, 3], [], 0))
+
+    def test_degraded_pipeline_stretches_the_window(self):
+        self.patch("DIGEST_WINDOW", 30)
+        self.patch("DEGRADED_DIGEST_WINDOW", 60)
+        rows = [row(1, self.NOW - MINUTE * 3 // 4), row(2, self.NOW)]
+        self.assertEqual(self.take(rows), ([], [[1, 2]], 0))
+        self.patch("PIPELINE", mock.Mock(degraded=lambda: True))
+        self.assertEqual(self.take(rows), ([], [], 2))
+        self.enzo.PIPELINE.note.assert_called_once_with("digest_deferred")
+
+
+class DigestDeliveryTest(EnzoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("DIGEST_WINDOW", 60)
+        self.orders = [self.order(user_id=500 + i, status="awaiting_receipt") for i in range(3)]
+        for n, oid in enumerate(self.orders):
+            order = self.enzo.db_get_order(oid)
+            notify = self.enzo.notify_admins_with_receipt(order, f"photo{n}")
+            self.enzo.db_transition_order(oid, ("awaiting_receipt",), "pending_verification", notify=notify)
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE outbox SET created_at = created_at - 120000")
+
+    def test_album_with_index_caption_and_action_buttons(self):
+        self.assertEqual(self.enzo.drain_outbox(), 3)
+        (args, _), = self.bot.of("send_media_group")
+        media = args[1]
+        self.assertEqual([m.media for m in media], ["photo0", "photo1", "photo2"])
+        self.assertTrue(media[0].caption.startswith("📥 3 New Payments\n1. #"))
+        self.assertEqual([m.caption for m in media[1:]], [None, None])
+        (args, kwargs), = self.bot.of("send_message")
+        rows = kwargs["reply_markup"].keyboard
+        self.assertEqual([b.callback_data for b in rows[0]], [f"adm|{a}|{self.orders[0]}" for a in ("approve", "done", "reject")])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self.outbox_rows(), [])
+        with sqlite3.connect(self.db) as conn:
+            kinds = conn.execute("SELECT kind, COUNT(*) FROM admin_messages GROUP BY kind").fetchall()
+        self.assertEqual(kinds, [("digest", 3)])
+
+    def test_failed_album_falls_back_to_single_receipts(self):
+        def broken_album(name, *args, **kwargs):
+            if name == "send_media_group":
+                raise RuntimeError("wrong file identifier")
+            return type(self.bot)._call(self.bot, name, *args, **kwargs)
+
+        self.bot._call = broken_album
+        self.enzo.drain_outbox()
+        self.assertEqual(self.enzo.outbox.counts(self.db), {"pending": 3})  # backing off before the retry
+        self.assertEqual(self.outbox_rows(), [])
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE outbox SET next_attempt_at = 0")
+        self.enzo.drain_outbox()
+        self.assertEqual(len(self.bot.of("send_photo")), 3)
+        self.assertEqual(self.outbox_rows(), [])
+
+    def test_long_caption_is_cut_to_the_limit(self):
+        rows = [row(i, 0) for i in range(10)]
+        with mock.patch.object(self.enzo, "db_get_order", return_value={"id": "x" * 40, "username": "u" * 60,
+                                                                        "service": "TikTok", "package_qty": "1K", "price": "1"}):
+            caption = self.enzo.digest_caption(rows)
+        self.assertEqual(len(caption), self.enzo.MAX_CAPTION_LEN)
+        self.assertTrue(caption.endswith("…"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+# Run from the repository root: python -m unittest
+# telebot dispatches a message to the first handler whose filters match, so a command
+# registered after the text catch-all is never reached.
+import time
+import unittest
+
+from tests.support import ENZO_ADMIN as ADMIN, import_enzo, telebot
+
+ADMIN_COMMANDS = {
+    "orders": "cmd_orders", "approve": "cmd_approve", "done": "cmd_done", "find": "cmd_find",
+    "export": "cmd_export", "backup": "cmd_backup", "outbox": "cmd_outbox", "stats": "cmd_stats",
+    "cachestats": "cmd_cachestats", "load": "cmd_load", "memstats": "cmd_memstats", "profile": "cmd_profile",
+}
+
+
+@unittest.skipIf(telebot is None, "pyTelegramBotAPI is not installed")
+class EnzoDispatchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.enzo = import_enzo()
+
+    def first_handler(self, text):
+        message = {"message_id": 1, "date": int(time.time()), "text": text,
+                   "chat": {"id": ADMIN, "type": "private"}, "from": {"id": ADMIN, "is_bot": False, "first_name": "a"}}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        m = telebot.types.Message.de_json(message)
+        bot = self.enzo.bot
+        for handler in bot.message_handlers:
+            if bot._test_message_handler(handler, m):
+                return handler["function"].__name__
+        return None
+
+    def test_admin_commands_reach_their_handlers(self):
+        for command, name in ADMIN_COMMANDS.items():
+            with self.subTest(command=command):
+                self.assertEqual(self.first_handler(f"/{command} x"), name)
+
+    def test_customer_commands_reach_their_handlers(self):
+        self.assertEqual(self.first_handler("/start"), "handle_start")
+        self.assertEqual(self.first_handler("/myorders"), "cmd_myorders")
+
+    def test_plain_text_goes_to_text_router(self):
+        self.assertEqual(self.first_handler("TikTok"), "text_router")
+        self.assertEqual(self.first_handler("❌ Cancel"), "text_cancel")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# Run from the repository root: python -m unittest
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import cache
+from tests.support import ENZO_ADMIN, EnzoTestCase, tap
+
+BUYER = 500
+
+
+class DoubleTapTest(EnzoTestCase):
+    def press(self, user_id, data, message_id=1):
+        self.bot.calls.clear()
+        self.enzo.callback_router(tap(user_id, data, message_id))
+        return [name for name, _, _ in self.bot.calls]
+
+    def test_repeated_tap_is_acknowledged_but_not_run(self):
+        oid = self.order(status="created")
+        self.assertIn("edit_message_text", self.press(BUYER, f"pay|{oid}|telebirr"))
+        self.assertEqual(self.press(BUYER, f"pay|{oid}|telebirr"), ["answer_callback_query"])
+        self.assertEqual(self.bot.of("answer_callback_query")[0][0][1:], ())  # no toast text
+        self.assertEqual(self.status(oid), "awaiting_receipt")
+
+    def test_tap_runs_again_once_the_window_has_passed(self):
+        oid = self.order(status="created")
+        self.press(BUYER, f"pay|{oid}|telebirr")
+        later = cache.time.monotonic() + self.enzo.CALLBACK_DEDUP_TTL + 1
+        with mock.patch.object(cache.time, "monotonic", return_value=later):
+            self.assertIn("edit_message_text", self.press(BUYER, f"pay|{oid}|cbe"))
+        self.assertEqual(self.enzo.db_get_order(oid)["payment_method"], "cbe")
+
+    def test_navigation_is_never_deduplicated(self):
+        self.press(BUYER, "svc|TikTok")
+        self.assertIn("edit_message_text", self.press(BUYER, "svc|TikTok"))
+
+    def test_stale_button_on_another_message_is_refused(self):
+        oid = self.order(status="pending_verification")
+        self.press(BUYER, f"pay|{oid}|cbe", message_id=2)
+        self.assertEqual(self.bot.of("send_message")[0][0][1], "This order is already being processed.")
+        self.assertEqual(self.status(oid), "pending_verification")
+        self.assertEqual(self.enzo.db_get_order(oid)["payment_method"], "telebirr")
+
+    def test_cancel_only_before_an_admin_acts(self):
+        waiting, taken = self.order(status="pending_verification"), self.order(status="processing")
+        self.press(BUYER, f"cancel_order|{waiting}")
+        self.assertEqual(self.status(waiting), "cancelled")
+        self.press(BUYER, f"cancel_order|{taken}")
+        self.assertEqual(self.bot.of("send_message")[0][0][1], "This order can no longer be cancelled.")
+        self.assertEqual(self.status(taken), "processing")
+
+    def test_two_admins_only_one_wins(self):
+        self.patch("ADMIN_IDS", [ENZO_ADMIN, 43])
+        oid = self.order(status="pending_verification")
+        self.press(ENZO_ADMIN, f"adm|approve|{oid}", message_id=10)
+        self.press(43, f"adm|reject|{oid}", message_id=11)
+        self.assertEqual(self.status(oid), "processing")
+        self.assertEqual(self.bot.of("send_message")[0][0][1], f"Order {oid} is already processing.")
+        self.assertEqual([r["text"] for r in self.outbox_rows()], [f"🔄 Your order {oid} is now being processed."])
+
+    def test_concurrent_transitions_have_one_winner(self):
+        oid = self.order(status="pending_verification")
+        results, start = [], threading.Barrier(8)
+
+        def race(to_status):
+            start.wait()
+            results.append(self.enzo.db_transition_order(oid, ("pending_verification",), to_status))
+
+        threads = [threading.Thread(target=race, args=("processing" if i % 2 else "rejected",)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results.count(True), 1)
+
+    def test_second_receipt_is_not_queued_twice(self):
+        oid = self.order(status="awaiting_receipt")
+        receipt = SimpleNamespace(from_user=SimpleNamespace(id=BUYER), chat=SimpleNamespace(id=BUYER),
+                                  photo=[SimpleNamespace(file_id="r1")], document=None)
+        for _ in range(2):
+            self.enzo.set_state(BUYER, "waiting_for_receipt", oid)
+            self.enzo.media_handler(receipt)
+        self.assertEqual(len(self.outbox_rows()), 1)
+        self.assertEqual(self.bot.of("send_message")[-1][0][1],
+                         "We already have a receipt for this order. We'll notify you once it's checked.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# Run from the repository root: python -m unittest
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import export
+
+DAY_MS = 86400 * 1000
+JAN_1 = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class DayBoundsTest(unittest.TestCase):
+    def test_inclusive_days_in_utc(self):
+        self.assertEqual(export.day_bounds("2025-01-01", "2025-01-01"), (JAN_1, JAN_1 + DAY_MS))
+
+    def test_days_follow_the_timezone(self):
+        since, _ = export.day_bounds("2025-01-01", tz=ZoneInfo("Africa/Addis_Ababa"))  # UTC+3
+        self.assertEqual(since, JAN_1 - 3 * 3600 * 1000)
+
+    def test_open_ended(self):
+        self.assertEqual(export.day_bounds(), (None, None))
+
+
+class ParseCommandArgsTest(unittest.TestCase):
+    def test_any_order(self):
+        self.assertEqual(export.parse_command_args(["jsonl", "done", "2025-01-01", "2025-01-31"], "orders"),
+                         {"fmt": "jsonl", "since": "2025-01-01", "until": "2025-01-31", "status": "done"})
+
+    def test_keywords_from_the_usage_text(self):
+        self.assertEqual(export.parse_command_args(["from", "2025-01-01", "to", "2025-01-31"], "orders"),
+                         {"fmt": "csv", "since": "2025-01-01", "until": "2025-01-31", "status": None})
+        self.assertEqual(export.parse_command_args(["posted", "to", "2025-01-31", "jsonl"], "promotions"),
+                         {"fmt": "jsonl", "since": None, "until": "2025-01-31", "status": "posted"})
+
+    def test_defaults(self):
+        self.assertEqual(export.parse_command_args([], "orders"), {"fmt": "csv", "since": None, "until": None, "status": None})
+
+    def test_bad_input(self):
+        for args in (["2025-13-01"], ["2025-01-01", "2025-01-02", "2025-01-03"], ["from"], ["to", "soon"],
+                     ["finished"], ["done", "rejected"]):
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                export.parse_command_args(args, "orders")
+
+    def test_statuses_are_per_table(self):
+        self.assertEqual(export.parse_command_args(["pending_verification"], "orders")["status"], "pending_verification")
+        with self.assertRaises(ValueError):
+            export.parse_command_args(["pending_verification"], "promotions")
+
+
+class ExportTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, "bot.db")
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("CREATE TABLE orders (id TEXT PRIMARY KEY, service TEXT, status TEXT, created_at INTEGER)")
+            conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)",
+                             [(f"o{i}", "TikTok", "done" if i % 2 else "rejected", JAN_1 + i * DAY_MS) for i in range(10)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_csv_with_filters_and_readable_timestamps(self):
+        paths, count = export.export_table(self.db, "orders", self.tmp.name, "csv", "2025-01-02", "2025-01-05", "done")
+        self.assertEqual(count, 2)
+        self.assertEqual([os.path.basename(p) for p in paths], ["orders_2025-01-02_2025-01-05_done.csv.gz"])
+        with gzip.open(paths[0], "rt", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["id", "service", "status", "created_at"])
+        self.assertEqual(rows[1], ["o1", "TikTok", "done", "2025-01-02T00:00:00+00:00"])
+
+    def test_jsonl(self):
+        paths, count = export.export_table(self.db, "orders", self.tmp.name, "jsonl")
+        with gzip.open(paths[0], "rt") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(count, 10)
+        self.assertEqual(rows[0]["id"], "o0")
+
+    def test_empty_export_still_has_a_header(self):
+        paths, count = export.export_table(self.db, "orders", self.tmp.name, status="cancelled")
+        self.assertEqual(count, 0)
+        with gzip.open(paths[0], "rt") as f:
+            self.assertEqual(f.read().strip(), "id,service,status,created_at")
+
+    def test_large_exports_are_split_into_parts(self):
+        with sqlite3.connect(self.db) as conn:
+            conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)",
+                             [(f"x{i}", os.urandom(64).hex(), "done", JAN_1 + i) for i in range(3000)])
+        paths, count = export.export_table(self.db, "orders", self.tmp.name, max_bytes=50 * 1024)
+        self.assertEqual(count, 3010)
+        self.assertGreater(len(paths), 1)
+        total = 0
+        for path in paths:
+            with gzip.open(path, "rt", newline="") as f:
+                total += len(list(csv.reader(f))) - 1  # every part starts with the header
+        self.assertEqual(total, 3010)
+
+    def test_unknown_table_or_format(self):
+        with self.assertRaises(ValueError):
+            export.export_table(self.db, "users", self.tmp.name)
+        with self.assertRaises(ValueError):
+            export.export_table(self.db, "orders", self.tmp.name, fmt="xlsx")
+        with self.assertRaises(ValueError):
+            export.export_table(self.db, "orders", self.tmp.name, status="to")
+
+
+if __name__ == "__main__":
+    unittest.main()
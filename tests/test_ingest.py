@@ -0,0 +1,48 @@
+# Run from the repository root: python -m unittest
+import os
+import tempfile
+import unittest
+
+from ingest import OffsetStore, is_stale
+
+
+class OffsetStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, "bot.db")
+        self.store = OffsetStore(self.db, "enzo")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_checkpoint_only_moves_forward(self):
+        self.assertEqual(self.store.load(), 0)
+        self.store.save(10)
+        self.store.save(7)
+        self.assertEqual(self.store.load(), 10)
+        self.assertEqual(OffsetStore(self.db, "promo").load(), 0)  # names are independent
+
+    def test_pending_returns_stashed_updates_past_the_checkpoint(self):
+        self.store.stash([{"update_id": i, "message": {"text": str(i)}} for i in (3, 1, 2)])
+        self.store.stash([{"update_id": 2, "message": {"text": "again"}}])  # refetched: ignored
+        self.assertEqual([u["update_id"] for u in self.store.pending()], [1, 2, 3])
+        self.store.save(2)
+        self.assertEqual(self.store.pending(), [{"update_id": 3, "message": {"text": "3"}}])
+
+    def test_pending_survives_a_restart(self):
+        self.store.stash([{"update_id": 5}])
+        self.assertEqual(OffsetStore(self.db, "enzo").pending(), [{"update_id": 5}])
+
+
+class IsStaleTest(unittest.TestCase):
+    def test_age_limit(self):
+        self.assertFalse(is_stale(100, 60, now=150))
+        self.assertTrue(is_stale(100, 60, now=161))
+
+    def test_disabled_or_unknown(self):
+        self.assertFalse(is_stale(0, 0, now=10 ** 9))
+        self.assertFalse(is_stale(None, 60, now=10 ** 9))
+
+
+if __name__ == "__main__":
+    unittest.main()
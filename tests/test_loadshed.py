@@ -0,0 +1,58 @@
+# Run from the repository root: python -m unittest
+import time
+import unittest
+
+import loadshed
+from loadshed import CRITICAL, LOW, NORMAL, Pipeline
+
+
+class PipelineTest(unittest.TestCase):
+    def test_level_follows_queue_depth(self):
+        p = Pipeline(degrade_at=2, shed_at=4)
+        tickets = [p.admit(NORMAL) for _ in range(3)]
+        self.assertEqual(p.level(), 1)  # third admit saw two already queued
+        tickets += [p.admit(NORMAL) for _ in range(2)]
+        self.assertEqual(p.level(), 2)
+        for t in tickets:
+            p.done(t)
+        self.assertEqual(p.level(), 0)
+
+    def test_backlog_counts_towards_depth(self):
+        p = Pipeline(degrade_at=50, shed_at=200)
+        self.assertIsNone(p.admit(LOW, backlog=250))
+        self.assertEqual(p.stats()["queued"], 250)
+
+    def test_only_low_priority_is_shed(self):
+        p = Pipeline(degrade_at=1, shed_at=1)
+        self.assertIsNotNone(p.admit(CRITICAL, backlog=10))
+        self.assertIsNotNone(p.admit(NORMAL, backlog=10))
+        self.assertIsNone(p.admit(LOW, backlog=10))
+        st = p.stats()
+        self.assertEqual(st["shed"], {"critical": 0, "normal": 0, "low": 1})
+        self.assertEqual(st["admitted"], {"critical": 1, "normal": 1, "low": 0})
+
+    def test_lag_degrades(self):
+        p = Pipeline(degrade_lag=5, shed_lag=1000)
+        for _ in range(20):
+            p.done(p.admit(NORMAL, sent_at=time.time() - 60))
+            p.admit(NORMAL, sent_at=time.time() - 60)  # keep one queued so lag is not decayed
+        self.assertTrue(p.degraded())
+        self.assertEqual(p.level(), 1)
+
+    def test_done_records_latency(self):
+        p = Pipeline()
+        p.done(p.admit(CRITICAL))
+        st = p.stats()
+        self.assertEqual(st["latency"]["critical"]["samples"], 1)
+        self.assertEqual(st["queued"], 0)
+
+    def test_format_stats(self):
+        p = Pipeline()
+        p.note("welcome_gif_skipped", 3)
+        text = loadshed.format_stats(p.stats())
+        self.assertTrue(text.startswith("Load: normal (0 queued, 0.0s behind)"))
+        self.assertIn("Degraded: welcome_gif_skipped 3", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# Run from the repository root: python -m unittest
+import sys
+import unittest
+
+import memaudit
+
+
+class Slotted:
+    __slots__ = ("stage", "order_id")
+
+    def __init__(self, stage=None, order_id=None):
+        self.stage, self.order_id = stage, order_id
+
+
+class Child(Slotted):
+    __slots__ = "extra"
+
+
+class Private:
+    __slots__ = ("__secret",)
+
+    def __init__(self, value):
+        self.__secret = value
+
+
+class Plain:
+    def __init__(self, stage, order_id):
+        self.stage, self.order_id = stage, order_id
+
+
+class DeepSizeTest(unittest.TestCase):
+    def test_slot_values_are_counted(self):
+        payload = "x" * 1000
+        rec = Slotted("awaiting_link", payload)
+        self.assertEqual(memaudit.deep_size(rec),
+                         sys.getsizeof(rec) + sys.getsizeof("awaiting_link") + sys.getsizeof(payload))
+
+    def test_unset_slots_are_skipped(self):
+        rec = Slotted.__new__(Slotted)
+        self.assertEqual(memaudit.deep_size(rec), sys.getsizeof(rec))
+
+    def test_inherited_and_string_slots(self):
+        rec = Child("s", None)
+        rec.extra = "y" * 1000
+        self.assertGreaterEqual(memaudit.deep_size(rec), sys.getsizeof(rec) + sys.getsizeof(rec.extra))
+
+    def test_private_slots(self):
+        rec = Private("z" * 1000)
+        self.assertGreater(memaudit.deep_size(rec), 1000)
+
+    def test_slots_beat_a_dict_per_record(self):
+        slotted = [Slotted(sys.intern("awaiting_receipt"), f"o{i}") for i in range(100)]
+        plain = [Plain("awaiting_receipt", f"o{i}") for i in range(100)]
+        self.assertLess(memaudit.deep_size(slotted), memaudit.deep_size(plain))
+
+    def test_shared_objects_count_once(self):
+        shared = "s" * 1000
+        seen = set()
+        first = memaudit.deep_size(Slotted(shared), seen)
+        second = memaudit.deep_size(Slotted(shared), seen)
+        self.assertLess(second, first - 900)
+
+    def test_cycles_and_classes(self):
+        a = {"name": "a"}
+        a["self"] = a
+        self.assertGreater(memaudit.deep_size(a), 0)
+        self.assertEqual(memaudit.deep_size([Slotted]), sys.getsizeof([Slotted]))
+
+
+class ReportTest(unittest.TestCase):
+    def test_report_lines(self):
+        audit = memaudit.MemoryAudit()
+        states = {i: Slotted("s", i) for i in range(10)}
+        audit.register("user state", lambda: states)
+        audit.register("broken", lambda: None)
+        lines = audit.report().splitlines()
+        self.assertTrue(lines[0].startswith("user state: 10 entries, "))
+        self.assertEqual(lines[1], "broken: unavailable (TypeError)")
+        self.assertTrue(lines[-1].startswith("Process: "))
+
+    def test_fmt_bytes(self):
+        self.assertEqual(memaudit.fmt_bytes(512), "512 B")
+        self.assertEqual(memaudit.fmt_bytes(1536), "1.5 KiB")
+        self.assertEqual(memaudit.fmt_bytes(3 * 1024 ** 3), "3.0 GiB")
+
+
+if __name__ == "__main__":
+    unittest.main()
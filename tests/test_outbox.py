@@ -0,0 +1,66 @@
+# Run from the repository root: python -m unittest
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import outbox
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, "outbox.db")
+        with sqlite3.connect(self.db) as conn:
+            outbox.init_outbox(conn.cursor())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def enqueue(self, *rows):
+        with sqlite3.connect(self.db) as conn:
+            outbox.enqueue(conn.cursor(), rows)
+
+    def test_enqueued_rows_are_due_in_order(self):
+        self.enqueue(outbox.message(1, "first"), outbox.message(2, "second", kind="photo", photo_file_id="f"))
+        rows = outbox.fetch_due(self.db)
+        self.assertEqual([(r["chat_id"], r["text"], r["kind"]) for r in rows], [(1, "first", "message"), (2, "second", "photo")])
+        self.assertEqual(rows[1]["photo_file_id"], "f")
+
+    def test_enqueue_joins_the_callers_transaction(self):
+        conn = sqlite3.connect(self.db)
+        outbox.enqueue(conn.cursor(), [outbox.message(1, "x")])
+        conn.rollback()
+        conn.close()
+        self.assertEqual(outbox.fetch_due(self.db), [])
+
+    def test_sent_rows_are_deleted(self):
+        self.enqueue(outbox.message(1, "a"), outbox.message(1, "b"))
+        rows = outbox.fetch_due(self.db)
+        outbox.mark_sent(self.db, [rows[0]["id"]])
+        self.assertEqual([r["text"] for r in outbox.fetch_due(self.db)], ["b"])
+
+    def test_failures_back_off_then_go_dead(self):
+        self.enqueue(outbox.message(1, "a"))
+        row = outbox.fetch_due(self.db)[0]
+        self.assertFalse(outbox.mark_failed(self.db, row, "timeout", max_attempts=2, backoff_base=60))
+        self.assertEqual(outbox.fetch_due(self.db), [])  # not due again for a minute
+        row["attempts"] = 1
+        self.assertTrue(outbox.mark_failed(self.db, row, "timeout", max_attempts=2, backoff_base=60))
+        self.assertEqual(outbox.counts(self.db), {"dead": 1})
+        self.assertEqual(outbox.retry_dead(self.db), 1)
+        self.assertEqual(len(outbox.fetch_due(self.db)), 1)
+
+    def test_permanent_failure_goes_dead_at_once(self):
+        self.enqueue(outbox.message(1, "a"))
+        row = outbox.fetch_due(self.db)[0]
+        self.assertTrue(outbox.mark_failed(self.db, row, "blocked", max_attempts=5, backoff_base=1, permanent=True))
+
+    def test_deferred_chats_wait_for_a_later_sweep(self):
+        self.enqueue(outbox.message(1, "admin"), outbox.message(2, "customer"))
+        rows = outbox.fetch_due(self.db, defer_chats=(1,), defer_since=0)
+        self.assertEqual([r["chat_id"] for r in rows], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+# Run from the repository root: python -m unittest
+import asyncio
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+import profiling
+
+
+def functions(stats):
+    return {name for _, _, name in stats.stats}
+
+
+def other_task_work():
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        pass
+
+
+def handler_work():
+    return sum(range(1000))
+
+
+def block_loop():
+    time.sleep(0.4)
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.prof = profiling.Profiler(self.dir, sample_rate=1.0)
+
+    def test_sync_handler(self):
+        wrapped = self.prof.wrap(lambda x: handler_work() + x, name="calc")
+        self.assertEqual(wrapped(1), 499501)
+        calls, sampled, total, worst = self.prof.calls["calc"]
+        self.assertEqual((calls, sampled), (1, 1))
+        self.assertIn("handler_work", functions(self.prof.stats["calc"]))
+
+    def test_unsampled_calls_are_only_timed(self):
+        prof = profiling.Profiler(self.dir, sample_rate=0.0)
+        wrapped = prof.wrap(handler_work)
+        for _ in range(3):
+            wrapped()
+        self.assertEqual(prof.calls["handler_work"][:2], [3, 0])
+        self.assertEqual(prof.stats, {})
+
+    def test_async_result_and_exceptions_pass_through(self):
+        async def handler(fut):
+            try:
+                return await fut
+            except KeyError:
+                return "caught"
+
+        wrapped = self.prof.wrap(handler, name="h")
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            ok, bad = loop.create_future(), loop.create_future()
+            loop.call_later(0.01, ok.set_result, 5)
+            loop.call_later(0.01, bad.set_exception, KeyError("x"))
+            return await wrapped(ok), await wrapped(bad)
+
+        self.assertEqual(asyncio.run(run()), (5, "caught"))
+        self.assertEqual(self.prof.calls["h"][:2], [2, 2])
+
+    def test_time_in_other_tasks_is_not_charged(self):
+        async def handler():
+            handler_work()
+            await asyncio.sleep(0.1)
+            return handler_work()
+
+        async def neighbour():
+            await asyncio.sleep(0.02)
+            other_task_work()
+
+        async def run():
+            await asyncio.gather(self.prof.wrap(handler, name="h")(), neighbour())
+
+        asyncio.run(run())
+        seen = functions(self.prof.stats["h"])
+        self.assertIn("handler_work", seen)
+        self.assertNotIn("other_task_work", seen)
+
+    def test_cancelled_handler_cleans_up(self):
+        cleaned = []
+
+        async def handler():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                cleaned.append(True)
+
+        async def run():
+            task = asyncio.ensure_future(self.prof.wrap(handler, name="slow")())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertEqual(cleaned, [True])
+        self.assertEqual(self.prof.calls["slow"][0], 1)
+        self.assertFalse(self.prof.busy.locked())
+
+    def test_overlapping_samples_both_finish(self):
+        async def handler(n):
+            for _ in range(3):
+                handler_work()
+                await asyncio.sleep(0)
+            return n
+
+        wrapped = self.prof.wrap(handler, name="h")
+
+        async def run():
+            return await asyncio.gather(*(wrapped(i) for i in range(5)))
+
+        self.assertEqual(asyncio.run(run()), [0, 1, 2, 3, 4])
+        self.assertEqual(self.prof.calls["h"][0], 5)
+
+    def test_loop_stall_is_charged_to_the_blocking_code(self):
+        async def run():
+            watcher = asyncio.ensure_future(self.prof.watch_loop(threshold=0.1))
+            await asyncio.sleep(0.1)
+            block_loop()
+            await asyncio.sleep(0.1)
+            watcher.cancel()
+
+        with self.assertLogs(profiling.logger, "WARNING"):
+            asyncio.run(run())
+        sites = list(self.prof.blocks)
+        self.assertEqual(len(sites), 1)
+        self.assertIn("test_profiling.py", sites[0])
+        self.assertIn("block_loop", sites[0])
+        self.assertIn("Event loop stalls:", self.prof.report())
+
+    def test_dump(self):
+        self.prof.wrap(handler_work, name="cmd/start")()
+        path = self.prof.dump()
+        self.assertTrue(os.path.exists(os.path.join(path, "summary.txt")))
+        prof_file = os.path.join(path, "cmd_start.prof")
+        self.assertIn("handler_work", functions(pstats.Stats(prof_file)))
+
+
+if __name__ == "__main__":
+    unittest.main()
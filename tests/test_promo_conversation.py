@@ -0,0 +1,88 @@
+# Run from the repository root: python -m unittest
+# /newpromo end to end through route_message, the way PTB delivers each message.
+import asyncio
+import sqlite3
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+from tests.support import PromoBotTestCase, command
+
+USER = 500
+
+
+def message(user_id, text=None, photo=None, caption=None, sticker=False):
+    update, context = command(user_id, text or "")
+    msg = update.message
+    msg.text, msg.caption = text, caption
+    msg.photo = [SimpleNamespace(file_id=f"{photo}-small"), SimpleNamespace(file_id=photo)] if photo else []
+    msg.video = msg.document = None
+    msg.sticker = sticker
+    return update, context
+
+
+class ConversationTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("SESSIONS", {})
+        self.patch("PROMO_LIMITER", self.pb.new_promo_limiter())
+
+    def say(self, **kwargs):
+        update, context = message(USER, **kwargs)
+        asyncio.run(self.pb.route_message(update, context))
+        return update.replies
+
+    def newpromo(self):
+        update, context = command(USER, "/newpromo")
+        asyncio.run(self.pb.newpromo(update, context))
+
+    def promo(self):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("SELECT content_type, media_file_id, caption, price, scheduled_at, payment_proof, status "
+                                "FROM promotions").fetchall()
+
+    def test_text_promo_from_draft_to_review(self):
+        self.newpromo()
+        self.assertTrue(self.say(text="Grand opening!")[0].startswith("Got it."))
+        self.assertTrue(self.say(text="10 | 2025-11-12 15:00")[0].startswith("Promo saved as ID #1. Scheduled for 2025-11-12 15:00"))
+        self.assertEqual(self.pb.load_session(USER).state, self.pb.STATE_PROOF)
+        self.assertTrue(self.say(text=" TX-123 ")[0].startswith("Payment proof saved."))
+        when = int(datetime(2025, 11, 12, 15, 0, tzinfo=self.pb.DEFAULT_ZONE).timestamp() * 1000)
+        self.assertEqual(self.promo(), [("text", None, "Grand opening!", 10.0, when, "TX-123", "pending")])
+        self.assertEqual(self.outbox_texts(7), ["New payment proof for promo #1. Review with /pending"])
+        self.assertIsNone(self.pb.load_session(USER))
+
+    def test_photo_keeps_the_largest_size_and_its_caption(self):
+        self.newpromo()
+        self.say(photo="big", caption="Sale")
+        self.say(text="standard")
+        self.say(photo="receipt")
+        self.assertEqual(self.promo(), [("photo", "big", "Sale", 0.0, None, "receipt", "pending")])
+
+    def test_unusable_message_keeps_the_state(self):
+        self.newpromo()
+        self.assertEqual(self.say(sticker=True), ["Please send text, a photo, a video or a document."])
+        self.assertEqual(self.pb.load_session(USER).state, self.pb.STATE_DRAFT)
+
+    def test_draft_survives_a_restart(self):
+        self.newpromo()
+        self.say(text="Grand opening!")
+        self.pb.SESSIONS.clear()  # a fresh process only has promo_sessions
+        self.assertTrue(self.say(text="10")[0].startswith("Promo saved as ID #1."))
+
+    def test_abandoned_draft_expires(self):
+        self.newpromo()
+        self.pb.SESSIONS[USER].updated_at -= (self.pb.DRAFT_TIMEOUT + 1) * 1000
+        self.assertEqual(self.say(text="Grand opening!"), ["Sorry, I didn't understand that. Use /help."])
+        self.assertIsNone(self.pb.db_load_session(USER))
+
+    def test_cancel_and_messages_without_a_draft(self):
+        self.newpromo()
+        update, context = command(USER, "/cancel")
+        asyncio.run(self.pb.cancel(update, context))
+        self.assertEqual(self.say(text="hello"), ["Sorry, I didn't understand that. Use /help."])
+        self.assertEqual(self.promo(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
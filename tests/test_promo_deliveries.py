@@ -0,0 +1,118 @@
+# Run from the repository root: python -m unittest
+import asyncio
+import sqlite3
+import unittest
+from types import SimpleNamespace
+
+from tests.support import FakeBot, PromoBotTestCase, command
+
+OWNER = 500
+
+
+class DeliveryLedgerTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("CHANNEL_IDS", [-1, -2, -3])
+        self.promo_id = self.pb.db_create_promo(OWNER, "text", None, "Buy now", 10)
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE promotions SET status = 'approved' WHERE id = ?", (self.promo_id,))
+
+    def publish(self, bot):
+        promo = next(p for p in self.pb.db_get_due_promos() if p[0] == self.promo_id)
+        asyncio.run(self.pb.publish_promo(SimpleNamespace(bot=bot), promo))
+
+    def status(self):
+        return self.pb.db_get_promo(self.promo_id)[8]
+
+    def delivery(self, channel_id):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("SELECT status, attempts, next_attempt_at, message_id FROM promotion_deliveries "
+                                "WHERE promo_id = ? AND channel_id = ?", (self.promo_id, channel_id)).fetchone()
+
+    def test_resume_sends_only_the_missing_channels(self):
+        # a crash after the first channel went out
+        self.pb.db_ensure_deliveries(self.promo_id, self.pb.CHANNEL_IDS)
+        self.pb.db_delivery_sent(self.promo_id, -1, 55)
+        bot = FakeBot()
+        self.publish(bot)
+        self.assertEqual(sorted(ch for ch, _ in bot.sent), [-3, -2])
+        self.assertEqual(self.status(), "posted")
+        self.assertEqual(self.outbox_texts(OWNER), [f"Your promo #{self.promo_id} has been posted."])
+
+    def test_failed_channel_backs_off(self):
+        self.patch("DELIVERY_BACKOFF_BASE", 30)
+        self.publish(FakeBot(failing={-2}))
+        status, attempts, retry_at, _ = self.delivery(-2)
+        self.assertEqual((status, attempts), ("pending", 1))
+        self.assertAlmostEqual(retry_at - self.pb.now_ms(), 30_000, delta=2000)
+        self.assertEqual(self.pb.db_due_deliveries(self.promo_id), [])  # not before the backoff
+        self.assertEqual(self.status(), "approved")
+        self.assertEqual(self.outbox_texts(OWNER), [])
+
+        self.pb.db_delivery_failed(self.promo_id, -2, attempts, "again")
+        self.assertAlmostEqual(self.delivery(-2)[2] - self.pb.now_ms(), 60_000, delta=2000)  # doubled
+
+    def test_out_of_attempts_is_reported_not_posted(self):
+        self.patch("DELIVERY_BACKOFF_BASE", 0)
+        bot = FakeBot(failing={-2})
+        for _ in range(self.pb.DELIVERY_MAX_ATTEMPTS):
+            self.publish(bot)
+        self.assertEqual(self.delivery(-2)[:2], ("failed", self.pb.DELIVERY_MAX_ATTEMPTS))
+        self.assertEqual(self.status(), "partially_posted")
+        self.assertEqual(self.outbox_texts(OWNER), [])
+        [notice] = self.outbox_texts(7)
+        self.assertIn("-2: channel unreachable", notice)
+        self.assertEqual(self.pb.db_get_due_promos(), [])  # parked until /repost
+
+        update, context = command(7, f"/repost {self.promo_id}")
+        asyncio.run(self.pb.repost(update, context))
+        self.assertEqual(self.status(), "approved")
+        self.assertEqual(self.delivery(-2)[:2], ("pending", 0))
+        self.publish(FakeBot())
+        self.assertEqual(self.status(), "posted")
+        self.assertEqual(self.outbox_texts(OWNER), [f"Your promo #{self.promo_id} has been posted."])
+
+    def test_nothing_sent_is_post_failed(self):
+        self.patch("DELIVERY_BACKOFF_BASE", 0)
+        bot = FakeBot(failing={-1, -2, -3})
+        for _ in range(self.pb.DELIVERY_MAX_ATTEMPTS):
+            self.publish(bot)
+        self.assertEqual(self.status(), "post_failed")
+        self.assertEqual(self.outbox_texts(OWNER), [])
+
+    def test_edit_and_delete_reach_every_sent_message(self):
+        bot = FakeBot()
+        self.publish(bot)
+        ids = {ch: self.delivery(ch)[3] for ch in (-1, -2, -3)}
+
+        update, context = command(7, f"/editpost {self.promo_id} New text", bot)
+        asyncio.run(self.pb.edit_post(update, context))
+        self.assertEqual(sorted(bot.edited), sorted((ch, mid, "New text") for ch, mid in ids.items()))
+        self.assertEqual(self.pb.db_get_promo(self.promo_id)[5], "New text")
+
+        update, context = command(7, f"/deletepost {self.promo_id}", bot)
+        asyncio.run(self.pb.delete_post(update, context))
+        self.assertEqual(sorted(bot.deleted), sorted(ids.items()))
+        self.assertEqual({self.delivery(ch)[0] for ch in ids}, {"deleted"})
+        self.assertEqual(update.replies, [f"Promo #{self.promo_id} deleted from 3 channel(s), 0 failed."])
+
+    def test_bad_promo_id_gets_the_usage(self):
+        for handler, text in ((self.pb.edit_post, "/editpost abc x"), (self.pb.delete_post, "/deletepost abc")):
+            update, context = command(7, text)
+            asyncio.run(handler(update, context))
+            self.assertTrue(update.replies[0].startswith("Usage:"), update.replies)
+
+    def test_archived_promo_is_not_edited(self):
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE promotions SET status = 'posted', created_at = 0 WHERE id = ?", (self.promo_id,))
+        self.assertEqual(self.pb.archive.archive_rows(self.db, "promotions", 90), 1)
+        bot = FakeBot()
+        update, context = command(7, f"/editpost {self.promo_id} New text", bot)
+        asyncio.run(self.pb.edit_post(update, context))
+        self.assertEqual(update.replies, [f"Promo #{self.promo_id} is archived and can no longer be edited."])
+        self.assertEqual(bot.edited, [])
+        self.assertEqual(self.pb.db_get_promo(self.promo_id)[5], "Buy now")
+
+
+if __name__ == "__main__":
+    unittest.main()
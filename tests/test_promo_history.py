@@ -0,0 +1,93 @@
+# Run from the repository root: python -m unittest
+import asyncio
+import sqlite3
+import unittest
+from types import SimpleNamespace
+
+from tests.support import FakeBot, PromoBotTestCase, command
+
+USER = 500
+
+
+class MyPromosTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("HISTORY_PAGE_SIZE", 4)
+        self.bot = FakeBot()
+
+    def create(self, n, caption="promo"):
+        return [self.pb.db_create_promo(USER, "text", None, f"{caption} {i}", 5) for i in range(n)]
+
+    def my_promos(self):
+        update, context = command(USER, "/my_promos", bot=self.bot)
+        asyncio.run(self.pb.my_promos(update, context))
+
+    def tap(self, data):
+        answers = []
+
+        async def answer(text=None, **kwargs):
+            answers.append(text)
+
+        update = SimpleNamespace(callback_query=SimpleNamespace(data=data, answer=answer),
+                                 effective_user=SimpleNamespace(id=USER), effective_chat=SimpleNamespace(id=USER))
+        asyncio.run(self.pb.my_promos_callback(update, SimpleNamespace(bot=self.bot)))
+        return answers
+
+    def button(self):
+        markup = self.bot.sent[-1][1]["reply_markup"]
+        return markup.inline_keyboard[0][0].callback_data if markup else None
+
+    def shown_ids(self):
+        return [int(line.split(" | ")[0][1:]) for _, sent in self.bot.sent
+                for line in sent["text"].split("\n") if line.startswith("#")]
+
+    def test_pages_walk_every_promo_once_newest_first(self):
+        ids = self.create(10)
+        self.my_promos()
+        while (data := self.button()) is not None:
+            self.assertEqual(self.tap(data), [None])
+        self.assertEqual(self.shown_ids(), ids[::-1])
+        self.assertEqual(len(self.bot.sent), 3)
+
+    def test_same_millisecond_promos_are_not_skipped(self):
+        ids = self.create(6)
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE promotions SET created_at = 1700000000000")
+        self.my_promos()
+        self.tap(self.button())
+        self.assertEqual(self.shown_ids(), ids[::-1])
+
+    def test_first_page_cache_follows_new_promos(self):
+        self.create(2)
+        self.my_promos()
+        self.my_promos()
+        self.assertEqual(self.pb.HISTORY_CACHE.stats()["hits"], 1)
+        new_id = self.pb.db_create_promo(USER, "text", None, "fresh", 5)
+        self.bot.sent.clear()
+        self.my_promos()
+        self.assertEqual(self.shown_ids()[0], new_id)
+        self.pb.reject_promo(new_id, "no")
+        self.bot.sent.clear()
+        self.my_promos()
+        self.assertIn(f"#{new_id} | text | rejected", self.bot.sent[0][1]["text"])
+
+    def test_long_captions_stay_under_the_message_limit(self):
+        self.patch("HISTORY_PAGE_SIZE", 50)
+        self.create(50, caption="x" * 200)
+        self.my_promos()
+        self.assertGreater(len(self.bot.sent), 1)
+        self.assertTrue(all(len(sent["text"]) <= self.pb.MAX_MESSAGE_LEN for _, sent in self.bot.sent))
+        self.assertEqual(len(self.shown_ids()), 50)
+
+    def test_split_messages(self):
+        self.assertEqual(self.pb.split_messages(["a", "b", "c"], limit=4), ["a\n\nb", "c"])
+        self.assertEqual(self.pb.split_messages(["x" * 10], limit=4), ["xxxx"])
+
+    def test_empty_and_bad_callback(self):
+        self.my_promos()
+        self.assertEqual(self.bot.sent[0][1]["text"], "You have no promotions.")
+        self.assertEqual(self.tap("mp|abc"), ["Bad data."])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Run from the repository root: python -m unittest
+# A database written by the ISO-string version of promo_bot, brought up to epoch milliseconds.
+import sqlite3
+import unittest
+from datetime import datetime, timezone
+
+from tests.support import PromoBotTestCase
+
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, tg_id INTEGER UNIQUE, name TEXT, registered_at TEXT);
+CREATE TABLE promotions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, tg_user_id INTEGER, content_type TEXT,
+    media_file_id TEXT, caption TEXT, price REAL DEFAULT 0, payment_proof TEXT, status TEXT,
+    admin_note TEXT, scheduled_at TEXT, created_at TEXT
+);
+"""
+
+
+def ms(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class EpochMigrationTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.legacy = self.db.replace("promo.db", "legacy.db")
+        with sqlite3.connect(self.legacy) as conn:
+            conn.executescript(LEGACY_SCHEMA)
+            conn.execute("INSERT INTO users (tg_id, name, registered_at) VALUES (500, 'a', '2025-01-01T08:00:00')")
+            conn.executemany(
+                "INSERT INTO promotions (tg_user_id, caption, status, scheduled_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(500, "one", "posted", "2025-01-03T09:30:00.250000", "2025-01-02T10:00:00"),
+                 (500, "two", "pending", None, "2025-01-02T23:59:59"),
+                 (500, "three", "rejected", "whenever", "2025-01-05T00:00:00+03:00")],
+            )
+        self.patch("DB_PATH", self.legacy)
+
+    def rows(self, sql):
+        with sqlite3.connect(self.legacy) as conn:
+            return conn.execute(sql).fetchall()
+
+    def test_timestamps_become_epoch_ms(self):
+        self.pb.init_db()
+        self.assertEqual(self.rows("SELECT caption, scheduled_at, created_at FROM promotions ORDER BY id"), [
+            ("one", ms(2025, 1, 3, 9, 30, 0, 250000), ms(2025, 1, 2, 10)),
+            ("two", None, ms(2025, 1, 2, 23, 59, 59)),
+            ("three", None, ms(2025, 1, 4, 21)),  # unparseable schedule is dropped; offsets are honoured
+        ])
+        self.assertEqual(self.rows("SELECT registered_at FROM users"), [(ms(2025, 1, 1, 8),)])
+        self.assertEqual(self.rows("SELECT DISTINCT typeof(created_at) FROM promotions"), [("integer",)])
+        self.assertEqual(self.rows("PRAGMA user_version"), [(self.pb.SCHEMA_VERSION,)])
+        self.assertEqual(self.rows("SELECT name FROM sqlite_master WHERE name LIKE '%pre_epoch'"), [])
+
+    def test_counters_are_seeded_from_the_converted_rows(self):
+        self.pb.init_db()
+        self.assertEqual(self.rows("SELECT day, status, n FROM status_counters WHERE tbl = 'promotions' ORDER BY day, status"),
+                         [("2025-01-02", "pending", 1), ("2025-01-02", "posted", 1), ("2025-01-04", "rejected", 1)])
+
+    def test_second_start_changes_nothing(self):
+        self.pb.init_db()
+        before = self.rows("SELECT * FROM promotions ORDER BY id")
+        self.pb.init_db()
+        self.assertEqual(self.rows("SELECT * FROM promotions ORDER BY id"), before)
+        self.assertEqual(self.rows("SELECT SUM(n) FROM status_counters WHERE tbl = 'promotions'"), [(3,)])
+
+    def test_unknown_legacy_columns_keep_the_old_table(self):
+        with sqlite3.connect(self.legacy) as conn:
+            conn.execute("ALTER TABLE promotions ADD COLUMN channel_note TEXT")
+        self.pb.init_db()
+        self.assertEqual(self.rows("SELECT COUNT(*) FROM promotions"), [(3,)])
+        self.assertEqual(self.rows("SELECT COUNT(*) FROM promotions_pre_epoch"), [(3,)])
+
+    def test_new_rows_are_written_as_epoch_ms(self):
+        self.pb.init_db()
+        promo_id = self.pb.db_create_promo(501, "text", None, "fresh", 5)
+        (created_at,), = self.rows(f"SELECT created_at FROM promotions WHERE id = {promo_id}")
+        self.assertIsInstance(created_at, int)
+        self.assertAlmostEqual(created_at, self.pb.now_ms(), delta=5000)
+
+
+if __name__ == "__main__":
+    unittest.main()
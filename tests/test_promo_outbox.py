@@ -0,0 +1,37 @@
+# Run from the repository root: python -m unittest
+import unittest
+
+from tests.support import PromoBotTestCase
+
+OWNER = 500
+
+
+class WakeAfterCommitTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.visible = []
+        test = self
+
+        class Wake:
+            # what the outbox worker would find if it woke up right now
+            def set(self):
+                test.visible.append(len(test.outbox_texts(OWNER)))
+
+        self.patch("OUTBOX_WAKE", Wake())
+        self.promo_id = self.pb.db_create_promo(OWNER, "text", None, "Buy now", 10)
+
+    def test_review_notice_is_committed_before_the_wake(self):
+        self.pb.approve_promo(self.promo_id, 7)
+        self.assertEqual(self.visible, [1])
+
+    def test_posted_notice_is_committed_before_the_wake(self):
+        self.pb.db_mark_posted(self.promo_id, "posted")
+        self.assertEqual(self.visible, [1])
+
+    def test_no_wake_without_a_notice(self):
+        self.pb.db_mark_posted(self.promo_id)
+        self.assertEqual(self.visible, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
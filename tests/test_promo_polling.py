@@ -0,0 +1,91 @@
+# Run from the repository root: python -m unittest
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+from tests.support import PromoBotTestCase
+
+
+def raw_update(update_id, text="/start"):
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": text,
+        "chat": {"id": 1000 + update_id, "type": "private"}, "from": {"id": 1000 + update_id, "is_bot": False, "first_name": "u"}}}
+
+
+class PollingBot:
+    # getUpdates over a fixed list of updates, 100 at a time like Telegram; stops polling when empty
+    def __init__(self, pb, raw):
+        self.pb, self.raw, self.offsets = pb, raw, []
+
+    async def get_updates(self, offset=None, timeout=None, allowed_updates=None):
+        await asyncio.sleep(0)
+        self.offsets.append(offset)
+        batch = [u for u in self.raw if offset is None or u["update_id"] >= offset][:100]
+        if not batch:
+            self.pb.POLL_STOP.set()
+        return [self.pb.Update.de_json(u, None) for u in batch]
+
+
+class PollingTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("OFFSETS", self.pb.ingest.OffsetStore(self.db, "promo"))
+        self.patch("HANDLED", 0)
+        self.backlog, self.handled = [], []
+
+    def run_polling(self, raw, handle_time=0.0005):
+        async def process_update(update):
+            self.backlog.append(self.pb.UPDATE_QUEUE.qsize())  # what load_guard sees
+            self.handled.append(update.update_id)
+            await asyncio.sleep(handle_time)
+
+        async def run():
+            self.patch("UPDATE_QUEUE", asyncio.Queue())
+            self.patch("POLL_STOP", asyncio.Event())
+            bot = PollingBot(self.pb, raw)
+            app = SimpleNamespace(bot=bot, process_update=process_update)
+            worker = asyncio.get_running_loop().create_task(self.pb.handle_updates(app))
+            await self.pb.poll_updates(app)
+            worker.cancel()
+            return bot
+
+        return asyncio.run(run())
+
+    def test_polling_continues_while_handlers_run(self):
+        self.run_polling([raw_update(i) for i in range(1, 401)])
+        self.assertEqual(self.handled, list(range(1, 401)))
+        # more than one getUpdates batch queued up, so LOAD_SHED_AT (200) can be reached
+        self.assertGreater(max(self.backlog), self.pb.LOAD_SHED_AT)
+
+    def test_queue_is_capped(self):
+        self.patch("UPDATE_QUEUE_MAX", 150)
+        self.run_polling([raw_update(i) for i in range(1, 501)])
+        self.assertLess(max(self.backlog), 150 + 100)
+        self.assertEqual(len(self.handled), 500)
+
+    def test_checkpoint_and_inbox_follow_handled_updates(self):
+        self.run_polling([raw_update(i) for i in range(1, 251)])
+        self.assertEqual(self.pb.OFFSETS.load(), 250)
+        self.assertEqual(self.pb.OFFSETS.pending(), [])
+
+    def test_stashed_updates_are_handled_after_a_restart(self):
+        # fetched and confirmed to Telegram, then the process died before handling them
+        self.pb.OFFSETS.save(10)
+        self.pb.OFFSETS.stash([raw_update(i) for i in (11, 12)])
+        bot = self.run_polling([raw_update(13)])
+        self.assertEqual(self.handled, [11, 12, 13])
+        self.assertEqual(bot.offsets[0], 13)  # Telegram is asked only for what came after
+        self.assertEqual(self.pb.OFFSETS.load(), 13)
+
+    def test_stale_text_is_skipped_but_checkpointed(self):
+        self.patch("DROP_UPDATES_OLDER_THAN", 60)
+        old = raw_update(1)
+        old["message"]["date"] -= 3600
+        self.run_polling([old, raw_update(2)])
+        self.assertEqual(self.handled, [2])
+        self.assertEqual(self.pb.OFFSETS.load(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+# Run from the repository root: python -m unittest
+import asyncio
+import sqlite3
+import unittest
+
+from tests.support import PromoBotTestCase, command
+
+
+class PromoQuotaTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("GLOBAL_LIMIT_PER_HOUR", 1)
+        self.patch("PROMO_LIMITER", self.pb.new_promo_limiter())
+
+    def test_drafts_opened_together_share_the_quota(self):
+        # both users get past /newpromo before either has created a promo
+        drafts = {}
+        for user in (1, 2):
+            update, context = command(user, "/newpromo")
+            asyncio.run(self.pb.newpromo(update, context))
+            drafts[user] = self.pb.Session(self.pb.STATE_PRICE, content_type="text", caption=f"promo {user}")
+            self.pb.save_session(user, drafts[user])
+        replies = {}
+        for user in (1, 2):
+            update, context = command(user, "10")
+            asyncio.run(self.pb.on_price(update, context, drafts[user]))
+            replies[user] = update.replies[0]
+        with sqlite3.connect(self.db) as conn:
+            self.assertEqual(conn.execute("SELECT tg_user_id FROM promotions").fetchall(), [(1,)])
+        self.assertTrue(replies[1].startswith("Promo saved as ID #1."))
+        self.assertTrue(replies[2].startswith("We're receiving too many submissions."))
+        self.assertIsNone(self.pb.load_session(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
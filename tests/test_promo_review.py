@@ -0,0 +1,74 @@
+# Run from the repository root: python -m unittest
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from tests.support import PromoBotTestCase, command
+
+OWNER = 500
+
+
+class PromoReviewTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.promo_id = self.pb.db_create_promo(OWNER, "text", None, "Buy now", 10)
+
+    def status(self):
+        return self.pb.db_get_promo(self.promo_id)[8]
+
+    def tap(self, data):
+        answers, keyboards = [], []
+
+        async def answer(text=None, **kwargs):
+            answers.append(text)
+
+        async def edit_message_reply_markup(reply_markup=None, **kwargs):
+            keyboards.append(reply_markup)
+
+        rows = [(self.promo_id,)]
+        query = SimpleNamespace(data=data, answer=answer, edit_message_reply_markup=edit_message_reply_markup,
+                                message=SimpleNamespace(reply_markup=self.pb.review_keyboard(rows, False)))
+        update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=7),
+                                 effective_chat=SimpleNamespace(id=7))
+        asyncio.run(self.pb.review_callback(update, SimpleNamespace(bot=None)))
+        return answers, keyboards
+
+    def test_second_review_is_a_no_op(self):
+        self.assertTrue(self.pb.approve_promo(self.promo_id, 7))
+        self.assertFalse(self.pb.approve_promo(self.promo_id, 7))
+        self.assertFalse(self.pb.reject_promo(self.promo_id, "late"))
+        self.assertEqual(self.status(), "approved")
+        self.assertEqual(len(self.outbox_texts(OWNER)), 1)
+
+    def test_commands_report_promos_that_are_not_pending(self):
+        update, context = command(7, f"/reject {self.promo_id} blurry")
+        asyncio.run(self.pb.reject(update, context))
+        update, context = command(7, f"/approve {self.promo_id}")
+        asyncio.run(self.pb.approve(update, context))
+        self.assertEqual(update.replies, [f"Promo #{self.promo_id} is not pending."])
+        self.assertEqual(self.status(), "rejected")
+
+    def test_commands_validate_the_promo_id(self):
+        update, context = command(7, "/approve abc")
+        asyncio.run(self.pb.approve(update, context))
+        self.assertEqual(update.replies, ["Usage: /approve <promo_id>"])
+
+    def test_double_tap_is_answered_without_a_second_review(self):
+        answers, keyboards = self.tap(f"rv|approve|{self.promo_id}")
+        self.assertEqual(answers, [f"Promo #{self.promo_id} approved."])
+        self.assertEqual(keyboards[0].inline_keyboard, ())  # the handled promo's buttons are gone
+        answers, _ = self.tap(f"rv|reject|{self.promo_id}")
+        self.assertEqual(answers, [f"Promo #{self.promo_id} was already handled."])
+        self.assertEqual(self.status(), "approved")
+        self.assertEqual(len(self.outbox_texts(OWNER)), 1)
+
+    def test_malformed_callback_data(self):
+        for data in ("rv|approve|abc", "rv|approve", "xx|approve|1", "rv|approve|1|2"):
+            with self.subTest(data=data):
+                self.assertEqual(self.tap(data)[0], ["Bad data."])
+        self.assertEqual(self.tap(f"rv|delete|{self.promo_id}")[0], ["Unknown action."])
+        self.assertEqual(self.status(), "pending")
+
+
+if __name__ == "__main__":
+    unittest.main()
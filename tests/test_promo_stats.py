@@ -0,0 +1,76 @@
+# Run from the repository root: python -m unittest
+import asyncio
+import random
+import sqlite3
+import unittest
+
+from tests.support import PromoBotTestCase, command
+
+ADMIN = 7
+
+
+class StatusCountersTest(PromoBotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("REPORTS", self.pb.reporting.ReportingDB(self.db))
+
+    def counters(self):
+        return dict(self.pb.db_status_counts())
+
+    def scanned(self):
+        # what /stats used to compute with a full scan
+        with sqlite3.connect(self.db) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM promotions GROUP BY status").fetchall())
+
+    def test_insert_and_status_changes_move_the_counts(self):
+        a = self.pb.db_create_promo(500, "text", None, "a", 5)
+        b = self.pb.db_create_promo(501, "text", None, "b", 5)
+        self.assertEqual(self.counters(), {"pending": 2})
+        self.pb.approve_promo(a, ADMIN)
+        self.pb.reject_promo(b, "spam")
+        self.assertEqual(self.counters(), {"approved": 1, "rejected": 1})
+        self.pb.db_mark_posted(a)
+        self.assertEqual(self.counters(), {"posted": 1, "rejected": 1})
+
+    def test_counters_agree_with_a_scan(self):
+        rng = random.Random(3)
+        ids = [self.pb.db_create_promo(500 + i, "text", None, f"p{i}", 5) for i in range(60)]
+        for promo_id in ids:
+            roll = rng.random()
+            if roll < 0.3:
+                self.pb.reject_promo(promo_id, "no")
+            elif roll < 0.8:
+                self.pb.approve_promo(promo_id, ADMIN)
+                if roll < 0.6:
+                    self.pb.db_mark_posted(promo_id)
+        self.pb.reject_promo(ids[0], "again")  # no-op review must not count twice
+        self.assertEqual(self.counters(), self.scanned())
+
+    def test_archived_promos_still_count(self):
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("INSERT INTO promotions (tg_user_id, caption, status, created_at) VALUES (500, 'old', 'pending', ?)",
+                         (self.pb.now_ms() - 400 * 86400000,))
+        self.pb.reject_promo(1, "no")
+        self.assertEqual(self.pb.archive.archive_rows(self.db, "promotions", 90), 1)
+        self.assertEqual(self.scanned(), {})
+        self.assertEqual(self.counters(), {"rejected": 1})
+
+    def test_daily_breakdown_and_range(self):
+        promo_id = self.pb.db_create_promo(500, "text", None, "x", 5)
+        with sqlite3.connect(self.db) as conn:
+            (day,), = conn.execute("SELECT date(created_at / 1000, 'unixepoch') FROM promotions WHERE id = ?", (promo_id,))
+        self.assertEqual(self.pb.db_status_counts(daily=True), [(day, "pending", 1)])
+        self.assertEqual(self.pb.db_status_counts(since="2000-01-01", until="2000-12-31"), [])
+
+    def test_stats_command(self):
+        self.pb.db_create_promo(500, "text", None, "x", 5)
+        update, context = command(ADMIN, "/stats")
+        asyncio.run(self.pb.stats(update, context))
+        self.assertEqual(update.replies, ["Promotion stats:\npending: 1"])
+        update, context = command(ADMIN, "/stats 2025-02-30")
+        asyncio.run(self.pb.stats(update, context))
+        self.assertTrue(update.replies[0].startswith("Usage: /stats"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# Run from the repository root: python -m unittest
+import threading
+import unittest
+
+from ratelimit import RateLimiter, Tier, flood_guard
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_allows_up_to_limit_then_reports_retry_after(self):
+        rl = RateLimiter([Tier("minute", 3, 60)])
+        for t in (0, 1, 2):
+            self.assertEqual(rl.hit(7, now=t), (True, 0, None))
+        allowed, wait, tier = rl.hit(7, now=10)
+        self.assertFalse(allowed)
+        self.assertEqual(tier, "minute")
+        self.assertAlmostEqual(wait, 50)  # oldest hit (t=0) leaves the window at 60
+        self.assertTrue(rl.hit(7, now=60)[0])
+
+    def test_keys_are_independent_and_global_tier_is_shared(self):
+        rl = RateLimiter([Tier("user", 2, 60), Tier("all", 3, 60, "global")])
+        self.assertTrue(rl.hit(1, now=0)[0])
+        self.assertTrue(rl.hit(1, now=0)[0])
+        self.assertEqual(rl.hit(1, now=0)[2], "user")
+        self.assertTrue(rl.hit(2, now=0)[0])
+        self.assertEqual(rl.hit(3, now=0)[2], "all")
+
+    def test_rejected_hit_is_not_recorded(self):
+        rl = RateLimiter([Tier("minute", 1, 60)])
+        rl.hit(1, now=0)
+        for t in range(1, 50):
+            rl.hit(1, now=t)
+        self.assertTrue(rl.hit(1, now=60)[0])
+
+    def test_disabled_tier_is_ignored(self):
+        rl = RateLimiter([Tier("off", 0, 60)])
+        self.assertTrue(all(rl.hit(1, now=0)[0] for _ in range(100)))
+
+    def test_warm_counts_existing_hits(self):
+        rl = RateLimiter([Tier("day", 2, 86400)])
+        rl.warm([(5, 100), (5, 200)])
+        self.assertFalse(rl.hit(5, now=300)[0])
+
+    def test_concurrent_hits_never_exceed_limit(self):
+        rl = RateLimiter([Tier("minute", 5, 60)])
+        results = []
+        barrier = threading.Barrier(40)
+
+        def worker():
+            barrier.wait()
+            results.append(rl.hit(1)[0])
+        threads = [threading.Thread(target=worker) for _ in range(40)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sum(results), 5)
+
+
+class FloodGuardTest(unittest.TestCase):
+    def test_calls_on_limited_instead_of_handler(self):
+        rl = RateLimiter([Tier("minute", 1, 60)])
+        calls, limited = [], []
+
+        @flood_guard(rl, lambda m: m, lambda m, wait: limited.append((m, wait > 0)))
+        def handler(m):
+            calls.append(m)
+        handler(1)
+        handler(1)
+        handler(2)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(limited, [(1, True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
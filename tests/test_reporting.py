@@ -0,0 +1,75 @@
+# Run from the repository root: python -m unittest
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+import reporting
+
+# a recursive CTE that keeps SQLite busy for as long as it is allowed to run
+ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT max(i) FROM n"
+
+
+class ReportingDBTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = os.path.join(tmp.name, "bot.db")
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT)")
+            conn.executemany("INSERT INTO orders (status) VALUES (?)", [("done",)] * 3 + [("rejected",)])
+
+    def test_query(self):
+        reports = reporting.ReportingDB(self.db)
+        self.assertEqual(reports.query("SELECT status, COUNT(*) FROM orders GROUP BY status ORDER BY status"),
+                         [("done", 3), ("rejected", 1)])
+
+    def test_connections_are_read_only(self):
+        reports = reporting.ReportingDB(self.db)
+        with self.assertRaises(sqlite3.OperationalError):
+            reports.query("DELETE FROM orders")
+        self.assertEqual(reports.query("SELECT COUNT(*) FROM orders"), [(4,)])
+
+    def test_runaway_query_is_cut_off(self):
+        reports = reporting.ReportingDB(self.db, timeout=0.2)
+        started = time.monotonic()
+        with self.assertRaises(reporting.ReportTimeout):
+            reports.query(ENDLESS)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(reports.query("SELECT COUNT(*) FROM orders"), [(4,)])  # the slot was given back
+
+    def test_busy_when_every_slot_is_taken(self):
+        reports = reporting.ReportingDB(self.db, max_concurrent=1, timeout=1.0, wait=0.05)
+        running = threading.Thread(target=lambda: self.assertRaises(reporting.ReportTimeout, reports.query, ENDLESS))
+        running.start()
+        time.sleep(0.2)
+        try:
+            with self.assertRaises(reporting.ReportBusy):
+                reports.query("SELECT 1")
+        finally:
+            running.join()
+        self.assertEqual(reports.query("SELECT 1"), [(1,)])
+
+    def test_reads_do_not_block_writers(self):
+        reports = reporting.ReportingDB(self.db, timeout=0.5)
+        reader = threading.Thread(target=lambda: self.assertRaises(reporting.ReportTimeout, reports.query, ENDLESS))
+        reader.start()
+        time.sleep(0.1)
+        try:
+            with sqlite3.connect(self.db, timeout=0.1) as conn:
+                conn.execute("INSERT INTO orders (status) VALUES ('done')")
+        finally:
+            reader.join()
+
+    def test_plain_sql_errors_are_not_timeouts(self):
+        reports = reporting.ReportingDB(self.db)
+        with self.assertRaises(sqlite3.OperationalError) as cm:
+            reports.query("SELECT nope FROM orders")
+        self.assertNotIsInstance(cm.exception, reporting.ReportError)
+
+
+if __name__ == "__main__":
+    unittest.main()
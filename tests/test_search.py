@@ -0,0 +1,54 @@
+# Run from the repository root: python -m unittest
+import sqlite3
+import unittest
+
+import search
+
+
+class MatchExpressionTest(unittest.TestCase):
+    def test_words_become_prefix_terms(self):
+        self.assertEqual(search.match_expression("tiktok foll"), '"tiktok"* "foll"*')
+
+    def test_query_syntax_is_stripped(self):
+        self.assertEqual(search.match_expression('"a" OR b* ^c:d'), '"a"* "OR"* "b"* "c"* "d"*')
+        self.assertEqual(search.match_expression("*** ::"), "")
+
+    def test_word_count_is_capped(self):
+        self.assertEqual(len(search.match_expression(" ".join("w%d" % i for i in range(20))).split()), search.MAX_WORDS)
+
+
+class FtsIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE orders (id TEXT PRIMARY KEY, username TEXT, service TEXT)")
+        self.conn.execute("INSERT INTO orders VALUES ('o1', 'abebe', 'TikTok')")  # before the index exists
+        search.init_fts(self.conn.cursor(), "orders", ("username", "service"))
+
+    def tearDown(self):
+        self.conn.close()
+
+    def find(self, text):
+        rows = self.conn.execute(
+            "SELECT o.id FROM orders_fts JOIN orders o ON o.rowid = orders_fts.rowid WHERE orders_fts MATCH ? ORDER BY o.id",
+            (search.match_expression(text),))
+        return [r[0] for r in rows]
+
+    def test_existing_rows_are_indexed(self):
+        self.assertEqual(self.find("abe"), ["o1"])
+
+    def test_triggers_follow_inserts_updates_and_deletes(self):
+        self.conn.execute("INSERT INTO orders VALUES ('o2', 'kebede', 'Instagram')")
+        self.assertEqual(self.find("insta"), ["o2"])
+        self.conn.execute("UPDATE orders SET service = 'YouTube' WHERE id = 'o2'")
+        self.assertEqual(self.find("insta"), [])
+        self.assertEqual(self.find("youtube kebede"), ["o2"])
+        self.conn.execute("DELETE FROM orders WHERE id = 'o2'")
+        self.assertEqual(self.find("kebede"), [])
+
+    def test_init_is_idempotent(self):
+        search.init_fts(self.conn.cursor(), "orders", ("username", "service"))
+        self.assertEqual(self.find("tiktok"), ["o1"])
+
+
+if __name__ == "__main__":
+    unittest.main()